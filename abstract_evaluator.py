@@ -2,8 +2,14 @@ class AbstractEvaluator:
     """ This abstract class defines an interface for Evaluator implementations.
     """
 
-    def on_request_received(self, body):
+    def on_request_received(self, body, delivery=None):
         pass
 
     def get_queue_name(self):
         pass
+
+    def get_prefetch_count(self):
+        pass
+
+    def shutdown(self):
+        pass
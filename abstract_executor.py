@@ -0,0 +1,31 @@
+from typing import List
+
+from sage_container import SageContainer
+
+
+class AbstractExecutor:
+    """ This abstract class defines an interface for pools of containers that run evaluation scripts.
+
+    Implementations provide the max amount of containers they run at once as max_active_containers. An allocated
+    container is returned to its pool once its job is done, see SageContainer.call_release_observers.
+    """
+    max_active_containers = 0
+
+    def allocate_container(self, priority: int = 0, deadline: float | None = None,
+                           affinity: List[str] | None = None) -> SageContainer | None:
+        """ Allocate a container, waiting until one is free.
+
+        :param priority: priority of request, higher priorities are served first
+        :param deadline: monotonic time after which to stop waiting (None = default timeout of executor)
+        :param affinity: keys of the artifacts the request needs, most specific first, containers holding them are
+                         preferred (see SageContainer.holds)
+        :return: allocated container or None if no container could be allocated before the deadline
+        """
+        pass
+
+    def clear_all_containers(self):
+        """ Remove all containers.
+
+        :return: None
+        """
+        pass
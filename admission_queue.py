@@ -0,0 +1,122 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import List
+
+from metrics import REGISTRY
+
+QUEUE_DEPTH = REGISTRY.gauge("admission_queue_depth", "Requests waiting for a container")
+QUEUE_WAIT = REGISTRY.histogram("admission_queue_wait_seconds", "Time requests waited for a container")
+QUEUE_TIMEOUTS = REGISTRY.counter("admission_queue_timeouts_total", "Requests that missed their deadline")
+QUEUE_REJECTIONS = REGISTRY.counter("admission_queue_rejections_total", "Requests rejected because the queue was full")
+
+
+class Waiter:
+    """ This class represents a request waiting for a container.
+    """
+    def __init__(self, priority: int, deadline: float, affinity: List[str] | None = None):
+        """ Initialize a Waiter instance.
+
+        :param priority: priority of request, higher priorities are served first
+        :param deadline: monotonic time after which the request stops waiting
+        :param affinity: affinity keys of request, see DockerManager.allocate_container
+        """
+        self.priority = priority
+        self.deadline = deadline
+        self.affinity = affinity
+        self.enqueued_at = time.monotonic()
+        self.event = threading.Event()
+        self.container = None
+        self.cancelled = False
+
+    def assign(self, container):
+        """ Hand a container to this waiter and wake it up.
+
+        :param container: allocated container
+        :return: None
+        """
+        QUEUE_WAIT.observe(time.monotonic() - self.enqueued_at)
+        self.container = container
+        self.event.set()
+
+    def reject(self):
+        """ Wake this waiter without a container, e.g. since no container could be created.
+
+        :return: None
+        """
+        self.cancelled = True
+        self.event.set()
+
+
+class AdmissionQueue:
+    """ This class represents a bounded queue of requests waiting for a container.
+
+    Requests are served by priority and in FIFO order within the same priority. The queue is not synchronized itself,
+    all methods have to be called while holding the lock of the owning DockerManager.
+    """
+    def __init__(self, max_size: int):
+        """ Initialize an AdmissionQueue instance.
+
+        :param max_size: max amount of waiting requests
+        """
+        self.max_size = max_size
+        self.heap = []
+        self.size = 0
+        self.sequence = itertools.count()
+
+    def __len__(self):
+        return self.size
+
+    def enqueue(self, priority: int, deadline: float, affinity: List[str] | None = None) -> Waiter | None:
+        """ Add a request to the queue.
+
+        :param priority: priority of request, higher priorities are served first
+        :param deadline: monotonic time after which the request stops waiting
+        :param affinity: affinity keys of request, see DockerManager.allocate_container
+        :return: Waiter or None if the queue is full
+        """
+        if self.size >= self.max_size:
+            QUEUE_REJECTIONS.inc()
+            return None
+
+        waiter = Waiter(priority, deadline, affinity)
+        heapq.heappush(self.heap, (-priority, next(self.sequence), waiter))
+        self.size += 1
+        QUEUE_DEPTH.set(self.size)
+        return waiter
+
+    def cancel(self, waiter: Waiter):
+        """ Remove a waiter that missed its deadline.
+
+        :param waiter: waiter to remove
+        :return: None
+        """
+        waiter.cancelled = True
+        self.size -= 1
+        QUEUE_DEPTH.set(self.size)
+        QUEUE_TIMEOUTS.inc()
+
+    def next_waiter(self) -> Waiter | None:
+        """ Remove and return the next waiting request that did not miss its deadline.
+
+        :return: Waiter or None if no request is waiting
+        """
+        now = time.monotonic()
+        while self.heap:
+            _, _, waiter = heapq.heappop(self.heap)
+            if waiter.cancelled:
+                continue
+
+            self.size -= 1
+            QUEUE_DEPTH.set(self.size)
+            if waiter.deadline < now:
+                # the waiter is about to time out, do not give it a container it will not use
+                waiter.cancelled = True
+                QUEUE_TIMEOUTS.inc()
+                waiter.event.set()
+                continue
+
+            return waiter
+
+        return None
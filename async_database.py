@@ -0,0 +1,107 @@
+import datetime
+import logging
+from typing import List, Tuple
+
+import asyncpg
+
+from database import GRAPH_ELEMENTS_QUERY_TEMPLATE, TASK_QUERY_TEMPLATE, UPDATE_RESULTS_QUERY_TEMPLATE, \
+    BasicEvalRequestData
+from model.graph_model import Edge, Graph, Vertex
+
+TASK_QUERY = TASK_QUERY_TEMPLATE.format(task_id="$1")
+UPDATE_RESULTS_QUERY = UPDATE_RESULTS_QUERY_TEMPLATE.format(
+    results="unnest($1::bigint[], $2::boolean[], $3::timestamp[])")
+GRAPH_ELEMENTS_QUERY = GRAPH_ELEMENTS_QUERY_TEMPLATE.format(graph_id="$1")
+
+
+class AsyncDatabase:
+    """ This class represents an asynchronous interface to a database instance, backed by an asyncpg pool.
+    """
+    def __init__(self, host: str = "localhost", database: str = "mathgrass_db", user: str = "postgres",
+                 password: str = "postgres", min_connections: int = 1, max_connections: int = 10,
+                 graph_fetch_size: int = 2000):
+        """ Initialize an AsyncDatabase instance. The pool is opened by open().
+
+        :param host: host address
+        :param database: name of database
+        :param user: user name
+        :param password: password
+        :param min_connections: amount of connections kept open
+        :param max_connections: max amount of connections, callers wait once all connections are in use
+        :param graph_fetch_size: amount of graph elements fetched from the database at once
+        """
+        self.connection_params = {"host": host, "database": database, "user": user, "password": password}
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.graph_fetch_size = graph_fetch_size
+        self.pool = None
+
+    async def open(self):
+        """ Open the connection pool.
+
+        :return: None
+        """
+        self.pool = await asyncpg.create_pool(min_size=self.min_connections, max_size=self.max_connections,
+                                              **self.connection_params)
+        logging.info("Connection to database established!")
+
+    async def close(self):
+        """ Close all connections of the pool.
+
+        :return: None
+        """
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def get_basic_eval_request_data(self, task_id: int) -> BasicEvalRequestData | None:
+        """ Get data for evaluation request for specified task ID.
+
+        :param task_id: ID of task
+        :return: BasicEvalRequestData or None if task does not exist
+        """
+        async with self.pool.acquire() as conn:
+            task = await conn.fetchrow(TASK_QUERY, task_id)
+            if task is None:
+                logging.error(f"Task with ID {task_id} not found!")
+                return None
+
+            task_solver_id, script, graph_id, graph_label = task
+            graph = await self._get_graph(conn, graph_id, graph_label)
+
+        return BasicEvalRequestData(graph, script, task_solver_id)
+
+    async def _get_graph(self, conn, graph_id: int, graph_label: str) -> Graph:
+        """ Get the graph for specified graph ID by streaming its vertices and edges in one query.
+
+        :param conn: database connection
+        :param graph_id: ID of graph to load
+        :param graph_label: label of graph
+        :return: Graph
+        """
+        vertex_dict = {}
+        edge_obj_list = []
+
+        # cursors stream rows in batches and require a transaction
+        async with conn.transaction():
+            async for kind, element_id, label, x, y, v1_id, v2_id in conn.cursor(GRAPH_ELEMENTS_QUERY, graph_id,
+                                                                                 prefetch=self.graph_fetch_size):
+                if kind == "v":
+                    vertex_dict[element_id] = Vertex(element_id, label, x, y)
+                else:
+                    edge_obj_list.append(Edge(vertex_dict[v1_id], vertex_dict[v2_id], label))
+
+        return Graph(graph_id, graph_label, list(vertex_dict.values()), edge_obj_list)
+
+    async def add_evaluation_results(self, results: List[Tuple[int, bool | None, str]]):
+        """ Add several evaluation results to the database in one statement.
+
+        :param results: list of (request ID, whether answer is correct or not or None if the evaluation failed,
+                        evaluation timestamp)
+        :return: None
+        """
+        request_ids = [request_id for request_id, _, _ in results]
+        answers_true = [is_correct for _, is_correct, _ in results]
+        timestamps = [datetime.datetime.fromisoformat(timestamp) for _, _, timestamp in results]
+        async with self.pool.acquire() as conn:
+            await conn.execute(UPDATE_RESULTS_QUERY, request_ids, answers_true, timestamps)
@@ -0,0 +1,400 @@
+import asyncio
+import contextlib
+import hashlib
+import io
+import logging
+import os
+import tarfile
+from typing import Dict, List
+
+import aiodocker
+
+from docker_container import WORKDIR
+from docker_manager import OCCUPIED_CONTAINERS, POOL_LABEL, READY_CONTAINERS
+from sage_container import EXEC_SECONDS, SKIPPED_UPLOADS, TIMEOUTS, UPLOADED_BYTES
+from sage_session import STARTUP_TIMEOUT_SECONDS, SageSessionError, SageSessionTimeout, ServerOutput, TimeLimit, \
+    encode_job, get_response_timeout
+
+
+class AsyncSageSession:
+    """ This class represents a resident Sage server running inside a Docker container, driven from the event loop.
+
+    Jobs are sent as JSON lines to the servers' stdin and responses are read from its stdout, see SageSession.
+    """
+    def __init__(self, execution, stream):
+        """ Initialize an AsyncSageSession instance. Sessions are opened by open().
+
+        :param execution: exec instance running the server
+        :param stream: attached stream of the exec instance
+        """
+        self.execution = execution
+        self.stream = stream
+        self.output = ServerOutput()
+        self.next_job_id = 0
+
+    @classmethod
+    async def open(cls, container) -> "AsyncSageSession":
+        """ Launch the Sage server in a container and wait until it is ready.
+
+        :param container: aiodocker container with the server script in its working directory
+        :return: AsyncSageSession
+        """
+        execution = await container.exec(["sage", "-python", "sage_server.py"], stdin=True, stdout=True, stderr=True,
+                                         tty=False, workdir=WORKDIR)
+        stream = execution.start(detach=False)
+        session = cls(execution, stream)
+        try:
+            await asyncio.wait_for(session._read_response(), STARTUP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            await session.close()
+            raise SageSessionTimeout(f"Sage server did not start within {STARTUP_TIMEOUT_SECONDS} seconds")
+        except BaseException:
+            await session.close()
+            raise
+        return session
+
+    async def run(self, script: str, args: List[str], time_limit: TimeLimit | None = None,
+                  files: Dict[str, str] | None = None, args_encoding: str | None = None,
+                  graph_arg: int | None = None) -> dict:
+        """ Run a script inside the Sage server.
+
+        If the server does not respond within the time limit, a SageSessionTimeout is raised and the session must not
+        be used anymore.
+
+        :param script: path of script to run
+        :param args: script arguments
+        :param time_limit: time limits of the run (None = unlimited)
+        :param files: file contents by path to write before running the script
+        :param args_encoding: encoding the server applies to the arguments before passing them to the script
+        :param graph_arg: index of the argument holding a compact graph the server expands (None = no graph)
+        :return: response containing the script output, whether the script failed and whether it timed out
+        """
+        self.next_job_id += 1
+        job = encode_job({"script": script, "args": args}, self.next_job_id, time_limit, files, args_encoding,
+                         graph_arg)
+        try:
+            await self.stream.write_in(job)
+        except Exception as error:
+            raise SageSessionError(f"Could not send job to Sage server: {error}")
+
+        try:
+            response = await asyncio.wait_for(self._read_response(), get_response_timeout(time_limit, 1))
+        except asyncio.TimeoutError:
+            raise SageSessionTimeout("Sage server did not respond within the time limit")
+        if response.get("id") != self.next_job_id:
+            raise SageSessionError(f"Unexpected response from Sage server: {response}")
+        return response
+
+    async def _read_response(self) -> dict:
+        """ Read lines from the servers' stdout until the next response arrives.
+
+        :return: response
+        """
+        response = self.output.next_response()
+        while response is None:
+            message = await self.stream.read_out()
+            if message is None:
+                raise SageSessionError("Sage server terminated")
+            self.output.collect(message.data, message.stream)
+            response = self.output.next_response()
+        return response
+
+    async def close(self):
+        """ Close the connection to the Sage server, which makes the server terminate.
+
+        :return: None
+        """
+        try:
+            await self.stream.close()
+        except Exception:
+            pass
+
+
+class AsyncContainer:
+    """ This class represents a Docker container running a resident Sage server, driven from the event loop.
+    """
+    def __init__(self, container, session: AsyncSageSession):
+        """ Initialize an AsyncContainer instance. Containers are created by AsyncContainerPool.
+
+        :param container: aiodocker container
+        :param session: Sage server running in the container
+        """
+        self.container = container
+        self.name = container.id[:12]
+        self.session = session
+        self.jobs_run = 0
+        self.needs_recycling = False
+        # content digests of files present in the working directory by path
+        self.file_digests = {}
+
+    async def run_script(self, script: str, args: List[str], time_limit: TimeLimit | None = None,
+                         files: Dict[str, str] | None = None, args_encoding: str | None = None,
+                         graph_arg: int | None = None) -> dict | None:
+        """ Run a script in the Sage server, sending only files that are not present with the same content yet.
+
+        :param script: path of script to run
+        :param args: script arguments
+        :param time_limit: time limits of the script (None = unlimited)
+        :param files: file contents by path the script needs
+        :param args_encoding: encoding the Sage server applies to the arguments, e.g. "base64"
+        :param graph_arg: index of the argument holding a compact graph the Sage server expands (None = no graph)
+        :return: response or None if the Sage server failed
+        """
+        digests = {path: hashlib.sha256(content.encode("utf-8")).hexdigest() for path, content in (files or {}).items()}
+        missing_files = {path: files[path] for path, digest in digests.items() if self.file_digests.get(path) != digest}
+        UPLOADED_BYTES.inc(sum(len(content) for content in missing_files.values()))
+        SKIPPED_UPLOADS.inc(len(digests) - len(missing_files))
+        self.jobs_run += 1
+        try:
+            with EXEC_SECONDS.time():
+                response = await self.session.run(script, args, time_limit, missing_files, args_encoding, graph_arg)
+        except SageSessionError as error:
+            logging.error(f"Sage server of container {self.name} failed: {error}")
+            if isinstance(error, SageSessionTimeout):
+                TIMEOUTS.inc()
+            await self.session.close()
+            self.needs_recycling = True
+            return None
+        except asyncio.CancelledError:
+            # the job is still outstanding, so its response would be taken for the response of the next job
+            self.needs_recycling = True
+            raise
+
+        self.file_digests.update(digests)
+        if response["timed_out"]:
+            # the interrupted script may have left threads, memory or files behind, so the container is not reused
+            self.needs_recycling = True
+        return response
+
+    async def vanish(self):
+        """ Remove this container.
+
+        :return: None
+        """
+        logging.info(f"Removing container {self.name}...")
+        await self.session.close()
+        try:
+            await self.container.delete(force=True)
+        except aiodocker.DockerError as error:
+            logging.error(f"Could not remove container {self.name}: {error}")
+
+
+class AsyncContainerPool:
+    """ This class manages a pool of containers running resident Sage servers for the asyncio engine.
+
+    Containers are created on demand up to the max amount of active containers and handed out in FIFO order.
+    """
+    def __init__(self, max_active_containers: int, max_jobs_per_container: int | None = None,
+                 admission_timeout: float = 60, resource_limits: Dict | None = None,
+                 image: str = "sagemath/sagemath", refresh_image: bool = True, pool_label: str = "async"):
+        """ Initialize an AsyncContainerPool instance. The pool is opened by open().
+
+        :param max_active_containers: max amount of containers that can be active
+        :param max_jobs_per_container: amount of jobs after which a container is recycled (None = unlimited)
+        :param admission_timeout: amount of seconds a request waits for a container
+        :param resource_limits: docker HostConfig with the resource limits of each container
+        :param image: image of containers, pinning a digest (image@sha256:...) makes sure every start uses it
+        :param refresh_image: whether to pull a present image by tag again in the background
+        :param pool_label: label value identifying the containers of this pool, must differ between pools running at
+                           the same time
+        """
+        self.max_active_containers = max_active_containers
+        self.max_jobs_per_container = max_jobs_per_container
+        self.admission_timeout = admission_timeout
+        self.resource_limits = resource_limits or {}
+        self.image = image
+        self.refresh_image = refresh_image
+        self.pool_label = pool_label
+        self.image_refresh = None
+        self.docker = None
+        self.ready_containers = asyncio.Queue()
+        self.active_containers = set()
+        self.capacity = asyncio.Semaphore(max_active_containers)
+        self.replacements = set()
+        READY_CONTAINERS.set_function(self.ready_containers.qsize)
+        OCCUPIED_CONTAINERS.set_function(lambda: len(self.active_containers) - self.ready_containers.qsize())
+
+    async def open(self, ready_container_amount: int = 1):
+        """ Connect to docker, pull the image if it is missing, remove containers left over by an earlier run of
+        this pool and create the initial ready containers.
+
+        :param ready_container_amount: amount of containers to create ahead of time
+        :return: None
+        """
+        self.docker = aiodocker.Docker()
+        try:
+            await self.docker.images.inspect(self.image)
+            logging.info(f"Image {self.image} is present!")
+            if self.refresh_image and "@" not in self.image:
+                self.image_refresh = asyncio.create_task(self._pull_image())
+        except aiodocker.DockerError:
+            await self._pull_image()
+        await self._remove_leftover_containers()
+
+        results = await asyncio.gather(*[self._create_ready_container() for _ in range(ready_container_amount)],
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(f"Could not create container: {result}")
+
+    async def _pull_image(self):
+        """ Pull the image of containers.
+
+        :return: None
+        """
+        logging.info(f"Pulling image {self.image}...")
+        try:
+            await self.docker.images.pull(self.image)
+        except aiodocker.DockerError as error:
+            logging.error(f"Could not pull image {self.image}: {error}")
+            return
+        logging.info(f"Pulled image {self.image}!")
+
+    async def _remove_leftover_containers(self):
+        """ Remove the containers an earlier run of this pool left behind, e.g. after a crash.
+
+        :return: None
+        """
+        try:
+            leftovers = await self.docker.containers.list(all=True,
+                                                          filters={"label": [f"{POOL_LABEL}={self.pool_label}"]})
+        except aiodocker.DockerError as error:
+            logging.error(f"Could not list containers of an earlier run: {error}")
+            return
+
+        if leftovers:
+            logging.info(f"Removing {len(leftovers)} containers of an earlier run...")
+            await asyncio.gather(*[container.delete(force=True) for container in leftovers], return_exceptions=True)
+
+    async def _create_ready_container(self):
+        """ Create a container and add it to the ready containers.
+
+        :return: None
+        """
+        await self.capacity.acquire()
+        try:
+            container = await self._create_container()
+        except BaseException:
+            self.capacity.release()
+            raise
+        self.ready_containers.put_nowait(container)
+
+    async def _create_container(self) -> AsyncContainer:
+        """ Create a container and launch its Sage server. Must be called holding a unit of capacity.
+
+        :return: AsyncContainer
+        """
+        config = {"Image": self.image, "OpenStdin": True, "Tty": True, "HostConfig": self.resource_limits,
+                  "Labels": {POOL_LABEL: self.pool_label}}
+        container = await self.docker.containers.create(config=config)
+        try:
+            await container.start()
+            server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sage_server.py")
+            with open(server_path, "rb") as server_file:
+                await container.put_archive(WORKDIR, self._create_archive("sage_server.py", server_file.read()))
+            session = await AsyncSageSession.open(container)
+        except BaseException:
+            await container.delete(force=True)
+            raise
+
+        async_container = AsyncContainer(container, session)
+        self.active_containers.add(async_container)
+        logging.info(f"Sage server in container {async_container.name} is ready!")
+        return async_container
+
+    @staticmethod
+    def _create_archive(path: str, data: bytes) -> bytes:
+        """ Create a tar archive containing a single file.
+
+        :param path: path of file
+        :param data: content of file
+        :return: archive
+        """
+        fh = io.BytesIO()
+        with tarfile.open(fileobj=fh, mode='w') as tar:
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(initial_bytes=data))
+        return fh.getvalue()
+
+    @contextlib.asynccontextmanager
+    async def container(self):
+        """ Borrow a ready container, creating one if the pool has capacity left, and return it afterwards.
+
+        :return: context manager yielding an AsyncContainer or None if no container became free in time
+        """
+        container = await self._acquire()
+        try:
+            yield container
+        finally:
+            if container is not None:
+                await self._release(container)
+
+    async def _acquire(self) -> AsyncContainer | None:
+        """ Get a ready container or create one, waiting up to the admission timeout.
+
+        :return: AsyncContainer or None if no container became free in time
+        """
+        if not self.ready_containers.empty():
+            return self.ready_containers.get_nowait()
+
+        if not self.capacity.locked():
+            await self.capacity.acquire()
+            try:
+                return await self._create_container()
+            except Exception as error:
+                logging.error(f"Could not create container: {error}")
+                self.capacity.release()
+
+        try:
+            return await asyncio.wait_for(self.ready_containers.get(), self.admission_timeout)
+        except asyncio.TimeoutError:
+            logging.info("No container was freed before the deadline!")
+            return None
+
+    async def _release(self, container: AsyncContainer):
+        """ Return a container to the ready containers or recycle it.
+
+        :param container: borrowed container
+        :return: None
+        """
+        if not container.needs_recycling and (self.max_jobs_per_container is None
+                                              or container.jobs_run < self.max_jobs_per_container):
+            self.ready_containers.put_nowait(container)
+            return
+
+        logging.info(f"Recycling container {container.name}...")
+        self.active_containers.discard(container)
+        await container.vanish()
+        self.capacity.release()
+
+        # replace the container in the background since waiting requests only wait for ready containers
+        replacement = asyncio.create_task(self._create_ready_container())
+        self.replacements.add(replacement)
+        replacement.add_done_callback(self._on_replaced)
+
+    def _on_replaced(self, replacement: asyncio.Task):
+        """ Forget a finished replacement of a recycled container.
+
+        :param replacement: task that created the replacement
+        :return: None
+        """
+        self.replacements.discard(replacement)
+        if not replacement.cancelled() and replacement.exception():
+            logging.error(f"Could not replace container: {replacement.exception()}")
+
+    async def close(self):
+        """ Remove all containers and disconnect from docker.
+
+        :return: None
+        """
+        logging.info("Removing all containers...")
+        if self.image_refresh:
+            self.image_refresh.cancel()
+        for replacement in list(self.replacements):
+            replacement.cancel()
+        await asyncio.gather(*self.replacements, return_exceptions=True)
+        await asyncio.gather(*[container.vanish() for container in self.active_containers], return_exceptions=True)
+        self.active_containers.clear()
+        if self.docker:
+            await self.docker.close()
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+from typing import Dict
+
+import aio_pika
+
+from async_database import AsyncDatabase
+from async_docker import AsyncContainerPool
+from async_result_sink import AsyncResultSink
+from basic_evaluator import DB_FETCH_SECONDS, DEFAULT_TIME_LIMIT, EVALUATION_SECONDS, BasicEvalRequest, EvaluationBundle
+from cache import LRUCache
+from result_cache import ResultCache
+from sage_container import parse_result
+from sage_session import TimeLimit
+
+
+class AsyncEvaluator:
+    """ This class represents the standard MathGrass evaluator running on an event loop.
+
+    Every request is evaluated in its own task, which fetches the evaluation bundle, runs the script in a pooled
+    container and hands the result to the result sink. The amount of evaluations in flight is bounded by the
+    prefetch count of the consumer, the amount of running scripts by the container pool.
+    """
+    def __init__(self, container_pool: AsyncContainerPool, database: AsyncDatabase, max_in_flight: int = 100,
+                 bundle_cache_size: int = 256, bundle_cache_ttl: float | None = 300, result_batch_size: int = 100,
+                 result_flush_interval: float = 0.5, result_cache: ResultCache | None = None,
+                 time_limits: Dict[int, TimeLimit] | None = None, default_time_limit: TimeLimit = DEFAULT_TIME_LIMIT):
+        """ Initialize an AsyncEvaluator instance. Must be called on the event loop.
+
+        :param container_pool: AsyncContainerPool to run scripts in
+        :param database: AsyncDatabase to load tasks from and write results to
+        :param max_in_flight: max amount of unacknowledged requests
+        :param bundle_cache_size: max amount of tasks whose evaluation bundles are cached
+        :param bundle_cache_ttl: amount of seconds after which a cached evaluation bundle is reloaded (None = never)
+        :param result_batch_size: amount of buffered results that triggers writing them to the database
+        :param result_flush_interval: max amount of seconds a result is buffered before it is written to the database
+        :param result_cache: ResultCache to memoize results in, an in-memory cache is created if not given
+        :param time_limits: time limits of task solvers by task solver ID
+        :param default_time_limit: time limit of task solvers without own time limits
+        """
+        self.container_pool = container_pool
+        self.db = database
+        self.max_in_flight = max_in_flight
+        self.result_sink = AsyncResultSink(database, result_batch_size, result_flush_interval, max_in_flight)
+        self.bundle_cache = LRUCache("bundle", bundle_cache_size, bundle_cache_ttl)
+        self.bundle_loads = {}
+        self.result_cache = result_cache or ResultCache(10000)
+        self.time_limits = time_limits or {}
+        self.default_time_limit = default_time_limit
+        self.tasks = set()
+
+    def get_queue_name(self) -> str:
+        """ Return the message queue name.
+
+        :return: string
+        """
+        return "TASK_REQUEST"
+
+    def get_prefetch_count(self) -> int:
+        """ Return the max amount of unacknowledged requests.
+
+        :return: int
+        """
+        return self.max_in_flight
+
+    def start(self):
+        """ Start writing results in the background.
+
+        :return: None
+        """
+        self.result_sink.start()
+
+    async def on_message(self, message: aio_pika.abc.AbstractIncomingMessage):
+        """ Process an incoming message by evaluating its request in a new task.
+
+        :param message: incoming message, acknowledged once the result is persisted
+        :return: None
+        """
+        try:
+            request = BasicEvalRequest.from_body(message.body)
+        except (ValueError, AttributeError) as error:
+            logging.error(f"Discarding malformed request: {error}")
+            await message.reject(requeue=False)
+            return
+
+        task = asyncio.create_task(self.evaluate(request, message))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def evaluate(self, request: BasicEvalRequest, message: aio_pika.abc.AbstractIncomingMessage):
+        """ Run an evaluation. Failed evaluations are retried once on another delivery.
+
+        :param request: evaluation request
+        :param message: message the request was received with
+        :return: None
+        """
+        try:
+            with EVALUATION_SECONDS.time():
+                await self.run(request, message)
+        except Exception:
+            logging.exception(f"Evaluation of request ({request}) failed!")
+            await message.reject(requeue=not message.redelivered)
+
+    async def run(self, request: BasicEvalRequest, message: aio_pika.abc.AbstractIncomingMessage):
+        """ Fetch the evaluation bundle, run the evaluation script and submit the result.
+
+        :param request: evaluation request
+        :param message: message the request was received with
+        :return: None
+        """
+        bundle = await self.get_bundle(request.task_id)
+        if not bundle:
+            logging.info("No data available, aborting...")
+            await message.reject(requeue=False)
+            return
+
+        # identical submissions do not need a container, the result cache may read from disk and wait for its lock, so
+        # it is not accessed on the event loop
+        loop = asyncio.get_running_loop()
+        cache_key = self.result_cache.get_key(bundle.digest, request.input_answer)
+        cached_result = await loop.run_in_executor(None, self.result_cache.get, cache_key)
+        if cached_result is not None:
+            logging.info(f"Result of request {request.request_id} is cached!")
+            self.result_sink.submit(request.request_id, cached_result, message.ack)
+            return
+
+        async with self.container_pool.container() as container:
+            if container is None:
+                logging.info(f"Could not run task {request.request_id} because no docker container could be allocated")
+                await message.reject(requeue=True)
+                return
+
+            # evaluation scripts expect base64 encoded arguments and the full graph representation, the Sage server
+            # converts them inside the container
+            time_limit = self.time_limits.get(bundle.task_solver_id, self.default_time_limit)
+            response = await container.run_script(bundle.script_path, [request.input_answer, bundle.graph_json],
+                                                  time_limit, {bundle.script_path: bundle.script}, "base64", 1)
+
+        is_correct = None
+        if response is not None:
+            is_correct = parse_result(request.request_id, response["output"], response["timed_out"])
+        if is_correct is not None:
+            await loop.run_in_executor(None, self.result_cache.put, cache_key, is_correct)
+
+        logging.info(f"Result with ID {request.request_id} received! Result was correct: {is_correct}")
+        self.result_sink.submit(request.request_id, is_correct, message.ack)
+
+    async def get_bundle(self, task_id: int) -> EvaluationBundle | None:
+        """ Get the evaluation bundle for a task, loading it from the database if it is not cached.
+
+        Concurrent requests for the same uncached task share a single load.
+
+        :param task_id: ID of task
+        :return: EvaluationBundle or None if no data is available
+        """
+        bundle = self.bundle_cache.get(task_id)
+        if bundle is not None:
+            return bundle
+
+        load = self.bundle_loads.get(task_id)
+        if load is None:
+            load = asyncio.ensure_future(self._load_bundle(task_id))
+            self.bundle_loads[task_id] = load
+            load.add_done_callback(lambda _: self.bundle_loads.pop(task_id, None))
+        return await asyncio.shield(load)
+
+    async def _load_bundle(self, task_id: int) -> EvaluationBundle | None:
+        """ Load the evaluation bundle for a task from the database and cache it.
+
+        :param task_id: ID of task
+        :return: EvaluationBundle or None if no data is available
+        """
+        with DB_FETCH_SECONDS.time():
+            request_data = await self.db.get_basic_eval_request_data(task_id)
+        if not request_data:
+            return None
+
+        graph_json = json.dumps(request_data.graph.to_compact_json(), separators=(",", ":"))
+        bundle = EvaluationBundle(request_data.script, graph_json, request_data.task_solver_id)
+        self.bundle_cache.put(task_id, bundle)
+        return bundle
+
+    async def shutdown(self, grace_period: float = 30):
+        """ Wait for running evaluations to finish, cancel the rest and persist all results.
+
+        Cancelled evaluations are not acknowledged, so the broker delivers them again.
+
+        :param grace_period: amount of seconds running evaluations may take to finish
+        :return: None
+        """
+        if self.tasks:
+            logging.info(f"Waiting for {len(self.tasks)} running evaluations...")
+            _, pending = await asyncio.wait(set(self.tasks), timeout=grace_period)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self.result_sink.close()
@@ -0,0 +1,122 @@
+import asyncio
+import logging.config
+import signal
+
+import aio_pika
+import aiodocker
+from docker.constants import DEFAULT_DOCKER_API_VERSION
+from docker.types import HostConfig
+
+from async_database import AsyncDatabase
+from async_docker import AsyncContainerPool
+from async_evaluator import AsyncEvaluator
+from config import (ADMISSION_TIMEOUT, BROKER_HOST, BUNDLE_CACHE_SIZE, BUNDLE_CACHE_TTL, CONTAINER_CPUS,
+                    CONTAINER_MEMORY_LIMIT, CONTAINER_PIDS_LIMIT, DB_GRAPH_FETCH_SIZE, DB_HOST, DB_MAX_CONNECTIONS,
+                    DB_MIN_CONNECTIONS, DB_NAME, DB_PASSWORD, DB_USER, DEFAULT_TIME_LIMIT, HOST_MEMORY_RESERVE,
+                    MAX_ACTIVE_CONTAINERS, MAX_JOBS_PER_CONTAINER, METRICS_HOST, METRICS_PORT, READY_CONTAINERS,
+                    REFRESH_IMAGE, RESULT_BATCH_SIZE, RESULT_CACHE_PATH, RESULT_CACHE_SIZE, RESULT_FLUSH_INTERVAL,
+                    SAGE_IMAGE, TASK_SOLVER_TIME_LIMITS)
+from docker_manager import DockerManager
+from metrics import start_metrics_server
+from result_cache import ResultCache
+
+# max amount of unacknowledged requests, evaluations beyond the amount of containers wait for a container
+MAX_IN_FLIGHT = 500
+SHUTDOWN_GRACE_PERIOD = 30
+
+# configure logging
+logging.config.fileConfig("logging.conf")
+
+
+def get_host_config() -> dict:
+    """ Get the docker HostConfig with the resource limits of each container, the same limits the threaded engine
+    applies.
+
+    :return: HostConfig
+    """
+    return dict(HostConfig(DEFAULT_DOCKER_API_VERSION,
+                           **DockerManager.get_resource_limits(CONTAINER_CPUS, CONTAINER_MEMORY_LIMIT,
+                                                               CONTAINER_PIDS_LIMIT)))
+
+
+async def get_max_active_containers() -> int:
+    """ Get the max amount of active containers, sizing the pool from the host capacity if it is not configured.
+
+    :return: max amount of active containers
+    """
+    if MAX_ACTIVE_CONTAINERS is not None:
+        return MAX_ACTIVE_CONTAINERS
+
+    docker = aiodocker.Docker()
+    try:
+        host_info = await docker.system.info()
+    finally:
+        await docker.close()
+    max_active_containers = DockerManager.get_pool_size(host_info["NCPU"], host_info["MemTotal"] - HOST_MEMORY_RESERVE,
+                                                        CONTAINER_CPUS, CONTAINER_MEMORY_LIMIT)
+    logging.info(f"Sized container pool to {max_active_containers} containers from host capacity!")
+    return max_active_containers
+
+
+async def serve():
+    """ Consume evaluation requests until SIGINT or SIGTERM is received, then shut down gracefully.
+
+    :return: None
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    database = AsyncDatabase(DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, DB_MIN_CONNECTIONS, DB_MAX_CONNECTIONS,
+                             DB_GRAPH_FETCH_SIZE)
+    container_pool = AsyncContainerPool(await get_max_active_containers(), MAX_JOBS_PER_CONTAINER, ADMISSION_TIMEOUT,
+                                        get_host_config(), SAGE_IMAGE, REFRESH_IMAGE)
+    result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_PATH)
+    connection = None
+    try:
+        await database.open()
+        await container_pool.open(READY_CONTAINERS)
+
+        evaluator = AsyncEvaluator(container_pool, database, max_in_flight=MAX_IN_FLIGHT,
+                                   bundle_cache_size=BUNDLE_CACHE_SIZE, bundle_cache_ttl=BUNDLE_CACHE_TTL,
+                                   result_batch_size=RESULT_BATCH_SIZE, result_flush_interval=RESULT_FLUSH_INTERVAL,
+                                   result_cache=result_cache, time_limits=TASK_SOLVER_TIME_LIMITS,
+                                   default_time_limit=DEFAULT_TIME_LIMIT)
+        evaluator.start()
+
+        connection = await aio_pika.connect_robust(host=BROKER_HOST)
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=evaluator.get_prefetch_count())
+        queue = await channel.declare_queue(evaluator.get_queue_name())
+        consumer_tag = await queue.consume(evaluator.on_message)
+        logging.info(f"Consuming {evaluator.get_queue_name()}!")
+
+        await stop.wait()
+
+        # stop consuming first, results of running evaluations are still acknowledged on the open channel
+        logging.info("Waiting for running evaluations...")
+        await queue.cancel(consumer_tag)
+        await evaluator.shutdown(SHUTDOWN_GRACE_PERIOD)
+    finally:
+        if connection:
+            await connection.close()
+        logging.info("Clearing docker containers...")
+        await container_pool.close()
+        await database.close()
+        result_cache.close()
+
+
+def main():
+    """ Run the asyncio engine of the evaluator.
+
+    :return: None
+    """
+    logging.info("Starting asyncio evaluator microservice!")
+    if METRICS_PORT is not None:
+        start_metrics_server(METRICS_HOST, METRICS_PORT)
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
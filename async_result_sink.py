@@ -0,0 +1,134 @@
+import asyncio
+import datetime
+import logging
+from typing import Awaitable, Callable
+
+from async_database import AsyncDatabase
+from result_sink import PERSIST_SECONDS
+
+
+class AsyncResultSink:
+    """ This class buffers evaluation results and writes them to the database in batches on the event loop.
+
+    A batch is flushed once it reaches the batch size, holds max_pending_acks callbacks or the flush interval elapsed,
+    whichever comes first. The on_persisted coroutine of a result is awaited after the batch containing it was
+    committed, so messages can be acknowledged only when their result is safe. Results of a failed flush stay buffered
+    and are retried.
+    """
+    def __init__(self, database: AsyncDatabase, batch_size: int = 100, flush_interval: float = 0.5,
+                 max_pending_acks: int | None = None):
+        """ Initialize an AsyncResultSink instance. Flushing in the background is started by start().
+
+        :param database: database to write results to
+        :param batch_size: amount of buffered results that triggers a flush
+        :param flush_interval: max amount of seconds a result stays buffered
+        :param max_pending_acks: amount of buffered callbacks that triggers a flush, usually the prefetch count of the
+                                 consumer since no further message is delivered until one of them is acknowledged
+                                 (None = unlimited)
+        """
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending_acks = max_pending_acks
+        self.buffer = {}
+        self.pending_acks = 0
+        self.batch_full = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.closed = False
+        self.task = None
+
+    def start(self):
+        """ Start flushing in the background.
+
+        :return: None
+        """
+        self.task = asyncio.create_task(self._flush_forever())
+
+    def submit(self, request_id: int, is_correct: bool | None,
+               on_persisted: Callable[[], Awaitable[None]] | None = None):
+        """ Buffer a result. A later result for the same request replaces the buffered one.
+
+        :param request_id: ID of request
+        :param is_correct: whether answer is correct or not, None if the evaluation failed
+        :param on_persisted: coroutine function to await once the result is committed
+        :return: None
+        """
+        timestamp = datetime.datetime.now().isoformat()
+        callbacks = self.buffer.pop(request_id, (None, None, []))[2]
+        if on_persisted:
+            callbacks.append(on_persisted)
+            self.pending_acks += 1
+        self.buffer[request_id] = (is_correct, timestamp, callbacks)
+        if len(self.buffer) >= self.batch_size or \
+                (self.max_pending_acks is not None and self.pending_acks >= self.max_pending_acks):
+            self.batch_full.set()
+
+    async def flush(self) -> bool:
+        """ Write all buffered results to the database in one statement.
+
+        :return: whether all buffered results were persisted
+        """
+        async with self.flush_lock:
+            batch, self.buffer = self.buffer, {}
+            self.pending_acks = 0
+            if not batch:
+                return True
+
+            results = [(request_id, is_correct, timestamp) for request_id, (is_correct, timestamp, _) in batch.items()]
+            try:
+                with PERSIST_SECONDS.time():
+                    await self.database.add_evaluation_results(results)
+            except Exception as error:
+                logging.error(f"Could not persist {len(batch)} results, retrying later: {error}")
+                # keep newer results that arrived during the flush but all callbacks
+                for request_id, (is_correct, timestamp, callbacks) in self.buffer.items():
+                    previous_callbacks = batch[request_id][2] if request_id in batch else []
+                    batch[request_id] = (is_correct, timestamp, previous_callbacks + callbacks)
+                self.buffer = batch
+                self.pending_acks = sum(len(callbacks) for _, _, callbacks in batch.values())
+                return False
+
+            logging.info(f"Persisted {len(batch)} results!")
+            for _, _, callbacks in batch.values():
+                for callback in callbacks:
+                    try:
+                        await callback()
+                    except Exception as error:
+                        logging.error(f"Could not acknowledge persisted result: {error}")
+            return True
+
+    async def _flush_forever(self):
+        """ Flush results whenever a batch is due or the flush interval elapsed.
+
+        :return: None
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self.batch_full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self.closed:
+                return
+            self.batch_full.clear()
+            await self.flush()
+
+    async def close(self, retries: int = 3):
+        """ Stop flushing in the background and persist all buffered results.
+
+        Results that still cannot be persisted are lost for this process, but their messages were not acknowledged,
+        so the broker delivers them again.
+
+        :param retries: amount of attempts for the final flush
+        :return: None
+        """
+        # let a running flush finish instead of cancelling it halfway
+        self.closed = True
+        self.batch_full.set()
+        if self.task:
+            await self.task
+
+        for _ in range(retries):
+            if await self.flush():
+                return
+            await asyncio.sleep(self.flush_interval)
+        logging.error(f"Could not persist {len(self.buffer)} results before shutdown!")
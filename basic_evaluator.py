@@ -1,45 +1,134 @@
-import base64
 import datetime
+import hashlib
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
-from typing import Any
+from typing import Any, Dict
 
 from abstract_evaluator import AbstractEvaluator
+from abstract_executor import AbstractExecutor
+from cache import LRUCache
 from database import Database
-from docker_container import ContentFile
-from docker_manager import DockerManager
+from metrics import REGISTRY
+from rabbitmq_client import Delivery
+from result_cache import ResultCache
+from result_sink import ResultSink
+from sage_container import ContentFile
+from sage_session import TimeLimit
+
+DEFAULT_TIME_LIMIT = TimeLimit(wall_seconds=60, cpu_seconds=30)
+# directory of evaluation scripts in the working directory of containers
+SCRIPT_DIR = "scripts"
+
+QUEUE_WAIT = REGISTRY.histogram("evaluation_queue_wait_seconds", "Time received requests waited for a free worker")
+DB_FETCH_SECONDS = REGISTRY.histogram("db_fetch_seconds", "Time loading the data of a task from the database")
+EVALUATION_SECONDS = REGISTRY.histogram("evaluation_seconds", "Time from starting an evaluation until it is done")
 
 
 class BasicEvalRequest:
     """ This class represents an evaluation request for the BasicEvaluator.
     """
-    def __init__(self, request_id: int, task_id: int, input_answer: Any):
+    def __init__(self, request_id: int, task_id: int, input_answer: Any, delivery: Delivery | None = None,
+                 priority: int = 0):
         """ Initialize a BasicEvalRequest instance.
 
         :param request_id: ID of request
         :param task_id: ID of task
         :param input_answer: Input answer
+        :param delivery: message the request was received with, acknowledged once the result is persisted
+        :param priority: priority of request when waiting for a container, higher priorities are served first
         """
         self.request_id = request_id
         self.task_id = task_id
         self.input_answer = input_answer
+        self.delivery = delivery
+        self.priority = priority
+
+    @classmethod
+    def from_body(cls, body, delivery: Delivery | None = None) -> "BasicEvalRequest":
+        """ Create an evaluation request from a message body.
+
+        :param body: request body
+        :param delivery: message the request was received with
+        :return: BasicEvalRequest
+        :raises ValueError: if the body is not valid JSON
+        :raises AttributeError: if the body lacks a field
+        """
+        request = json.loads(body, object_hook=lambda d: SimpleNamespace(**d))
+        return cls(request.requestId, request.taskId, request.inputAnswer, delivery, getattr(request, "priority", 0))
 
     def __str__(self):
         return "InputAnswer: request_id=" + str(self.request_id) + " task_id=" + str(self.task_id) + \
                " input_answer=" + str(self.input_answer)
     
 
+class EvaluationBundle:
+    """ This class represents everything that is needed to evaluate answers for a task, prepared for the container.
+    """
+    def __init__(self, script: str, graph_json: str, task_solver_id: int | None = None):
+        """ Initialize an EvaluationBundle instance.
+
+        :param script: script to run
+        :param graph_json: compact JSON representation of the graph
+        :param task_solver_id: ID of task solver the script belongs to
+        """
+        self.script = script
+        self.graph_json = graph_json
+        self.task_solver_id = task_solver_id
+        self.digest = hashlib.sha256((script + "\0" + graph_json).encode("utf-8")).hexdigest()
+        # scripts are named by their content, so containers keep the scripts of many tasks and their compiled form
+        self.script_path = f"{SCRIPT_DIR}/{hashlib.sha256(script.encode('utf-8')).hexdigest()}.sage"
+        # containers that evaluated this bundle recently or at least hold its script are preferred
+        self.affinity = [self.digest, self.script_path]
+
+
 class BasicEvaluator(AbstractEvaluator):
     """ This class represents the standard MathGrass evaluator.
     """
-    def __init__(self, docker_manager: DockerManager):
+    def __init__(self, docker_manager: AbstractExecutor, max_workers: int | None = None,
+                 bundle_cache_size: int = 256, bundle_cache_ttl: float | None = 300, database: Database | None = None,
+                 result_batch_size: int = 100, result_flush_interval: float = 0.5,
+                 result_cache: ResultCache | None = None, time_limits: Dict[int, TimeLimit] | None = None,
+                 default_time_limit: TimeLimit = DEFAULT_TIME_LIMIT,
+                 executors: Dict[int, AbstractExecutor] | None = None):
         """ Initialize an AbstractEvaluator instance.
 
-        :param docker_manager: DockerManager
+        :param docker_manager: executor running the scripts of all task solvers without own executor, usually a
+                               DockerManager
+        :param max_workers: max amount of concurrent evaluations, capped by the max amount of active containers
+        :param bundle_cache_size: max amount of tasks whose evaluation bundles are cached
+        :param bundle_cache_ttl: amount of seconds after which a cached evaluation bundle is reloaded (None = never)
+        :param database: Database to use, a database with default settings is created if not given
+        :param result_batch_size: amount of buffered results that triggers writing them to the database
+        :param result_flush_interval: max amount of seconds a result is buffered before it is written to the database
+        :param result_cache: ResultCache to memoize results in, an in-memory cache is created if not given
+        :param time_limits: time limits of task solvers by task solver ID
+        :param default_time_limit: time limit of task solvers without own time limits
+        :param executors: executors of task solvers by task solver ID, e.g. a LocalExecutor for trusted task solvers
         """
-        self.db = Database()
+        self.db = database or Database()
         self.docker_manager = docker_manager
+        self.bundle_cache = LRUCache("bundle", bundle_cache_size, bundle_cache_ttl)
+        self.result_cache = result_cache or ResultCache(10000)
+        self.time_limits = time_limits or {}
+        self.default_time_limit = default_time_limit
+        self.executors = executors or {}
+
+        # evaluations run in a worker pool, a slot is taken before a request is dispatched so that the consumer waits
+        # instead of piling up requests once all containers are busy
+        max_active_containers = sum(executor.max_active_containers
+                                    for executor in {docker_manager, *self.executors.values()})
+        max_workers = min(max_workers or max_active_containers, max_active_containers)
+        self.max_workers = max_workers
+        self.evaluation_slots = threading.BoundedSemaphore(max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="evaluation")
+
+        # messages are acknowledged once their result is persisted, so a batch is flushed as soon as it holds the
+        # results of all unacknowledged messages instead of waiting for results that cannot arrive
+        self.result_sink = ResultSink(self.db, result_batch_size, result_flush_interval, self.get_prefetch_count())
 
     def get_queue_name(self):
         """ Return the message queue name.
@@ -48,63 +137,181 @@ class BasicEvaluator(AbstractEvaluator):
         """
         return "TASK_REQUEST"
 
+    def get_prefetch_count(self):
+        """ Return the max amount of unacknowledged requests, which equals the max amount of concurrent evaluations.
+
+        :return: int
+        """
+        return self.max_workers
+
     def run(self, request: BasicEvalRequest):
         """ Run an evaluation.
 
         :param request: evaluation request
         :return: None
         """
+        # fetch data
+        bundle = self.get_bundle(request.task_id)
+        if not bundle:
+            logging.info("No data available, aborting...")
+            # TODO: save error in db with request_id
+            if request.delivery:
+                request.delivery.reject(requeue=False)
+            return
+
+        # identical submissions do not need a container
+        cache_key = self.result_cache.get_key(bundle.digest, request.input_answer)
+        cached_result = self.result_cache.get(cache_key)
+        if cached_result is not None:
+            logging.info(f"Result of request {request.request_id} is cached!")
+            self.on_result(request.request_id, cached_result, request.delivery)
+            return
+
         # get a free container
-        container = self.docker_manager.allocate_container()
+        container = self.get_executor(bundle).allocate_container(request.priority, affinity=bundle.affinity)
         if not container:
             logging.info(f"Could not run task {request.request_id} because no docker container could be allocated")
+            if request.delivery:
+                request.delivery.reject(requeue=True)
             return
-        
-        # fetch data
-        request_data = self.db.get_basic_eval_request_data(request.task_id)
+
+        # stage evaluation script, it is kept across resets so that it is neither sent nor compiled again
+        container.upload_content_files([ContentFile(bundle.script_path, bundle.script)], persistent=True)
+
+        # prepare and launch
+        container.add_result_observer(lambda request_id, is_correct: self.on_evaluated(request_id, is_correct,
+                                                                                       cache_key, request.delivery))
+        # evaluation scripts expect base64 encoded arguments and the full graph representation, the Sage server
+        # converts them inside the container
+        container.run_script(bundle.script_path, [request.input_answer, bundle.graph_json], request.request_id,
+                             self.get_time_limit(bundle), "base64", 1)
+
+    def get_executor(self, bundle: EvaluationBundle) -> AbstractExecutor:
+        """ Get the executor running the script of an evaluation bundle.
+
+        :param bundle: evaluation bundle
+        :return: AbstractExecutor
+        """
+        return self.executors.get(bundle.task_solver_id, self.docker_manager)
+
+    def get_time_limit(self, bundle: EvaluationBundle) -> TimeLimit:
+        """ Get the time limits for running the script of an evaluation bundle.
+
+        :param bundle: evaluation bundle
+        :return: TimeLimit
+        """
+        return self.time_limits.get(bundle.task_solver_id, self.default_time_limit)
+
+    def get_bundle(self, task_id: int) -> EvaluationBundle | None:
+        """ Get the evaluation bundle for a task, loading it from the database if it is not cached.
+
+        :param task_id: ID of task
+        :return: EvaluationBundle or None if no data is available
+        """
+        return self.bundle_cache.get_or_load(task_id, self._load_bundle)
+
+    def _load_bundle(self, task_id: int) -> EvaluationBundle | None:
+        """ Load the evaluation bundle for a task from the database.
+
+        :param task_id: ID of task
+        :return: EvaluationBundle or None if no data is available
+        """
+        with DB_FETCH_SECONDS.time():
+            request_data = self.db.get_basic_eval_request_data(task_id)
         if not request_data:
-            logging.info("No data available, aborting...")
-            # TODO: save error in db with request_id
-            return
+            return None
 
-        # extract data from request
-        eval_script = request_data.script
-        graph_obj = request_data.graph
+        graph_json = json.dumps(request_data.graph.to_compact_json(), separators=(",", ":"))
+        return EvaluationBundle(request_data.script, graph_json, request_data.task_solver_id)
 
-        # decode graph
-        graph_json = json.dumps(graph_obj.to_json())
-        graph_decoded = base64.b64encode(graph_json.encode("utf-8")).decode("utf-8")
+    def invalidate_task(self, task_id: int | None = None):
+        """ Drop the cached evaluation bundle of a task, e.g. after its script or graph changed.
 
-        # decode answer
-        answer_decoded = base64.b64encode(request.input_answer.encode("utf-8")).decode("utf-8")
+        :param task_id: ID of task or None to drop all bundles
+        :return: None
+        """
+        if task_id is None:
+            self.bundle_cache.clear()
+        else:
+            self.bundle_cache.invalidate(task_id)
 
-        # build command to run
-        command = f"sage eval.sage {answer_decoded} {graph_decoded}"
+    def on_evaluated(self, request_id: int, is_correct: bool | None, cache_key: str,
+                     delivery: Delivery | None = None):
+        """ Process a result computed by a container by memoizing it and adding it to the database. Failed evaluations
+        are not memoized.
 
-        # load and move evaluation script to docker
-        container.upload_content_files([ContentFile("eval.sage", eval_script)])
+        :param request_id: ID of request
+        :param is_correct: whether result was correct or not, None if the evaluation failed
+        :param cache_key: key of the submission in the result cache
+        :param delivery: message the request was received with, acknowledged once the result is persisted
+        :return: None
+        """
+        if is_correct is not None:
+            self.result_cache.put(cache_key, is_correct)
+        self.on_result(request_id, is_correct, delivery)
 
-        # prepare and launch
-        container.add_result_observer(self.on_result)
-        container.run_task_solver(command, request.request_id)
-        
-    def on_result(self, request_id: int, is_correct: bool):
-        """ Process an incoming result by adding the result to the database.
+    def on_result(self, request_id: int, is_correct: bool | None, delivery: Delivery | None = None):
+        """ Process an incoming result by adding the result to the database in the next batch.
 
         :param request_id: ID of request
-        :param is_correct: whether result was correct or not
+        :param is_correct: whether result was correct or not, None if the evaluation failed
+        :param delivery: message the request was received with, acknowledged once the result is persisted
         :return: None
         """
         logging.info(f"Result with ID {request_id} received! Result was correct: {is_correct}")
-        self.db.add_evaluation_result(request_id, is_correct)
-        # TODO: save to db
+        self.result_sink.submit(request_id, is_correct, delivery.ack if delivery else None)
 
-    def on_request_received(self, body):
+    def on_request_received(self, body, delivery: Delivery | None = None):
         """ Process an incoming request by triggering the evaluation on the requests body.
 
         :param body: request body
+        :param delivery: message the request was received with, acknowledged once the result is persisted
         :return: None
         """
         logging.info("Request received! Starting to process request...")
-        request = json.loads(body, object_hook=lambda d: SimpleNamespace(**d))
-        self.run(BasicEvalRequest(request.requestId, request.taskId, request.inputAnswer))
+        try:
+            eval_request = BasicEvalRequest.from_body(body, delivery)
+        except (ValueError, AttributeError) as error:
+            logging.error(f"Discarding malformed request: {error}")
+            if delivery:
+                delivery.reject(requeue=False)
+            return
+
+        self.dispatch(eval_request)
+
+    def dispatch(self, request: BasicEvalRequest):
+        """ Run an evaluation in the worker pool, waiting for a free slot if all workers are busy.
+
+        :param request: evaluation request
+        :return: None
+        """
+        received_at = time.monotonic()
+        self.evaluation_slots.acquire()
+        self.executor.submit(self._run_in_slot, request, received_at)
+
+    def _run_in_slot(self, request: BasicEvalRequest, received_at: float):
+        """ Run an evaluation and free its slot afterwards.
+
+        :param request: evaluation request
+        :param received_at: monotonic time the request was received at
+        :return: None
+        """
+        QUEUE_WAIT.observe(time.monotonic() - received_at)
+        try:
+            with EVALUATION_SECONDS.time():
+                self.run(request)
+        except Exception:
+            logging.exception(f"Evaluation of request ({request}) failed!")
+            # retry once on another delivery, a request failing twice is dropped to avoid redelivery loops
+            if request.delivery:
+                request.delivery.reject(requeue=not request.delivery.redelivered)
+        finally:
+            self.evaluation_slots.release()
+
+    def shutdown(self):
+        """ Wait for all running evaluations to finish and persist their results.
+
+        :return: None
+        """
+        self.executor.shutdown(wait=True)
+        self.result_sink.close()
@@ -0,0 +1,152 @@
+import json
+import logging
+import threading
+from types import SimpleNamespace
+from typing import List
+
+from basic_evaluator import BasicEvalRequest, BasicEvaluator
+from rabbitmq_client import Delivery
+from sage_container import ContentFile
+
+
+class BatchDelivery:
+    """ This class acknowledges the message of a batch request once the results of all its answers are persisted.
+    """
+    def __init__(self, delivery: Delivery, pending: int):
+        """ Initialize a BatchDelivery instance.
+
+        :param delivery: message the batch request was received with
+        :param pending: amount of results to wait for
+        """
+        self.delivery = delivery
+        self.redelivered = delivery.redelivered
+        self.pending = pending
+        self.lock = threading.Lock()
+
+    def ack(self):
+        """ Count a persisted result and acknowledge the message once all results are persisted.
+
+        :return: None
+        """
+        with self.lock:
+            self.pending -= 1
+            done = self.pending == 0
+        if done:
+            self.delivery.ack()
+
+    def reject(self, requeue: bool = True):
+        """ Reject the message.
+
+        :param requeue: whether the broker should deliver the message again
+        :return: None
+        """
+        self.delivery.reject(requeue)
+
+
+class BatchEvalRequest:
+    """ This class represents a request to evaluate many answers for the same task.
+    """
+    def __init__(self, task_id: int, answers: List[BasicEvalRequest], delivery: BatchDelivery | None = None,
+                 priority: int = 0):
+        """ Initialize a BatchEvalRequest instance.
+
+        :param task_id: ID of task
+        :param answers: requests of the answers to evaluate
+        :param delivery: message the request was received with, acknowledged once all results are persisted
+        :param priority: priority of request when waiting for a container, higher priorities are served first
+        """
+        self.task_id = task_id
+        self.answers = answers
+        self.delivery = delivery
+        self.priority = priority
+
+    def __str__(self):
+        return "BatchRequest: task_id=" + str(self.task_id) + " request_ids=" + \
+               str([answer.request_id for answer in self.answers])
+
+
+class BatchEvaluator(BasicEvaluator):
+    """ This class represents an evaluator that evaluates many answers for the same task in one Sage process.
+    """
+    def get_queue_name(self):
+        """ Return the message queue name.
+
+        :return: string
+        """
+        return "TASK_BATCH_REQUEST"
+
+    def run(self, request: BatchEvalRequest):
+        """ Run a batch evaluation.
+
+        :param request: batch evaluation request
+        :return: None
+        """
+        # fetch data
+        bundle = self.get_bundle(request.task_id)
+        if not bundle:
+            logging.info("No data available, aborting...")
+            if request.delivery:
+                request.delivery.reject(requeue=False)
+            return
+
+        # identical submissions do not need to be evaluated again
+        cache_keys = {}
+        answers = []
+        for answer in request.answers:
+            cache_key = self.result_cache.get_key(bundle.digest, answer.input_answer)
+            cached_result = self.result_cache.get(cache_key)
+            if cached_result is None:
+                cache_keys[answer.request_id] = cache_key
+                answers.append(answer)
+            else:
+                self.on_result(answer.request_id, cached_result, request.delivery)
+        if not answers:
+            logging.info(f"Results of all answers of batch for task {request.task_id} are cached!")
+            return
+
+        # get a free container
+        container = self.get_executor(bundle).allocate_container(request.priority, affinity=bundle.affinity)
+        if not container:
+            logging.info(f"Could not run batch for task {request.task_id} because no docker container could be "
+                         f"allocated")
+            if request.delivery:
+                request.delivery.reject(requeue=True)
+            return
+
+        # stage evaluation script, it is kept across resets so that it is neither sent nor compiled again
+        container.upload_content_files([ContentFile(bundle.script_path, bundle.script)], persistent=True)
+
+        # prepare and launch
+        container.add_result_observer(lambda request_id, is_correct: self.on_evaluated(request_id, is_correct,
+                                                                                       cache_keys[request_id],
+                                                                                       request.delivery))
+        # the graph is shared by all runs, so it is sent once and appended to the answer of every run
+        runs = [(answer.request_id, [answer.input_answer]) for answer in answers]
+        container.run_script_batch(bundle.script_path, runs, self.get_time_limit(bundle), "base64", 1,
+                                   [bundle.graph_json])
+
+    def on_request_received(self, body, delivery: Delivery | None = None):
+        """ Process an incoming batch request by triggering the evaluation of all its answers.
+
+        :param body: request body
+        :param delivery: message the request was received with, acknowledged once all results are persisted
+        :return: None
+        """
+        logging.info("Batch request received! Starting to process request...")
+        try:
+            request = json.loads(body, object_hook=lambda d: SimpleNamespace(**d))
+            answers = [BasicEvalRequest(answer.requestId, request.taskId, answer.inputAnswer)
+                       for answer in request.answers]
+        except (ValueError, AttributeError, TypeError) as error:
+            logging.error(f"Discarding malformed batch request: {error}")
+            if delivery:
+                delivery.reject(requeue=False)
+            return
+
+        if not answers:
+            if delivery:
+                delivery.ack()
+            return
+
+        batch_delivery = BatchDelivery(delivery, len(answers)) if delivery else None
+        self.dispatch(BatchEvalRequest(request.taskId, answers, batch_delivery, getattr(request, "priority", 0)))
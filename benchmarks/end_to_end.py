@@ -0,0 +1,308 @@
+""" End-to-end benchmark of the evaluator against local stand-ins for RabbitMQ, Postgres and Docker/Sage.
+
+Requests of a JSON lines workload ({"taskId": ..., "inputAnswer": ..., "priority": ...} per line) are published
+at a configurable rate on an in-memory TASK_REQUEST queue, which delivers them to a BasicEvaluator like the broker
+does, honoring the prefetch count. The evaluator runs unchanged, only the external systems are replaced by fakes
+with configurable latency. Reports latency percentiles of every stage, throughput and pool utilization.
+
+With --local-workers, scripts really run in local Python servers of a LocalExecutor instead of fake containers.
+
+Run from the repository root with: python -m benchmarks.end_to_end --rate 100 --requests 2000
+"""
+import argparse
+import json
+import queue
+import random
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from typing import List
+
+import docker_container
+import docker_manager
+from basic_evaluator import BasicEvaluator
+from benchmarks.fakes import FakeDatabase, FakeDockerClient, FakeSageSession, Latency, StageTimer
+from docker_manager import DockerManager
+from local_executor import LocalExecutor
+from result_cache import ResultCache
+from sage_container import SageContainer
+
+
+class FakeDelivery:
+    """ This class represents a message delivered by the in-memory broker, see rabbitmq_client.Delivery.
+    """
+    def __init__(self, broker: "InMemoryBroker", published_at: float):
+        """ Initialize a FakeDelivery instance.
+
+        :param broker: broker the message was delivered by
+        :param published_at: time the message was published at
+        """
+        self.broker = broker
+        self.published_at = published_at
+        self.redelivered = False
+        self.settled = False
+        self.lock = threading.Lock()
+
+    def _settle(self) -> bool:
+        """ Mark this delivery as settled.
+
+        :return: whether the delivery was not settled before
+        """
+        with self.lock:
+            if self.settled:
+                return False
+            self.settled = True
+            return True
+
+    def ack(self):
+        """ Acknowledge the message.
+
+        :return: None
+        """
+        if self._settle():
+            self.broker.on_settled(self, acked=True)
+
+    def reject(self, requeue: bool = True):
+        """ Reject the message. Rejected messages are counted but not delivered again.
+
+        :param requeue: ignored
+        :return: None
+        """
+        if self._settle():
+            self.broker.on_settled(self, acked=False)
+
+
+class InMemoryBroker:
+    """ This class represents a message queue that delivers at most prefetch_count unacknowledged messages at once.
+    """
+    def __init__(self, prefetch_count: int):
+        """ Initialize an InMemoryBroker instance.
+
+        :param prefetch_count: max amount of unacknowledged messages
+        """
+        self.messages = queue.Queue()
+        self.unacknowledged = threading.BoundedSemaphore(prefetch_count)
+        self.queue_wait = StageTimer()
+        self.end_to_end = StageTimer()
+        self.acked = 0
+        self.rejected = 0
+        self.last_settled_at = None
+        self.settled = threading.Condition()
+
+    def publish(self, body: bytes):
+        """ Publish a message.
+
+        :param body: message body
+        :return: None
+        """
+        self.messages.put((body, time.perf_counter()))
+
+    def consume(self, callback):
+        """ Deliver messages to a callback in another thread.
+
+        :param callback: function called with the message body and a FakeDelivery
+        :return: None
+        """
+        def deliver():
+            while True:
+                body, published_at = self.messages.get()
+                self.unacknowledged.acquire()
+                self.queue_wait.record(time.perf_counter() - published_at)
+                callback(body, FakeDelivery(self, published_at))
+
+        threading.Thread(target=deliver, name="broker", daemon=True).start()
+
+    def on_settled(self, delivery: FakeDelivery, acked: bool):
+        """ Process a settled message.
+
+        :param delivery: settled delivery
+        :param acked: whether the message was acknowledged
+        :return: None
+        """
+        now = time.perf_counter()
+        self.unacknowledged.release()
+        with self.settled:
+            if acked:
+                self.acked += 1
+                self.end_to_end.record(now - delivery.published_at)
+            else:
+                self.rejected += 1
+            self.last_settled_at = now
+            self.settled.notify_all()
+
+    def wait_for(self, amount: int, timeout: float) -> bool:
+        """ Wait until an amount of messages was settled.
+
+        :param amount: amount of messages
+        :param timeout: max amount of seconds to wait
+        :return: whether all messages were settled
+        """
+        with self.settled:
+            return self.settled.wait_for(lambda: self.acked + self.rejected >= amount, timeout)
+
+
+def percentile(durations: List[float], share: float) -> float:
+    """ Get a percentile of durations using the nearest rank.
+
+    :param durations: sorted durations
+    :param share: percentile between 0 and 1
+    :return: percentile or 0 if there are no durations
+    """
+    if not durations:
+        return 0.0
+    return durations[min(len(durations) - 1, max(0, round(share * len(durations)) - 1))]
+
+
+def timed(timer: StageTimer, function):
+    """ Wrap a function so that the duration of every call is recorded.
+
+    :param timer: timer to record durations with
+    :param function: function to wrap
+    :return: wrapped function
+    """
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timer.record(time.perf_counter() - start)
+    return wrapper
+
+
+def load_workload(path: str) -> List[dict]:
+    """ Load a workload of requests without request IDs.
+
+    :param path: path of JSON lines file
+    :return: list of requests
+    """
+    with open(path) as workload_file:
+        return [json.loads(line) for line in workload_file if line.strip()]
+
+
+def run(args):
+    """ Run the benchmark and print its report.
+
+    :param args: parsed command line arguments
+    :return: None
+    """
+    # replace the external systems, the evaluator itself runs unchanged
+    FakeSageSession.latency = Latency(args.exec_latency)
+    docker_container.SageSession = FakeSageSession
+    docker_manager.docker_lib = SimpleNamespace(from_env=lambda: FakeDockerClient(Latency(args.create_latency)))
+    database = FakeDatabase(Latency(args.fetch_latency), Latency(args.persist_latency), args.graph_size)
+
+    if args.local_workers:
+        manager = LocalExecutor(args.local_workers, [sys.executable], sage=False, admission_timeout=args.timeout)
+    else:
+        manager = DockerManager(args.containers, args.ready_containers, reuse_containers=True, resident_sage=True,
+                                max_queue_size=args.requests, admission_timeout=args.timeout,
+                                warm_reserve=args.warm_reserve)
+    evaluator = BasicEvaluator(manager, max_workers=args.concurrency, database=database,
+                               result_batch_size=args.result_batch_size,
+                               result_flush_interval=args.result_flush_interval,
+                               result_cache=ResultCache(args.result_cache_size))
+
+    # time the stages the fakes cannot see
+    container_wait = StageTimer()
+    manager.allocate_container = timed(container_wait, manager.allocate_container)
+    sage_exec = StageTimer()
+    SageContainer._run_job = timed(sage_exec, SageContainer._run_job)
+    persist = StageTimer()
+    submit = evaluator.result_sink.submit
+
+    def timed_submit(request_id, is_correct, on_persisted=None):
+        submitted_at = time.perf_counter()
+
+        def on_timed_persisted():
+            persist.record(time.perf_counter() - submitted_at)
+            if on_persisted:
+                on_persisted()
+
+        submit(request_id, is_correct, on_timed_persisted)
+
+    evaluator.result_sink.submit = timed_submit
+
+    # sample the pool utilization while the benchmark runs
+    utilization = []
+    waiting = []
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.wait(0.05):
+            utilization.append(len(manager.occupied_containers) / manager.max_active_containers)
+            waiting.append(len(getattr(manager, "admission_queue", ())))
+
+    broker = InMemoryBroker(evaluator.get_prefetch_count())
+    broker.consume(evaluator.on_request_received)
+    threading.Thread(target=sample, name="sampler", daemon=True).start()
+
+    workload = load_workload(args.workload)
+    start = time.perf_counter()
+    publish_at = start
+    for request_id in range(args.requests):
+        # sleep until the scheduled time instead of a fixed delay, so that slow publishing does not lower the rate
+        time.sleep(max(0.0, publish_at - time.perf_counter()))
+        request = dict(workload[request_id % len(workload)], requestId=request_id)
+        if args.unique_answers:
+            # distinct answers cannot be answered from the result cache, so every request needs a container
+            request["inputAnswer"] = f"{request['inputAnswer']} # {request_id}"
+        broker.publish(json.dumps(request).encode("utf-8"))
+        publish_at += random.expovariate(args.rate) if args.poisson else 1 / args.rate
+
+    completed = broker.wait_for(args.requests, args.timeout)
+    elapsed = (broker.last_settled_at or time.perf_counter()) - start
+    sampling.set()
+    evaluator.shutdown()
+    manager.clear_all_containers()
+
+    print(f"{'stage':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    stages = [("queue wait", broker.queue_wait), ("db fetch", database.fetch_timer),
+              ("container wait", container_wait), ("sage exec", sage_exec), ("persist", persist),
+              ("end to end", broker.end_to_end)]
+    for name, timer in stages:
+        durations = sorted(timer.durations)
+        print(f"{name:<16}{len(durations):>8}" + "".join(f"{percentile(durations, share) * 1000:>10.1f}"
+                                                         for share in (0.5, 0.95, 0.99)))
+
+    print(f"\ncompleted: {completed}, acked: {broker.acked}, rejected: {broker.rejected}")
+    print(f"throughput: {broker.acked / elapsed:.1f} requests/s over {elapsed:.1f}s")
+    if utilization:
+        print(f"container utilization: mean {sum(utilization) / len(utilization):.0%}, max {max(utilization):.0%}")
+        print(f"requests waiting for a container: mean {sum(waiting) / len(waiting):.1f}, max {max(waiting)}")
+    print(f"result cache hit rate: {evaluator.result_cache.get_hit_rate():.0%}, "
+          f"bundle cache hit rate: {evaluator.bundle_cache.get_hit_rate():.0%}")
+    if container_wait.durations and not args.local_workers:
+        print(f"container affinity hit rate: {docker_manager.AFFINITY_HITS.value / len(container_wait.durations):.0%}")
+
+
+def main():
+    """ Parse the command line and run the benchmark.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the evaluator with fake external systems")
+    parser.add_argument("--workload", default="benchmarks/workload.jsonl", help="JSON lines file of requests")
+    parser.add_argument("--requests", type=int, default=1000, help="amount of requests to publish")
+    parser.add_argument("--rate", type=float, default=100, help="requests published per second")
+    parser.add_argument("--poisson", action="store_true", help="publish with exponential inter-arrival times")
+    parser.add_argument("--unique-answers", action="store_true", help="make every answer distinct to bypass caching")
+    parser.add_argument("--containers", type=int, default=10, help="max amount of active containers")
+    parser.add_argument("--local-workers", type=int, default=0, help="run scripts in local Python servers instead")
+    parser.add_argument("--ready-containers", type=int, default=1, help="amount of containers kept ready")
+    parser.add_argument("--warm-reserve", type=int, default=0, help="hottest tasks keeping a warm container")
+    parser.add_argument("--concurrency", type=int, default=10, help="max amount of concurrent evaluations")
+    parser.add_argument("--fetch-latency", type=float, default=0.005, help="seconds to load a task")
+    parser.add_argument("--exec-latency", type=float, default=0.05, help="seconds to run a script")
+    parser.add_argument("--persist-latency", type=float, default=0.01, help="seconds to write a batch of results")
+    parser.add_argument("--create-latency", type=float, default=0.5, help="seconds to create a container")
+    parser.add_argument("--graph-size", type=int, default=50, help="amount of vertices and edges of every graph")
+    parser.add_argument("--result-batch-size", type=int, default=100, help="results written per batch")
+    parser.add_argument("--result-flush-interval", type=float, default=0.5, help="max seconds a result is buffered")
+    parser.add_argument("--result-cache-size", type=int, default=10000, help="results memoized in memory")
+    parser.add_argument("--timeout", type=float, default=120, help="max seconds to wait for all requests")
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+""" Local stand-ins for Postgres, Docker and the Sage server with configurable latency.
+
+The stand-ins implement just the parts of the psycopg2-backed Database, the docker client and SageSession the
+evaluator uses, so the evaluator itself runs unchanged while the external systems cost a known amount of time.
+"""
+import itertools
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+from database import BasicEvalRequestData
+from model.graph_model import Edge, Graph, Vertex
+
+
+class Latency:
+    """ This class represents the latency of a fake operation, uniformly distributed around a mean.
+    """
+    def __init__(self, mean: float, jitter: float = 0.2):
+        """ Initialize a Latency instance.
+
+        :param mean: mean latency in seconds
+        :param jitter: max relative deviation from the mean
+        """
+        self.mean = mean
+        self.jitter = jitter
+
+    def sleep(self):
+        """ Sleep for a random latency.
+
+        :return: None
+        """
+        if self.mean > 0:
+            time.sleep(self.mean * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+class StageTimer:
+    """ This class collects the durations of a stage from many threads.
+    """
+    def __init__(self):
+        """ Initialize a StageTimer instance.
+        """
+        self.durations = []
+        self.lock = threading.Lock()
+
+    def record(self, duration: float):
+        """ Record the duration of a stage.
+
+        :param duration: duration in seconds
+        :return: None
+        """
+        with self.lock:
+            self.durations.append(duration)
+
+
+class FakeDatabase:
+    """ This class represents a database serving generated graphs and accepting results after a latency.
+    """
+    def __init__(self, fetch_latency: Latency, persist_latency: Latency, graph_size: int = 50):
+        """ Initialize a FakeDatabase instance.
+
+        :param fetch_latency: latency of loading a task
+        :param persist_latency: latency of writing a batch of results
+        :param graph_size: amount of vertices and edges of every graph
+        """
+        self.fetch_latency = fetch_latency
+        self.persist_latency = persist_latency
+        self.graph_size = graph_size
+        self.fetch_timer = StageTimer()
+        self.persisted = 0
+
+    def get_basic_eval_request_data(self, task_id: int) -> BasicEvalRequestData:
+        """ Load a generated task.
+
+        :param task_id: ID of task
+        :return: BasicEvalRequestData
+        """
+        start = time.perf_counter()
+        self.fetch_latency.sleep()
+        vertices = [Vertex(vertex_id, f"v{vertex_id}", vertex_id, vertex_id) for vertex_id in range(self.graph_size)]
+        edges = [Edge(vertices[index], vertices[(index + 1) % self.graph_size], "e")
+                 for index in range(self.graph_size)]
+        data = BasicEvalRequestData(Graph(task_id, f"graph {task_id}", vertices, edges), f"print({task_id} > 0)",
+                                    task_id)
+        self.fetch_timer.record(time.perf_counter() - start)
+        return data
+
+    def add_evaluation_results(self, results: List):
+        """ Accept a batch of results.
+
+        :param results: list of (request ID, whether answer is correct, evaluation timestamp)
+        :return: None
+        """
+        self.persist_latency.sleep()
+        self.persisted += len(results)
+
+    def close(self):
+        """ Close the fake database.
+
+        :return: None
+        """
+
+
+class FakeSageSession:
+    """ This class represents a resident Sage server whose runs take a configurable time.
+    """
+    latency = Latency(0.05)
+
+    def __init__(self, container_id: str, docker_client, workdir: str):
+        """ Initialize a FakeSageSession instance.
+
+        :param container_id: ID of container
+        :param docker_client: docker client
+        :param workdir: working directory
+        """
+
+    def run(self, script: str, args: List[str], time_limit=None, files: Dict | None = None, args_encoding=None,
+            graph_arg=None) -> dict:
+        """ Run a script.
+
+        :return: response of a successful run
+        """
+        self.latency.sleep()
+        return {"output": "True\n", "failed": False, "timed_out": False}
+
+    def run_batch(self, script: str, runs: List, time_limit=None, files: Dict | None = None, args_encoding=None,
+                  graph_arg=None, shared_args=None) -> List[dict]:
+        """ Run a script for several runs.
+
+        :return: responses of successful runs
+        """
+        return [dict(self.run(script, args), id=run_id) for run_id, args in runs]
+
+    def is_alive(self) -> bool:
+        """ Check whether the server is running.
+
+        :return: True
+        """
+        return True
+
+    def close(self):
+        """ Close the session.
+
+        :return: None
+        """
+
+
+class FakePhysicalContainer:
+    """ This class represents a docker container that accepts every command.
+    """
+    def __init__(self, name: str):
+        """ Initialize a FakePhysicalContainer instance.
+
+        :param name: name of container
+        """
+        self.name = name
+        self.id = name
+        self.status = "running"
+
+    def start(self):
+        """ Start the container. """
+
+    def reload(self):
+        """ Reload the container status. """
+
+    def stop(self):
+        """ Stop the container. """
+
+    def remove(self):
+        """ Remove the container. """
+
+    def put_archive(self, path: str, data: bytes):
+        """ Copy files to the container. """
+
+    def exec_run(self, cmd, **kwargs) -> SimpleNamespace:
+        """ Run a command successfully without output. """
+        return SimpleNamespace(exit_code=0, output=b"")
+
+    def stats(self, stream: bool = False, one_shot: bool = False) -> dict:
+        """ Get resource usage statistics. """
+        return {"memory_stats": {"usage": 0}}
+
+
+class FakeContainers:
+    """ This class represents the container collection of a docker client, creating containers after a latency.
+    """
+    def __init__(self, create_latency: Latency):
+        """ Initialize a FakeContainers instance.
+
+        :param create_latency: latency of creating and starting a container
+        """
+        self.create_latency = create_latency
+        self.containers = {}
+        self.names = itertools.count()
+        self.lock = threading.Lock()
+
+    def create(self, image: str, **kwargs) -> FakePhysicalContainer:
+        """ Create a container.
+
+        :param image: ignored image name
+        :return: FakePhysicalContainer
+        """
+        self.create_latency.sleep()
+        with self.lock:
+            container = FakePhysicalContainer(f"fake-{next(self.names)}")
+            self.containers[container.name] = container
+        return container
+
+    def get(self, name: str) -> FakePhysicalContainer:
+        """ Get a container by name.
+
+        :param name: name of container
+        :return: FakePhysicalContainer
+        """
+        with self.lock:
+            return self.containers[name]
+
+    def list(self, **kwargs) -> List[FakePhysicalContainer]:
+        """ List containers left over by an earlier run, there are none.
+
+        :return: empty list
+        """
+        return []
+
+
+class FakeDockerClient:
+    """ This class represents a docker client managing fake containers.
+    """
+    def __init__(self, create_latency: Latency):
+        """ Initialize a FakeDockerClient instance.
+
+        :param create_latency: latency of creating and starting a container
+        """
+        self.containers = FakeContainers(create_latency)
+        self.images = SimpleNamespace(get=lambda image: SimpleNamespace(id=image), pull=lambda *args, **kwargs: None)
+        self.api = None
+
+    def info(self) -> dict:
+        """ Get host information.
+
+        :return: amount of CPUs and memory of this host
+        """
+        return {"NCPU": 4, "MemTotal": 16 * 1024 ** 3}
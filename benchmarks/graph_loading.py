@@ -0,0 +1,123 @@
+""" Benchmark of loading graphs of 10^3 to 10^5 elements from database rows.
+
+The database is replaced by a cursor serving prepared rows, so only decoding and graph construction are measured.
+Run from the repository root with: python -m benchmarks.graph_loading
+"""
+import argparse
+import time
+import tracemalloc
+
+from database import Database
+
+
+class InMemoryCursor:
+    """ This class represents a server-side cursor serving prepared rows of the graph elements query.
+    """
+    def __init__(self, rows: list):
+        """ Initialize an InMemoryCursor instance.
+
+        :param rows: rows to serve
+        """
+        self.rows = rows
+        self.position = 0
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params):
+        """ Start serving the rows from the beginning.
+
+        :param query: ignored query
+        :param params: ignored query parameters
+        :return: None
+        """
+        self.position = 0
+
+    def fetchmany(self, size: int) -> list:
+        """ Fetch the next rows.
+
+        :param size: max amount of rows
+        :return: rows
+        """
+        rows = self.rows[self.position:self.position + size]
+        self.position += size
+        return rows
+
+
+class InMemoryConnection:
+    """ This class represents a database connection whose cursors serve prepared rows.
+    """
+    def __init__(self, rows: list):
+        """ Initialize an InMemoryConnection instance.
+
+        :param rows: rows to serve
+        """
+        self.rows = rows
+
+    def cursor(self, name: str | None = None) -> InMemoryCursor:
+        """ Open a cursor serving the prepared rows.
+
+        :param name: ignored cursor name
+        :return: InMemoryCursor
+        """
+        return InMemoryCursor(self.rows)
+
+
+def create_rows(element_amount: int) -> list:
+    """ Create rows of the graph elements query for a graph with as many edges as vertices.
+
+    :param element_amount: amount of vertices and edges
+    :return: rows, vertices first
+    """
+    vertex_amount = element_amount // 2
+    vertices = [("v", vertex_id, f"v{vertex_id}", vertex_id, vertex_id, None, None)
+                for vertex_id in range(vertex_amount)]
+    edges = [("e", edge_id, f"e{edge_id}", None, None, edge_id, (edge_id + 1) % vertex_amount)
+             for edge_id in range(element_amount - vertex_amount)]
+    return vertices + edges
+
+
+def benchmark(element_amount: int, fetch_size: int, repetitions: int):
+    """ Load a graph several times and print the best time and the peak memory of a single load.
+
+    :param element_amount: amount of vertices and edges
+    :param fetch_size: amount of elements fetched at once
+    :param repetitions: amount of loads
+    :return: None
+    """
+    conn = InMemoryConnection(create_rows(element_amount))
+
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        Database._get_graph(conn, 1, "graph", fetch_size)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    Database._get_graph(conn, 1, "graph", fetch_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{element_amount:>8} elements: {min(timings) * 1000:8.2f} ms, peak {peak / 1024 ** 2:7.2f} MiB")
+
+
+def main():
+    """ Run the benchmark for all graph sizes.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark graph loading")
+    parser.add_argument("--fetch-size", type=int, default=2000, help="amount of elements fetched at once")
+    parser.add_argument("--repetitions", type=int, default=5, help="amount of loads per graph size")
+    args = parser.parse_args()
+
+    for element_amount in (10 ** 3, 10 ** 4, 10 ** 5):
+        benchmark(element_amount, args.fetch_size, args.repetitions)
+
+
+if __name__ == '__main__':
+    main()
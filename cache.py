@@ -0,0 +1,101 @@
+import collections
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+from metrics import REGISTRY
+
+
+class LRUCache:
+    """ This class represents a thread-safe cache with a max size and an optional time to live for its entries.
+
+    Once the cache is full, the least recently used entry is evicted.
+    """
+    def __init__(self, name: str, max_size: int, ttl: float | None = None):
+        """ Initialize an LRUCache instance.
+
+        :param name: name of cache, used to name its metrics
+        :param max_size: max amount of entries
+        :param ttl: amount of seconds after which an entry expires (None = never)
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = REGISTRY.counter(f"{name}_cache_hits_total", f"Hits of the {name} cache")
+        self.misses = REGISTRY.counter(f"{name}_cache_misses_total", f"Misses of the {name} cache")
+        REGISTRY.gauge(f"{name}_cache_hit_ratio", f"Share of lookups that hit the {name} cache").set_function(
+            self.get_hit_rate)
+
+    def get(self, key: Hashable) -> Any | None:
+        """ Get the value of an entry.
+
+        :param key: key of entry
+        :return: value or None if there is no valid entry
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits.inc()
+                    return value
+                del self.entries[key]
+
+        self.misses.inc()
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        """ Add or replace an entry.
+
+        :param key: key of entry
+        :param value: value of entry
+        :return: None
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[Hashable], Any]) -> Any | None:
+        """ Get the value of an entry, loading and adding it on a miss. None values are not cached.
+
+        :param key: key of entry
+        :param loader: function that loads the value for a key
+        :return: value
+        """
+        value = self.get(key)
+        if value is None:
+            value = loader(key)
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        """ Remove an entry.
+
+        :param key: key of entry
+        :return: None
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """ Remove all entries.
+
+        :return: None
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def get_hit_rate(self) -> float:
+        """ Get the share of lookups that were hits.
+
+        :return: hit rate between 0 and 1
+        """
+        lookups = self.hits.value + self.misses.value
+        return self.hits.value / lookups if lookups else 0.0
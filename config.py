@@ -0,0 +1,56 @@
+""" Settings of the evaluator shared by the threaded engine (main.py) and the asyncio engine (async_main.py).
+"""
+from sage_session import TimeLimit
+
+# every worker process has its own broker connections, database pool and share of the container budget
+WORKER_PROCESSES = 1
+BROKER_HOST = "127.0.0.1"
+# every worker process serves its metrics on http://METRICS_HOST:(METRICS_PORT + worker index)/metrics, None disables
+METRICS_HOST = "0.0.0.0"
+METRICS_PORT = 8000
+DB_HOST = "localhost"
+DB_NAME = "mathgrass_db"
+DB_USER = "postgres"
+DB_PASSWORD = "postgres"
+DB_MIN_CONNECTIONS = 1
+DB_MAX_CONNECTIONS = 10
+DB_GRAPH_FETCH_SIZE = 2000
+# pinning a digest (sagemath/sagemath@sha256:...) skips all pulls once the image is present, an image given by tag is
+# used right away if present and pulled again in the background if REFRESH_IMAGE is set
+SAGE_IMAGE = "sagemath/sagemath"
+REFRESH_IMAGE = True
+# None sizes the container pool from the CPUs and memory of the host
+MAX_ACTIVE_CONTAINERS = None
+CONTAINER_CPUS = 1.0
+CONTAINER_MEMORY_LIMIT = 3 * 1024 ** 3
+CONTAINER_PIDS_LIMIT = 256
+HOST_MEMORY_RESERVE = 2 * 1024 ** 3
+READY_CONTAINERS = 1
+REUSE_CONTAINERS = True
+MAX_JOBS_PER_CONTAINER = 50
+MAX_CONTAINER_MEMORY = 2 * 1024 ** 3
+# seconds between health and memory checks of ready containers, None disables them
+HEALTH_CHECK_INTERVAL = 30
+RESIDENT_SAGE = True
+MAX_CONCURRENT_EVALUATIONS = 10
+MAX_QUEUE_SIZE = 100
+ADMISSION_TIMEOUT = 60
+PREWARM_FANOUT = 4
+WARM_RESERVE = 2
+BUNDLE_CACHE_SIZE = 256
+BUNDLE_CACHE_TTL = 300
+RESULT_BATCH_SIZE = 100
+RESULT_FLUSH_INTERVAL = 0.5
+RESULT_CACHE_SIZE = 10000
+# worker processes of main.py add their index to the file name, e.g. result_cache-0.sqlite
+RESULT_CACHE_PATH = "result_cache.sqlite"
+DEFAULT_TIME_LIMIT = TimeLimit(wall_seconds=60, cpu_seconds=30)
+# time limits of task solvers by task solver ID
+TASK_SOLVER_TIME_LIMITS = {}
+# IDs of trusted task solvers whose scripts run in local Sage servers instead of docker containers
+LOCAL_TASK_SOLVERS = set()
+LOCAL_WORKERS = 4
+LOCAL_INTERPRETER = ["sage", "-python"]
+LOCAL_MEMORY_LIMIT = 2 * 1024 ** 3
+LOCAL_FILE_SIZE_LIMIT = 64 * 1024 ** 2
+LOCAL_MAX_OPEN_FILES = 256
@@ -1,200 +1,312 @@
+import contextlib
 import datetime
 import logging
-from typing import Tuple, List, Dict
+import threading
+import time
+from typing import Callable, Tuple, List, Dict, Iterator
 
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
 
 from model.graph_model import Edge, Graph, Vertex
 
+# queries are shared with AsyncDatabase, which fills in the placeholders of its driver
+TASK_QUERY_TEMPLATE = """
+    SELECT ts.id, ts.execution_descriptor, g.id, g.label
+    FROM tasks AS t
+    INNER JOIN tasktemplates AS tt ON tt.id = t.task_template_id
+    INNER JOIN tasksolvers AS ts ON ts.id = tt.task_solver_id
+    INNER JOIN graphs AS g ON g.id = t.graph_id
+    WHERE t.id = {task_id}
+"""
+
+UPDATE_RESULTS_QUERY_TEMPLATE = """
+    UPDATE taskresults AS tr
+    SET answer_true = v.answer_true, evaluation_date = v.evaluation_date
+    FROM {results} AS v (id, answer_true, evaluation_date)
+    WHERE tr.id = v.id
+"""
+
+GRAPH_ELEMENTS_QUERY_TEMPLATE = """
+    SELECT 'v' AS kind, v.id, v.label, v.x, v.y, NULL AS v1_id, NULL AS v2_id
+    FROM graphs_vertices AS gv
+    INNER JOIN vertices AS v ON v.id = gv.vertices_id
+    WHERE gv.graph_entity_id = {graph_id}
+    UNION ALL
+    SELECT 'e' AS kind, e.id, e.label, NULL, NULL, e.v1_id, e.v2_id
+    FROM graphs_edges AS ge
+    INNER JOIN edges AS e ON e.id = ge.edges_id
+    WHERE ge.graph_entity_id = {graph_id}
+    ORDER BY kind DESC
+"""
+
+TASK_QUERY = TASK_QUERY_TEMPLATE.format(task_id="%s")
+UPDATE_RESULTS_QUERY = UPDATE_RESULTS_QUERY_TEMPLATE.format(results="(VALUES %s)")
+GRAPH_ELEMENTS_QUERY = GRAPH_ELEMENTS_QUERY_TEMPLATE.format(graph_id="%(graph_id)s")
+
+# name of the server-side cursor graph elements are streamed with
+GRAPH_ELEMENTS_CURSOR = "graph_elements"
+
 
 class BasicEvalRequestData:
     """ This class represents a data structure for evaluation requests.
     """
-    def __init__(self, graph: Graph, script: str):
+    def __init__(self, graph: Graph, script: str, task_solver_id: int | None = None):
         """ Initialize a BasicEvalRequestData instance.
 
         :param graph: graph
         :param script: script to run
+        :param task_solver_id: ID of task solver the script belongs to
         """
         self.graph = graph
         self.script = script
+        self.task_solver_id = task_solver_id
 
 
 class Database:
     """ This class represents an interface to a database instance.
     """
-    def __init__(self):
-        """ Initialize a Database instance and connect to a database.
+    def __init__(self, host: str = "localhost", database: str = "mathgrass_db", user: str = "postgres",
+                 password: str = "postgres", min_connections: int = 1, max_connections: int = 10,
+                 health_check_interval: float = 30, graph_fetch_size: int = 2000):
+        """ Initialize a Database instance and open a pool of connections to a database.
+
+        :param host: host address
+        :param database: name of database
+        :param user: user name
+        :param password: password
+        :param min_connections: amount of connections kept open
+        :param max_connections: max amount of connections, callers wait once all connections are in use
+        :param health_check_interval: amount of seconds a connection may be idle before it is checked on checkout
+        :param graph_fetch_size: amount of graph elements fetched from the database at once
         """
-        # TODO: make db configurable
-        try:
-            self.conn = psycopg2.connect(
-                host="localhost",
-                database="mathgrass_db",
-                user="postgres",
-                password="postgres")
-            logging.info("Connection to database established!")
-
-        except (Exception, psycopg2.DatabaseError) as error:
-            logging.error(error)
-            if self.conn is not None:
-                self.conn.close()
-                logging.error("Database connection closed!")
-            
-    def _get_task_template_and_graph_id(self, task_id: int) -> Tuple[int, int] | None:
-        """ Get the task template ID and the graph ID for a given task ID.
+        self.connection_params = {"host": host, "database": database, "user": user, "password": password}
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self.graph_fetch_size = graph_fetch_size
+        self.connection_slots = threading.BoundedSemaphore(max_connections)
+        self.last_used = {}
+        self.pool_lock = threading.Lock()
+        self.pool = None
+        self._open_pool()
+
+    def _open_pool(self) -> bool:
+        """ Open the connection pool if it is not open yet.
+
+        :return: whether the pool is open
+        """
+        with self.pool_lock:
+            if self.pool is not None:
+                return True
+            try:
+                self.pool = psycopg2.pool.ThreadedConnectionPool(self.min_connections, self.max_connections,
+                                                                 **self.connection_params)
+                logging.info("Connection to database established!")
+            except (Exception, psycopg2.DatabaseError) as error:
+                logging.error(error)
+            return self.pool is not None
+
+    def close(self):
+        """ Close all connections of the pool.
 
-        :param task_id: ID of task
-        :return: (task template ID, graph ID)
+        :return: None
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM tasks WHERE id = " + str(task_id))
-        tasks = self.get_cursor_elements_as_dicts(cursor)
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+
+    def _is_healthy(self, conn) -> bool:
+        """ Check whether a connection can still be used, querying the database if it was idle for a while.
 
+        :param conn: connection to check
+        :return: whether connection is healthy
+        """
+        if conn.closed:
+            return False
+        if time.monotonic() - self.last_used.get(id(conn), 0) < self.health_check_interval:
+            return True
         try:
-            task = next(tasks)
-        except IndexError:
-            logging.error(f"Task with ID {task_id} not found!")
-            return None
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextlib.contextmanager
+    def connection(self):
+        """ Borrow a healthy connection from the pool, reconnecting if necessary.
+
+        :return: context manager yielding a connection
+        """
+        with self.connection_slots:
+            if not self._open_pool():
+                raise psycopg2.OperationalError("Database is not available")
+
+            conn = self.pool.getconn()
+            while not self._is_healthy(conn):
+                logging.info("Discarding broken database connection, reconnecting...")
+                self._put_connection(conn, close=True)
+                conn = self.pool.getconn()
+
+            broken = False
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                if not broken and not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+                    conn.rollback()
+                self._put_connection(conn, close=broken or bool(conn.closed))
+
+    def _put_connection(self, conn, close: bool = False):
+        """ Return a connection to the pool, remembering when it was used as long as it is open.
+
+        :param conn: borrowed connection
+        :param close: whether to close the connection
+        :return: None
+        """
+        self.last_used[id(conn)] = time.monotonic()
+        self.pool.putconn(conn, close=close)
+        # the pool also closes connections beyond its minimum, the ID of a closed connection may be reused
+        if conn.closed:
+            self.last_used.pop(id(conn), None)
 
-        return task["task_template_id"], task["graph_id"]
-   
-    def _get_task_solver_id(self, task_template_id: int) -> int | None:
-        """ Get the task solver ID for a given task template ID.
+    def _run(self, operation: Callable):
+        """ Run an operation with a borrowed connection, retrying once on a fresh connection if the connection broke.
 
-        :param task_template_id: ID of task template
-        :return: ID of task solver
+        :param operation: function taking a connection
+        :return: result of operation
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM tasktemplates WHERE id = " + str(task_template_id))
-        task_templates = self.get_cursor_elements_as_dicts(cursor)
-
         try:
-            task_template = next(task_templates)
-        except IndexError:
-            logging.error(f"Task template with ID {task_template_id} not found!")
-            return None
+            with self.connection() as conn:
+                return operation(conn)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as error:
+            logging.error(f"Database connection lost, retrying: {error}")
+            with self.connection() as conn:
+                return operation(conn)
 
-        return task_template["task_solver_id"]
-
-    def _get_execution_descriptor(self, task_solver_id: int) -> str | None:
-        """ Get the execution descriptor for given task solver ID.
+    @staticmethod
+    def _get_task(conn, task_id: int) -> Tuple[int, str, int, str] | None:
+        """ Get the execution descriptor and the graph of a task by resolving its task template and task solver.
 
-        :param task_solver_id: ID of task solver
-        :return: execution descriptor (script)
+        :param conn: database connection
+        :param task_id: ID of task
+        :return: (task solver ID, execution descriptor, graph ID, graph label)
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM tasksolvers WHERE id = " + str(task_solver_id))
-        task_solvers = self.get_cursor_elements_as_dicts(cursor)
+        cursor = conn.cursor()
+        cursor.execute(TASK_QUERY, (task_id,))
+        task = cursor.fetchone()
 
-        try:
-            task_solver = next(task_solvers)
-        except IndexError:
-            logging.error(f"Task solver with ID {task_solver_id} not found!")
+        if task is None:
+            logging.error(f"Task with ID {task_id} not found!")
             return None
 
-        return task_solver["execution_descriptor"]
+        return task
+
+    @staticmethod
+    def _get_graph(conn, graph_id: int, graph_label: str, fetch_size: int = 2000) -> Graph:
+        """ Get the graph for specified graph ID by streaming its vertices and edges in one query.
 
-    def _get_graph(self, graph_id: int) -> Graph | None:
-        """ Get the graph for specified graph ID.
+        Elements are fetched in batches from a server-side cursor, so neither the database driver nor this process
+        hold all raw rows of a large graph at once.
 
+        :param conn: database connection
         :param graph_id: ID of graph to load
+        :param graph_label: label of graph
+        :param fetch_size: amount of elements fetched at once
         :return: Graph
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM graphs WHERE id = " + str(graph_id))
-        graphs = self.get_cursor_elements_as_dicts(cursor)
-
-        try:
-            graph = next(graphs)
-        except IndexError:
-            logging.info(f"Graph with ID {graph_id} not found")
-            return None
-
-        # create graph string
-        vertices = self._get_vertices(graph_id)
-        edges = self._get_edges(graph_id)
-
-        # build graph
         vertex_dict = {}
-        for vertex in vertices:
-            vertex_dict[vertex["id"]] = Vertex(vertex["id"], vertex["label"], vertex["x"], vertex["y"])
-        
         edge_obj_list = []
-        for edge in edges:
-            edge_obj_list.append(Edge(vertex_dict[edge["v1_id"]], vertex_dict[edge["v2_id"]], edge["label"]))
-
-        return Graph(graph["id"], graph["label"], list(vertex_dict.values()), edge_obj_list)
-
-    def _get_edges(self, graph_id: int):
-        """ Get the edges of the graph with specified graph ID.
-
-        :param graph_id: ID of graph
-        :return: edges
-        """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM graphs_edges AS ge INNER JOIN edges AS e ON e.id = ge.edges_id "
-                       "WHERE graph_entity_id = " + str(graph_id))
-        edges = self.get_cursor_elements_as_dicts(cursor)
-
-        return edges
-
-    def _get_vertices(self, graph_id: int):
-        """ Get the vertices of the graph with specified graph ID.
-
-        :param graph_id: ID of graph
-        :return: vertices
-        """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM graphs_vertices AS gv INNER JOIN vertices AS v ON v.id = gv.vertices_id "
-                       "WHERE graph_entity_id = " + str(graph_id))
-        vertices = self.get_cursor_elements_as_dicts(cursor)
-
-        return vertices
-
-    def get_basic_eval_request_data(self, task_id: int) -> BasicEvalRequestData:
+        with conn.cursor(name=GRAPH_ELEMENTS_CURSOR) as cursor:
+            cursor.itersize = fetch_size
+            cursor.execute(GRAPH_ELEMENTS_QUERY, {"graph_id": graph_id})
+
+            # build graph in one pass, vertices are returned before edges
+            rows = cursor.fetchmany(fetch_size)
+            while rows:
+                for kind, element_id, label, x, y, v1_id, v2_id in rows:
+                    if kind == "v":
+                        vertex_dict[element_id] = Vertex(element_id, label, x, y)
+                    else:
+                        edge_obj_list.append(Edge(vertex_dict[v1_id], vertex_dict[v2_id], label))
+                rows = cursor.fetchmany(fetch_size)
+
+        return Graph(graph_id, graph_label, list(vertex_dict.values()), edge_obj_list)
+
+    def get_basic_eval_request_data(self, task_id: int) -> BasicEvalRequestData | None:
         """ Get data for evaluation request for specified task ID.
 
         :param task_id: ID of task
-        :return: BasicEvalRequestData
+        :return: BasicEvalRequestData or None if task does not exist
         """
-        task_template_id, graph_id = self._get_task_template_and_graph_id(task_id)
+        def load(conn):
+            task = self._get_task(conn, task_id)
+            if task is None:
+                return None
+
+            task_solver_id, script, graph_id, graph_label = task
+            graph = self._get_graph(conn, graph_id, graph_label, self.graph_fetch_size)
 
-        task_solver_id = self._get_task_solver_id(task_template_id)
-        script = self._get_execution_descriptor(task_solver_id)
-        graph = self._get_graph(graph_id)
+            return BasicEvalRequestData(graph, script, task_solver_id)
 
-        return BasicEvalRequestData(graph, script)
+        return self._run(load)
 
     @staticmethod
-    def get_cursor_elements_as_dicts(cursor) -> Dict:
-        """ Load cursor elements as a dictionary.
+    def get_cursor_elements_as_dicts(cursor, fetch_size: int = 2000) -> Iterator[Dict]:
+        """ Load cursor elements as dictionaries, fetching them in batches.
 
         :param cursor: DB cursor
-        :return: dictionary
+        :param fetch_size: amount of elements fetched at once
+        :return: iterator of dictionaries
         """
         colnames = [desc[0] for desc in cursor.description]
-        for row in cursor.fetchall():
-            d = {}
-            for i in range(len(colnames)):
-                d[colnames[i]] = row[i]
-            yield d
+        rows = cursor.fetchmany(fetch_size)
+        while rows:
+            for row in rows:
+                yield dict(zip(colnames, row))
+            rows = cursor.fetchmany(fetch_size)
 
-    def add_evaluation_result(self, request_id: int, answer_is_true: bool):
+    def add_evaluation_result(self, request_id: int, answer_is_true: bool | None):
         """ Add an evaluation result to the database.
 
         :param request_id: ID of request
-        :param answer_is_true: whether answer is correct or not
+        :param answer_is_true: whether answer is correct or not, None if the evaluation failed
         :return: None
         """
         # get current timestamp
         timestamp = datetime.datetime.now().isoformat()
 
-        # update task result with id = request_id (table name is taskresults)
-        cur = self.conn.cursor()
-        answer_true = "true" if answer_is_true else "false"
-        sql = "UPDATE taskresults SET answer_true = %s, evaluation_date = %s WHERE id = %s"
-        cur.execute(sql, (str(answer_true), str(timestamp), str(request_id)))
+        def update(conn):
+            # update task result with id = request_id (table name is taskresults)
+            cur = conn.cursor()
+            answer_true = None if answer_is_true is None else "true" if answer_is_true else "false"
+            sql = "UPDATE taskresults SET answer_true = %s, evaluation_date = %s WHERE id = %s"
+            cur.execute(sql, (answer_true, str(timestamp), str(request_id)))
 
-        # commit
-        self.conn.commit()
+            # commit
+            conn.commit()
+
+        self._run(update)
+
+    def add_evaluation_results(self, results: List[Tuple[int, bool | None, str]]):
+        """ Add several evaluation results to the database in one statement and commit.
+
+        :param results: list of (request ID, whether answer is correct or not or None if the evaluation failed,
+                        evaluation timestamp)
+        :return: None
+        """
+        def update(conn):
+            cur = conn.cursor()
+            psycopg2.extras.execute_values(cur, UPDATE_RESULTS_QUERY, results,
+                                           template="(%s::bigint, %s::boolean, %s::timestamp)",
+                                           page_size=len(results))
+            conn.commit()
+
+        self._run(update)
@@ -1,25 +1,18 @@
 import io
 import logging
+import os
 import tarfile
-from typing import Any, List
+from typing import List
 
 from docker import DockerClient
 
+from sage_container import ContentFile, SageContainer
+from sage_session import SageSession
 
-class ContentFile:
-    """ This class represents a file with content and the files' path.
-    """
-    def __init__(self, filepath: str, content: Any):
-        """ Initialize a ContentFile instance.
-
-        :param filepath: filepath of file
-        :param content: content of file
-        """
-        self.filepath = filepath
-        self.content = content
+WORKDIR = "/home/sage/sage"
 
 
-class DockerContainer:
+class DockerContainer(SageContainer):
     """ This class represents Docker containers.
     """
     def __init__(self, name: str, docker_client: DockerClient):
@@ -28,15 +21,15 @@ class DockerContainer:
         :param name: name of container
         :param docker_client: docker client
         """
-        self.result_observers = []
-        self.name = name
+        super().__init__(name)
         self.docker_client = docker_client
         self.phy_container = self.docker_client.containers.get(self.name)
+        self.server_uploaded = False
 
-    def upload_content_files(self, content_files: List[ContentFile]):
-        """ Upload a list of config files.
+    def _put_archive(self, content_files: List[ContentFile]):
+        """ Copy a list of content files to the working directory of the container in a tar archive.
 
-        :param content_files: list of config files
+        :param content_files: list of content files
         :return: None
         """
         logging.info("Creating archive...")
@@ -51,58 +44,63 @@ class DockerContainer:
                 tar.addfile(info, io.BytesIO(initial_bytes=data))
 
         # upload tar file
-        self._upload_tar_file_inner(fh.getvalue())
-
-    def _upload_tar_file_inner(self, tar_data: tarfile):
-        """ Upload a tar file to the container.
-
-        :param tar_data: tar file with ContentFiles
-        :return: None
-        """
         self.phy_container.start()
         logging.info("Uploading content files...")
-        self.phy_container.put_archive(path="/home/sage/sage", data=tar_data)
+        self.phy_container.put_archive(path=WORKDIR, data=fh.getvalue())
 
-    def run_task_solver(self, command: str, request_id: int):
-        """ Run the container with specified command and notify observers with result.
+    def _open_sage_session(self) -> SageSession:
+        """ Upload the Sage server if necessary and launch it.
 
-        :param command: command to run
-        :param request_id: ID of request
-        :return: None
+        :return: SageSession
         """
-        logging.info(f"Running command for request {request_id}: {command}")
-        # start container and run command
-        self.phy_container.start()
-        result = self.phy_container.exec_run(cmd=command, workdir="/home/sage/sage", tty=True)
-
-        # process result
-        # TODO: use exit code to get result
-        output_string = result.output.decode("utf-8").strip()
-        if not output_string:
-            logging.error(f"No output log from task request {request_id} received!")
-        output_log_entries = output_string.split("\n")
-
-        # check if is correct and send result to observers
-        is_correct = output_log_entries[-1] == "True"
-        self.call_observers(request_id, is_correct)
-
-    def add_result_observer(self, observer):
-        """ Add observers for new results.
-
-        :param observer: function to be triggered
-        :return: None
+        if not self.server_uploaded:
+            server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sage_server.py")
+            with open(server_path) as server_file:
+                self._put_archive([ContentFile("sage_server.py", server_file.read())])
+            self.server_uploaded = True
+        return SageSession(self.phy_container.id, self.docker_client, WORKDIR)
+
+    def _remove_files(self, filepaths: List[str]) -> bool:
+        """ Remove files from the working directory of the container.
+
+        :param filepaths: paths of files relative to the working directory
+        :return: whether the files were removed
         """
-        self.result_observers.append(observer)
+        try:
+            result = self.phy_container.exec_run(cmd=["rm", "-f"] + filepaths, workdir=WORKDIR)
+        except Exception as error:
+            logging.error(f"Could not reset container {self.name}: {error}")
+            return False
+        return result.exit_code == 0
 
-    def call_observers(self, request_id: int, result: bool):
-        """ Call all registered observers.
+    def is_healthy(self) -> bool:
+        """ Check whether this container is running and able to execute commands.
 
-        :param request_id: ID of request
-        :param result: task result
-        :return: None
+        :return: whether container is healthy
+        """
+        try:
+            self.phy_container.reload()
+            if self.phy_container.status != "running":
+                return False
+            if self.sage_session and not self.sage_session.is_alive():
+                return False
+            return self.phy_container.exec_run(cmd="true").exit_code == 0
+        except Exception as error:
+            logging.error(f"Health check of container {self.name} failed: {error}")
+            return False
+
+    def get_memory_usage(self) -> int | None:
+        """ Get the current memory usage of this container.
+
+        :return: memory usage in bytes or None if not available
         """
-        for observer in self.result_observers:
-            observer(request_id, result)
+        try:
+            # a one shot read returns right away instead of waiting two stats cycles to compute CPU usage
+            stats = self.phy_container.stats(stream=False, one_shot=True)
+            return stats["memory_stats"]["usage"]
+        except Exception as error:
+            logging.error(f"Could not read memory usage of container {self.name}: {error}")
+            return None
 
     def vanish(self):
         """ Remove this container.
@@ -111,6 +109,8 @@ class DockerContainer:
         """
         try:
             logging.info(f"Removing container {self.name}...")
+            if self.sage_session:
+                self.sage_session.close()
             self.phy_container.stop()
             self.phy_container.remove()
         except:
@@ -1,57 +1,460 @@
+import collections
 import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, List
 
 import docker as docker_lib
+from docker.errors import ImageNotFound
 
+from abstract_executor import AbstractExecutor
+from admission_queue import AdmissionQueue
 from docker_container import DockerContainer
+from metrics import REGISTRY
 
+READY_CONTAINERS = REGISTRY.gauge("ready_containers", "Containers ready to run a job")
+OCCUPIED_CONTAINERS = REGISTRY.gauge("occupied_containers", "Containers running a job")
+CREATING_CONTAINERS = REGISTRY.gauge("creating_containers", "Containers being created in the background")
+AFFINITY_HITS = REGISTRY.counter("container_affinity_hits_total", "Allocated containers that recently served the task")
 
-class DockerManager:
+# containers are labeled with the pool they belong to, so a restarted evaluator finds the containers of its predecessor
+POOL_LABEL = "mathgrass.evaluator.pool"
+
+# seconds after which creating containers is retried once a creation failed, doubled with every further failure
+CREATION_RETRY_DELAY = 1
+MAX_CREATION_RETRY_DELAY = 60
+
+
+class DockerManager(AbstractExecutor):
     """ This class manages Docker containers by preparing/creating/cleaning/etc. containers.
     """
-    def __init__(self, max_active_containers: int, ready_container_amount: int):
+    def __init__(self, max_active_containers: int | None, ready_container_amount: int, reuse_containers: bool = False,
+                 max_jobs_per_container: int | None = None, max_container_memory: int | None = None,
+                 resident_sage: bool = False, max_queue_size: int = 100, admission_timeout: float = 60,
+                 prewarm_fanout: int = 4, arrival_rate_window: float = 60, container_cpus: float | None = None,
+                 container_memory_limit: int | None = None, container_pids_limit: int | None = None,
+                 host_memory_reserve: int = 0, capacity_share: float = 1, image: str = "sagemath/sagemath",
+                 refresh_image: bool = True, pool_label: str = "default", adopt_containers: bool = True,
+                 warm_reserve: int = 0, health_check_interval: float | None = 30):
         """ Initialize a DockerManager instance.
 
-        :param max_active_containers: max amount of containers that can be active
+        :param max_active_containers: max amount of containers that can be active (None = size from host capacity)
         :param ready_container_amount: amount of containers that should be ready
+        :param reuse_containers: whether finished containers should be reset and reused instead of removed
+        :param max_jobs_per_container: amount of jobs after which a reused container is recycled (None = unlimited)
+        :param max_container_memory: memory usage in bytes above which a reused container is recycled (None = unlimited)
+        :param resident_sage: whether each container should run a resident Sage server instead of one process per job
+        :param max_queue_size: max amount of requests waiting for a container
+        :param admission_timeout: default amount of seconds a request waits for a container
+        :param prewarm_fanout: max amount of containers created in parallel
+        :param arrival_rate_window: amount of seconds over which the arrival rate of requests is measured
+        :param container_cpus: amount of CPUs each container may use (None = unlimited)
+        :param container_memory_limit: memory in bytes each container may use, swap included (None = unlimited)
+        :param container_pids_limit: amount of processes each container may run (None = unlimited)
+        :param host_memory_reserve: memory in bytes of the host that is not used for sizing the pool
+        :param capacity_share: share of the host capacity this manager may use when sizing the pool from it
+        :param image: image of containers, pinning a digest (image@sha256:...) makes sure every start uses it
+        :param refresh_image: whether to pull a present image by tag again in the background
+        :param pool_label: label value identifying the containers of this manager, must differ between managers
+                           running at the same time
+        :param adopt_containers: whether to adopt running containers left over by an earlier run of this pool, which
+                                 are removed otherwise
+        :param warm_reserve: amount of the hottest tasks that each keep a ready container holding their artifacts
+                             from requests of other tasks while the pool can still grow
+        :param health_check_interval: amount of seconds between health and memory checks of ready containers
+                                      (None = no checks)
         """
         self.docker = docker_lib.from_env()
         self.ready_containers = []
         self.occupied_containers = []
+        self.container_cpus = container_cpus
+        self.container_memory_limit = container_memory_limit
+        self.container_pids_limit = container_pids_limit
+        self.image = image
+        self.pool_label = pool_label
+        if max_active_containers is None:
+            host_info = self.docker.info()
+            max_active_containers = self.get_pool_size(host_info["NCPU"] * capacity_share,
+                                                       (host_info["MemTotal"] - host_memory_reserve) * capacity_share,
+                                                       container_cpus, container_memory_limit)
+            logging.info(f"Sized container pool to {max_active_containers} containers from host capacity!")
         self.max_active_containers = max_active_containers
         self.ready_container_amount = ready_container_amount
+        self.reuse_containers = reuse_containers
+        self.max_jobs_per_container = max_jobs_per_container
+        self.max_container_memory = max_container_memory
+        self.resident_sage = resident_sage
+        self.lock = threading.RLock()
+        self.admission_queue = AdmissionQueue(max_queue_size)
+        READY_CONTAINERS.set_function(lambda: len(self.ready_containers))
+        OCCUPIED_CONTAINERS.set_function(lambda: len(self.occupied_containers))
+        CREATING_CONTAINERS.set_function(lambda: self.creating_containers)
+        self.admission_timeout = admission_timeout
+
+        # containers are created and removed in the background so that requests never wait on the docker API
+        self.creating_containers = 0
+        self.creation_executor = ThreadPoolExecutor(max_workers=prewarm_fanout, thread_name_prefix="prewarm")
+        self.arrival_rate_window = arrival_rate_window
+        self.arrivals = collections.deque()
+        self.creation_seconds = None
+        self.creation_failures = 0
+        self.creation_retry = None
 
-        # pull image
-        logging.info("Pulling sagemath image...")
-        self.docker.images.pull("sagemath/sagemath")
+        # arrivals by affinity key within the arrival rate window, the most frequent keys are the hottest tasks
+        self.task_arrivals = collections.Counter()
+        self.warm_reserve = warm_reserve
+        self.stopped = threading.Event()
 
-        # init ready containers
+        self.ensure_image(refresh_image)
+
+        # take over containers of an earlier run, then init remaining ready containers
+        self.recover_containers(adopt_containers and reuse_containers)
         self.prepare_containers()
+
+        # checks that query the docker API run in the background instead of after every job
+        self.health_check_interval = health_check_interval
+        if health_check_interval is not None:
+            threading.Thread(target=self._check_health_forever, name="health-check", daemon=True).start()
     
+    @staticmethod
+    def get_pool_size(cpu_count: float, memory: float, container_cpus: float | None,
+                      container_memory_limit: int | None) -> int:
+        """ Get the max amount of containers that fit on a host without oversubscribing its CPUs or memory.
+
+        :param cpu_count: amount of CPUs of the host
+        :param memory: memory in bytes of the host available to containers
+        :param container_cpus: amount of CPUs each container may use (None = one CPU)
+        :param container_memory_limit: memory in bytes each container may use (None = memory is not considered)
+        :return: max amount of containers, at least one
+        """
+        pool_size = math.floor(cpu_count / (container_cpus or 1))
+        if container_memory_limit:
+            pool_size = min(pool_size, math.floor(memory / container_memory_limit))
+        return max(1, pool_size)
+
     def prepare_containers(self):
-        """ Prepare containers by creating new ones if possible.
+        """ Prepare containers by creating new ones in the background if possible.
+
+        :return: None
+        """
+        with self.lock:
+            num_ready = len(self.ready_containers) + self.creating_containers
+            # containers reserved for the hottest tasks do not serve other requests, so they are wanted on top
+            num_wanted = self.get_ready_target() + len(self.admission_queue) + len(self.get_reserved_containers())
+
+            # if possible create more ready docker containers
+            if num_ready < num_wanted:
+                # get number of containers to create
+                creation_amount = min(num_wanted - num_ready,
+                                      self.max_active_containers - (len(self.occupied_containers) + num_ready))
+                if creation_amount <= 0:
+                    return
+                logging.info(f"Preparing {creation_amount} containers!")
+
+                # create containers
+                self.creating_containers += creation_amount
+                for _ in range(creation_amount):
+                    self.creation_executor.submit(self._prewarm_container)
+
+    def ensure_image(self, refresh: bool):
+        """ Make sure the image is present, pulling it only if it is missing.
+
+        A present image is used right away. An image given by tag is pulled again in the background if refresh is
+        set, containers created after the pull finished use the new image. An image pinned by digest never changes.
+
+        :param refresh: whether to pull a present image by tag again in the background
+        :return: None
+        """
+        try:
+            self.docker.images.get(self.image)
+        except ImageNotFound:
+            self.pull_image()
+            return
+
+        logging.info(f"Image {self.image} is present!")
+        if refresh and "@" not in self.image:
+            threading.Thread(target=self.pull_image, name="image-refresh", daemon=True).start()
+
+    def pull_image(self):
+        """ Pull the image of containers.
+
+        :return: None
+        """
+        logging.info(f"Pulling image {self.image}...")
+        try:
+            self.docker.images.pull(self.image)
+        except Exception as error:
+            logging.error(f"Could not pull image {self.image}: {error}")
+            return
+        logging.info(f"Pulled image {self.image}!")
+
+    def recover_containers(self, adopt: bool):
+        """ Adopt or remove the containers an earlier run of this pool left behind, e.g. after a crash.
+
+        Running containers of the current image are adopted in the background until the pool is full and count as
+        containers being created meanwhile, all others are removed in the background.
+
+        :param adopt: whether to adopt containers, all of them are removed otherwise
+        :return: None
+        """
+        try:
+            leftovers = self.docker.containers.list(all=True, filters={"label": f"{POOL_LABEL}={self.pool_label}"})
+            image_id = self.docker.images.get(self.image).id if leftovers and adopt else None
+        except Exception as error:
+            logging.error(f"Could not list containers of an earlier run: {error}")
+            return
+
+        adopting = 0
+        for phy_container in leftovers:
+            if adopt and phy_container.status == "running" and phy_container.attrs.get("Image") == image_id \
+                    and adopting < self.max_active_containers:
+                adopting += 1
+                with self.lock:
+                    self.creating_containers += 1
+                self.creation_executor.submit(self._adopt_container, phy_container)
+            else:
+                logging.info(f"Removing container {phy_container.name} of an earlier run...")
+                self.creation_executor.submit(self._remove_leftover_container, phy_container)
+        logging.info(f"Adopting {adopting} of {len(leftovers)} containers of an earlier run...")
+
+    def _adopt_container(self, phy_container):
+        """ Take over a running container of an earlier run and hand it to a waiting request or add it to the ready
+        containers, a container that is not usable is removed and replaced.
+
+        The Sage server of the earlier run exited with its connection, so the server is uploaded and launched again.
+
+        :param phy_container: docker container
+        :return: None
+        """
+        container = None
+        try:
+            container = DockerContainer(phy_container.name, self.docker)
+            if self.resident_sage:
+                container.start_sage_session()
+        except Exception as error:
+            logging.error(f"Could not adopt container {phy_container.name}: {error}")
+            self._remove_leftover_container(phy_container)
+            container = None
+
+        if container and not container.is_healthy():
+            logging.info(f"Container {phy_container.name} of an earlier run is not healthy, removing...")
+            container.vanish()
+            container = None
+
+        with self.lock:
+            self.creating_containers -= 1
+            if container:
+                logging.info(f"Adopted container {phy_container.name} of an earlier run!")
+                self._release_container(container)
+        if not container:
+            self.prepare_containers()
+
+    @staticmethod
+    def _remove_leftover_container(phy_container):
+        """ Remove a container of an earlier run.
+
+        :param phy_container: docker container
+        :return: None
+        """
+        try:
+            phy_container.remove(force=True)
+        except Exception as error:
+            logging.error(f"Could not remove container {phy_container.name}: {error}")
+
+    def get_ready_target(self) -> int:
+        """ Get the amount of containers that should be ready.
+
+        The target adapts to the recent arrival rate so that the containers created while a burst arrives are ready
+        before the burst needs them, but it never falls below the configured amount of ready containers.
+
+        :return: amount of containers that should be ready
+        """
+        with self.lock:
+            self._prune_arrivals()
+            if not self.arrivals or self.creation_seconds is None:
+                return self.ready_container_amount
+
+            arrival_rate = len(self.arrivals) / self.arrival_rate_window
+            expected_arrivals = math.ceil(arrival_rate * self.creation_seconds)
+            return min(max(self.ready_container_amount, expected_arrivals), self.max_active_containers)
+
+    def _count_arrival(self, affinity: List[str] | None):
+        """ Count the arrival of a request. Must be called while holding the lock.
+
+        :param affinity: affinity keys of request
+        :return: None
+        """
+        key = affinity[0] if affinity else None
+        self.arrivals.append((time.monotonic(), key))
+        if key is not None:
+            self.task_arrivals[key] += 1
+
+    def _prune_arrivals(self):
+        """ Forget arrivals that left the arrival rate window. Must be called while holding the lock.
+
+        :return: None
+        """
+        start = time.monotonic() - self.arrival_rate_window
+        while self.arrivals and self.arrivals[0][0] < start:
+            _, key = self.arrivals.popleft()
+            if key is not None:
+                self.task_arrivals[key] -= 1
+                if not self.task_arrivals[key]:
+                    del self.task_arrivals[key]
+
+    def get_reserved_containers(self, affinity: List[str] | None = None) -> List[DockerContainer]:
+        """ Get the ready containers kept warm for the hottest tasks. Must be called while holding the lock.
+
+        Each of the hottest tasks keeps the least loaded ready container holding its artifacts. Reservations only hold
+        while the pool can still grow, so a request never waits for a new container while a container of a full pool
+        is idle.
+
+        :param affinity: affinity keys of the request asking, its own task is not reserved against it
+        :return: reserved containers
+        """
+        active_containers = len(self.occupied_containers) + len(self.ready_containers) + self.creating_containers
+        if not self.warm_reserve or active_containers >= self.max_active_containers:
+            return []
+
+        self._prune_arrivals()
+        reserved = []
+        for key, _ in self.task_arrivals.most_common(self.warm_reserve):
+            if affinity and key == affinity[0]:
+                continue
+            warm = [container for container in self.ready_containers
+                    if container.holds(key) and container not in reserved]
+            if warm:
+                reserved.append(min(warm, key=lambda container: container.jobs_run))
+        return reserved
+
+    @staticmethod
+    def select_container(containers: List[DockerContainer], affinity: List[str] | None,
+                         reserved: Collection[DockerContainer] = ()) -> DockerContainer | None:
+        """ Select the ready container to allocate to a request.
+
+        Containers holding the artifacts of the most specific affinity key are preferred, followed by those holding the
+        artifacts of less specific keys, e.g. only the script of the task. Otherwise the least loaded container is
+        selected, i.e. the one that ran the fewest jobs and is farthest from being recycled. Containers reserved for
+        other tasks are only selected if they hold the artifacts of the most specific key.
+
+        :param containers: ready containers
+        :param affinity: keys of the artifacts the request needs, most specific first
+        :param reserved: containers reserved for other tasks
+        :return: selected container or None if all containers are reserved
+        """
+        for index, key in enumerate(affinity or []):
+            warm = [container for container in containers
+                    if container.holds(key) and (index == 0 or container not in reserved)]
+            if warm:
+                return min(warm, key=lambda container: container.jobs_run)
+
+        cold = [container for container in containers if container not in reserved]
+        return min(cold, key=lambda container: container.jobs_run, default=None)
+
+    def _prewarm_container(self):
+        """ Create a container and hand it to a waiting request or add it to the ready containers.
+
+        If the container cannot be created, the next waiting request is rejected instead of waiting for its deadline
+        and creating containers is retried after a delay that grows with every further failure.
+
+        :return: None
+        """
+        start = time.monotonic()
+        try:
+            container = self.create_container_in_registry()
+        except Exception as error:
+            logging.error(f"Could not create container: {error}")
+            with self.lock:
+                self.creating_containers -= 1
+                waiter = self.admission_queue.next_waiter()
+                if waiter:
+                    waiter.reject()
+                self._schedule_creation_retry()
+            return
+
+        elapsed = time.monotonic() - start
+        with self.lock:
+            # keep a moving average of the creation time to size the ready target
+            self.creation_seconds = elapsed if self.creation_seconds is None \
+                else 0.8 * self.creation_seconds + 0.2 * elapsed
+            self.creating_containers -= 1
+            self.creation_failures = 0
+            self._release_container(container)
+
+    def _schedule_creation_retry(self):
+        """ Prepare containers again after a backoff delay unless a retry is already scheduled. Must be called while
+        holding the lock.
 
         :return: None
         """
-        num_ready = len(self.ready_containers)
+        self.creation_failures += 1
+        if self.creation_retry or self.stopped.is_set():
+            return
 
-        # if possible create more ready docker containers
-        if num_ready < self.ready_container_amount:
-            # get number of containers to create
-            creation_amount = min(self.ready_container_amount - num_ready,
-                                  self.max_active_containers - (len(self.occupied_containers) + num_ready))
-            logging.info(f"Preparing {creation_amount} containers!")
+        delay = min(CREATION_RETRY_DELAY * 2 ** (self.creation_failures - 1), MAX_CREATION_RETRY_DELAY)
+        logging.info(f"Retrying to create containers in {delay}s...")
+        self.creation_retry = threading.Timer(delay, self._retry_creation)
+        self.creation_retry.daemon = True
+        self.creation_retry.start()
 
-            # create containers
-            for _ in range(creation_amount):
-                self.ready_containers.append(self.create_container_in_registry())
+    def _retry_creation(self):
+        """ Prepare containers again after a creation failed.
+
+        :return: None
+        """
+        with self.lock:
+            self.creation_retry = None
+            if self.stopped.is_set():
+                return
+            self.prepare_containers()
 
     def create_container_in_registry(self):
         """ Create a docker container and register in registry.
 
         :return: None
         """
-        container = self.docker.containers.create("sagemath/sagemath")
-        return DockerContainer(container.name, self.docker)
+        # keep an interactive session open so that the container stays up between jobs
+        container = self.docker.containers.create(self.image, stdin_open=True, tty=True,
+                                                  labels={POOL_LABEL: self.pool_label},
+                                                  **self.get_resource_limits(self.container_cpus,
+                                                                             self.container_memory_limit,
+                                                                             self.container_pids_limit))
+        container.start()
+        docker_container = DockerContainer(container.name, self.docker)
+
+        # launch Sage ahead of time so that the startup is not paid by the first job
+        if self.resident_sage:
+            try:
+                docker_container.start_sage_session()
+            except Exception as error:
+                logging.error(f"Could not start Sage server in container {container.name}: {error}")
+                # a server that did not start may still be running, so the container is not kept after its first job
+                docker_container.needs_recycling = True
+
+        return docker_container
+
+    @staticmethod
+    def get_resource_limits(container_cpus: float | None, container_memory_limit: int | None,
+                            container_pids_limit: int | None) -> dict:
+        """ Get the cgroup resource limits of new containers as arguments for creating a container.
+
+        :param container_cpus: amount of CPUs each container may use (None = unlimited)
+        :param container_memory_limit: memory in bytes each container may use, swap included (None = unlimited)
+        :param container_pids_limit: amount of processes each container may run (None = unlimited)
+        :return: keyword arguments for creating a container
+        """
+        limits = {}
+        if container_cpus is not None:
+            limits["nano_cpus"] = int(container_cpus * 1e9)
+        if container_memory_limit is not None:
+            # setting swap to the same limit keeps containers from swapping
+            limits["mem_limit"] = container_memory_limit
+            limits["memswap_limit"] = container_memory_limit
+        if container_pids_limit is not None:
+            limits["pids_limit"] = container_pids_limit
+        return limits
 
     @staticmethod
     def remove_container_from_registry(container: DockerContainer):
@@ -62,27 +465,82 @@ class DockerManager:
         """
         container.vanish()
 
-    def allocate_container(self) -> DockerContainer | None:
-        """ Allocate a ready container.
+    def allocate_container(self, priority: int = 0, deadline: float | None = None,
+                           affinity: List[str] | None = None) -> DockerContainer | None:
+        """ Allocate a ready container, waiting in the admission queue if no container is ready.
+
+        Ready containers that already hold the artifacts of the request are preferred, see select_container.
 
-        :return: allocated container
+        :param priority: priority of request, higher priorities are served first
+        :param deadline: monotonic time after which to stop waiting (None = now + admission timeout)
+        :param affinity: keys of the artifacts the request needs, most specific first, e.g. the key of the task
+                         followed by the path of its script
+        :return: allocated container or None if no container could be allocated before the deadline
         """
-        # check if enough containers ready - otherwise queue (should not happen because the msg bus will balance load)
-        if not self.ready_containers:
-            logging.info("No containers ready! Adding to queue...")
-            # TODO: queue request
-            return None
+        if deadline is None:
+            deadline = time.monotonic() + self.admission_timeout
 
-        # Get ready container and occupy
-        selection = self.ready_containers.pop()
-        logging.info(f"Container available! Occupying container {selection.name}...")
-        self.occupied_containers.append(selection)
-        selection.add_result_observer(lambda x, y: self.finishContainer(selection))
+        with self.lock:
+            self._count_arrival(affinity)
+            selection = self.select_container(self.ready_containers, affinity,
+                                              self.get_reserved_containers(affinity))
+            if selection:
+                # occupy ready container
+                self.ready_containers.remove(selection)
+                logging.info(f"Container available! Occupying container {selection.name}...")
+                self._occupy(selection, affinity)
 
-        # create more ready containers
-        self.prepare_containers()
+                # create more ready containers
+                self.prepare_containers()
+                return selection
+
+            # no containers ready for this request - wait for a container to be freed or created
+            waiter = self.admission_queue.enqueue(priority, deadline, affinity)
+            if not waiter:
+                logging.info("No containers ready and admission queue is full!")
+                return None
+            logging.info(f"No containers ready! Adding to queue ({len(self.admission_queue)} waiting)...")
+            self.prepare_containers()
+
+        waiter.event.wait(max(0.0, deadline - time.monotonic()))
+        with self.lock:
+            if waiter.container is None and not waiter.cancelled:
+                self.admission_queue.cancel(waiter)
+
+        if waiter.container is None:
+            logging.info("No container was freed before the deadline!")
+        return waiter.container
 
-        return selection
+    def _occupy(self, container: DockerContainer, affinity: List[str] | None = None):
+        """ Mark a container as occupied. Must be called while holding the lock.
+
+        :param container: container to occupy
+        :param affinity: keys of the artifacts the request needs, the container remembers the most specific one
+        :return: None
+        """
+        if affinity:
+            # counted here so that containers handed to waiting requests are counted too
+            if container.holds(affinity[0]):
+                AFFINITY_HITS.inc()
+            container.remember_affinity(affinity[0])
+        self.occupied_containers.append(container)
+        container.add_release_observer(lambda: self.finishContainer(container))
+
+    def _release_container(self, container: DockerContainer):
+        """ Hand a free container to the next waiting request or add it to the ready containers. Must be called while
+        holding the lock.
+
+        :param container: free container
+        :return: None
+        """
+        waiter = self.admission_queue.next_waiter()
+        if not waiter:
+            self.ready_containers.append(container)
+            return
+
+        logging.info(f"Handing container {container.name} to a waiting request...")
+        self._occupy(container, waiter.affinity)
+        waiter.assign(container)
 
     def finishContainer(self, container: DockerContainer):
         """ Process a container that has done its job.
@@ -91,21 +549,106 @@ class DockerManager:
         :return: None
         """
         logging.info(f"Cleaning up container {container.name}...")
+        reuse = self.reuse_containers and self._is_reusable(container) and container.reset()
+
         # remove container
-        self.occupied_containers.remove(container)
+        with self.lock:
+            self.occupied_containers.remove(container)
+            if reuse:
+                logging.info(f"Returning container {container.name} to the ready containers...")
+                self._release_container(container)
 
-        # remove docker container
-        self.remove_container_from_registry(container)
+        # remove docker container in the background if it cannot be reused
+        if not reuse:
+            self.creation_executor.submit(self.remove_container_from_registry, container)
 
         # check if another container should be prepared
         self.prepare_containers()
 
+    def _is_reusable(self, container: DockerContainer) -> bool:
+        """ Check whether a finished container can be reused or has to be recycled.
+
+        Only checks that do not query the docker API run here, the health and memory usage of ready containers are
+        checked in the background, see check_ready_containers.
+
+        :param container: finished container
+        :return: whether container can be reused
+        """
+        if container.needs_recycling:
+            logging.info(f"Container {container.name} was marked for recycling, recycling...")
+            return False
+
+        if self.max_jobs_per_container is not None and container.jobs_run >= self.max_jobs_per_container:
+            logging.info(f"Container {container.name} reached its job limit, recycling...")
+            return False
+
+        if container.sage_session and not container.sage_session.is_alive():
+            logging.info(f"Sage server of container {container.name} exited, recycling...")
+            return False
+
+        return True
+
+    def _check_health_forever(self):
+        """ Check the ready containers periodically until all containers are removed.
+
+        :return: None
+        """
+        while not self.stopped.wait(self.health_check_interval):
+            self.check_ready_containers()
+
+    def check_ready_containers(self):
+        """ Recycle ready containers that failed their health check or exceeded their memory ceiling.
+
+        A container that was allocated while being checked is marked for recycling and recycled once it is finished.
+
+        :return: None
+        """
+        with self.lock:
+            containers = list(self.ready_containers)
+
+        for container in containers:
+            if self._is_healthy(container):
+                continue
+            with self.lock:
+                container.needs_recycling = True
+                if container not in self.ready_containers:
+                    continue
+                self.ready_containers.remove(container)
+            self.creation_executor.submit(self.remove_container_from_registry, container)
+        self.prepare_containers()
+
+    def _is_healthy(self, container: DockerContainer) -> bool:
+        """ Check whether a container is healthy and within its memory ceiling.
+
+        :param container: container to check
+        :return: whether container is healthy
+        """
+        if self.max_container_memory is not None:
+            memory_usage = container.get_memory_usage()
+            if memory_usage is None or memory_usage > self.max_container_memory:
+                logging.info(f"Container {container.name} exceeded its memory ceiling, recycling...")
+                return False
+
+        if not container.is_healthy():
+            logging.info(f"Container {container.name} failed its health check, recycling...")
+            return False
+
+        return True
+
     def clear_all_containers(self):
         """ Remove all containers.
 
         :return: None
         """
         logging.info("Removing all containers from the registry...")
-        for container in self.ready_containers:
+        with self.lock:
+            self.stopped.set()
+            if self.creation_retry:
+                self.creation_retry.cancel()
+        self.creation_executor.shutdown(wait=True)
+        with self.lock:
+            # occupied containers are removed too, so that no container outlives the evaluator
+            containers = self.ready_containers + self.occupied_containers
+            self.ready_containers = []
+        for container in containers:
             container.vanish()
-    
\ No newline at end of file
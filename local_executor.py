@@ -0,0 +1,267 @@
+import itertools
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from abstract_executor import AbstractExecutor
+from metrics import REGISTRY
+from sage_container import SageContainer
+from sage_session import LocalSageSession, SageSession, SageSessionError
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sage_server.py")
+
+READY_LOCAL_CONTAINERS = REGISTRY.gauge("ready_local_containers", "Local Sage servers ready to run a job")
+OCCUPIED_LOCAL_CONTAINERS = REGISTRY.gauge("occupied_local_containers", "Local Sage servers running a job")
+
+
+class LocalContainer(SageContainer):
+    """ This class represents a Sage server running in a subprocess of this host with its own working directory.
+
+    It is not isolated like a Docker container, only resource limits apply, so it must only run trusted scripts.
+    """
+    def __init__(self, name: str, command: List[str], resource_limits: Dict[int, int]):
+        """ Initialize a LocalContainer instance.
+
+        :param name: name of container
+        :param command: command launching the Sage server
+        :param resource_limits: limits applied to the Sage server process by resource
+        """
+        super().__init__(name)
+        self.command = command
+        self.resource_limits = resource_limits
+        self.workdir = tempfile.mkdtemp(prefix=f"mathgrass-{name}-")
+
+    def _open_sage_session(self) -> SageSession:
+        """ Launch the Sage server in the working directory.
+
+        :return: SageSession
+        """
+        return LocalSageSession(self.command, self.workdir, self.resource_limits)
+
+    def _remove_files(self, filepaths: List[str]) -> bool:
+        """ Remove files from the working directory.
+
+        :param filepaths: paths of files relative to the working directory
+        :return: whether the files were removed
+        """
+        try:
+            for filepath in filepaths:
+                try:
+                    os.remove(os.path.join(self.workdir, filepath))
+                except FileNotFoundError:
+                    pass
+        except OSError as error:
+            logging.error(f"Could not reset container {self.name}: {error}")
+            return False
+        return True
+
+    def is_healthy(self) -> bool:
+        """ Check whether the working directory exists and the Sage server is running.
+
+        :return: whether container is healthy
+        """
+        if self.sage_session and not self.sage_session.is_alive():
+            return False
+        return os.path.isdir(self.workdir)
+
+    def vanish(self):
+        """ Stop the Sage server and remove the working directory.
+
+        :return: None
+        """
+        logging.info(f"Removing container {self.name}...")
+        if self.sage_session:
+            self.sage_session.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class LocalExecutor(AbstractExecutor):
+    """ This class runs evaluation scripts in a pool of resident Sage servers on this host.
+
+    Jobs skip the Docker API and the container network stack, so trusted lightweight task solvers run at the speed of a
+    process pool, and evaluators can run where Docker is not available. Every server runs in its own session and
+    working directory under resource limits. There is no CPU time rlimit, since it would add up the time of all jobs
+    of a resident server, the CPU time limit of every single run is enforced by the server itself.
+    Waiting requests are not ordered by priority.
+    """
+    def __init__(self, max_workers: int, interpreter: List[str] | None = None, sage: bool = True,
+                 memory_limit: int | None = None, file_size_limit: int | None = None,
+                 max_open_files: int | None = None, max_jobs_per_worker: int | None = None,
+                 admission_timeout: float = 60):
+        """ Initialize a LocalExecutor instance.
+
+        :param max_workers: max amount of Sage servers running at once
+        :param interpreter: command of the Python interpreter running the server (None = the one of Sage)
+        :param sage: whether the server loads the Sage library, plain Python scripts are run otherwise
+        :param memory_limit: address space in bytes each server may use (None = unlimited)
+        :param file_size_limit: size in bytes of files each server may write (None = unlimited)
+        :param max_open_files: amount of files each server may open at once (None = unlimited)
+        :param max_jobs_per_worker: amount of jobs after which a server is recycled (None = unlimited)
+        :param admission_timeout: default amount of seconds a request waits for a server
+        """
+        self.max_active_containers = max_workers
+        self.command = (interpreter or ["sage", "-python"]) + [SERVER_PATH] + ([] if sage else ["--python"])
+        self.resource_limits = self.get_resource_limits(memory_limit, file_size_limit, max_open_files)
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.admission_timeout = admission_timeout
+        self.ready_containers = []
+        self.occupied_containers = []
+        self.creating_containers = 0
+        self.names = itertools.count()
+        self.condition = threading.Condition()
+        READY_LOCAL_CONTAINERS.set_function(lambda: len(self.ready_containers))
+        OCCUPIED_LOCAL_CONTAINERS.set_function(lambda: len(self.occupied_containers))
+
+    @staticmethod
+    def get_resource_limits(memory_limit: int | None, file_size_limit: int | None,
+                            max_open_files: int | None) -> Dict[int, int]:
+        """ Get the resource limits of the Sage server processes.
+
+        :param memory_limit: address space in bytes each server may use (None = unlimited)
+        :param file_size_limit: size in bytes of files each server may write (None = unlimited)
+        :param max_open_files: amount of files each server may open at once (None = unlimited)
+        :return: limits by resource, core dumps are always disabled
+        """
+        limits = {resource.RLIMIT_CORE: 0}
+        if memory_limit is not None:
+            limits[resource.RLIMIT_AS] = memory_limit
+        if file_size_limit is not None:
+            limits[resource.RLIMIT_FSIZE] = file_size_limit
+        if max_open_files is not None:
+            limits[resource.RLIMIT_NOFILE] = max_open_files
+        return limits
+
+    def allocate_container(self, priority: int = 0, deadline: float | None = None,
+                           affinity: List[str] | None = None) -> LocalContainer | None:
+        """ Allocate a ready Sage server, launching a new one if the pool is not full yet.
+
+        :param priority: ignored, waiting requests are served in no particular order
+        :param deadline: monotonic time after which to stop waiting (None = now + admission timeout)
+        :param affinity: keys of the artifacts the request needs, most specific first, a ready server holding them is
+                         preferred
+        :return: allocated container or None if no server could be allocated before the deadline
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.admission_timeout
+
+        with self.condition:
+            while not self.ready_containers:
+                if len(self.occupied_containers) + self.creating_containers < self.max_active_containers:
+                    self.creating_containers += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.info("No local Sage server was freed before the deadline!")
+                    return None
+                self.condition.wait(remaining)
+            else:
+                container = self._select_container(affinity)
+                self.ready_containers.remove(container)
+                self._occupy(container, affinity)
+                return container
+
+        # launch the server outside of the lock so that other requests can take freed servers meanwhile
+        try:
+            container = self.create_container()
+        except SageSessionError as error:
+            logging.error(f"Could not launch local Sage server: {error}")
+            container = None
+
+        with self.condition:
+            self.creating_containers -= 1
+            if container is None:
+                self.condition.notify()
+                return None
+            self._occupy(container, affinity)
+        return container
+
+    def create_container(self) -> LocalContainer:
+        """ Create a container and launch its Sage server.
+
+        :return: LocalContainer
+        """
+        container = LocalContainer(f"local-{next(self.names)}", self.command, self.resource_limits)
+        try:
+            container.start_sage_session()
+        except SageSessionError:
+            container.vanish()
+            raise
+        return container
+
+    def _select_container(self, affinity: List[str] | None) -> LocalContainer:
+        """ Select the ready server to allocate. Must be called while holding the lock.
+
+        :param affinity: keys of the artifacts the request needs, most specific first
+        :return: the ready server holding the most specific key or the most recently freed one
+        """
+        for key in affinity or []:
+            for container in reversed(self.ready_containers):
+                if container.holds(key):
+                    return container
+        return self.ready_containers[-1]
+
+    def _occupy(self, container: LocalContainer, affinity: List[str] | None = None):
+        """ Mark a container as occupied. Must be called while holding the lock.
+
+        :param container: container to occupy
+        :param affinity: keys of the artifacts the request needs, the container remembers the most specific one
+        :return: None
+        """
+        if affinity:
+            container.remember_affinity(affinity[0])
+        self.occupied_containers.append(container)
+        container.add_release_observer(lambda: self.finish_container(container))
+
+    def finish_container(self, container: LocalContainer):
+        """ Process a container that has done its job by returning it to the pool or removing it.
+
+        :param container: finished container
+        :return: None
+        """
+        reuse = self._is_reusable(container) and container.reset()
+        with self.condition:
+            self.occupied_containers.remove(container)
+            if reuse:
+                self.ready_containers.append(container)
+            self.condition.notify()
+
+        if not reuse:
+            container.vanish()
+
+    def _is_reusable(self, container: LocalContainer) -> bool:
+        """ Check whether a finished container can be reused or has to be recycled.
+
+        :param container: finished container
+        :return: whether container can be reused
+        """
+        if container.needs_recycling:
+            logging.info(f"Container {container.name} was marked for recycling, recycling...")
+            return False
+
+        if self.max_jobs_per_worker is not None and container.jobs_run >= self.max_jobs_per_worker:
+            logging.info(f"Container {container.name} reached its job limit, recycling...")
+            return False
+
+        if not container.is_healthy():
+            logging.info(f"Container {container.name} failed its health check, recycling...")
+            return False
+
+        return True
+
+    def clear_all_containers(self):
+        """ Stop all Sage servers and remove their working directories.
+
+        :return: None
+        """
+        logging.info("Removing all local containers...")
+        with self.condition:
+            # occupied containers fail their health check once they are finished and are removed again then
+            containers = self.ready_containers + self.occupied_containers
+            self.ready_containers = []
+        for container in containers:
+            container.vanish()
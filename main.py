@@ -1,17 +1,29 @@
 import logging.config
+import os
 import signal
 import sys
 import time
 
 from basic_evaluator import BasicEvaluator
+from batch_evaluator import BatchEvaluator
+from config import (ADMISSION_TIMEOUT, BROKER_HOST, BUNDLE_CACHE_SIZE, BUNDLE_CACHE_TTL, CONTAINER_CPUS,
+                    CONTAINER_MEMORY_LIMIT, CONTAINER_PIDS_LIMIT, DB_GRAPH_FETCH_SIZE, DB_HOST, DB_MAX_CONNECTIONS,
+                    DB_MIN_CONNECTIONS, DB_NAME, DB_PASSWORD, DB_USER, DEFAULT_TIME_LIMIT, HEALTH_CHECK_INTERVAL,
+                    HOST_MEMORY_RESERVE, LOCAL_FILE_SIZE_LIMIT, LOCAL_INTERPRETER, LOCAL_MAX_OPEN_FILES,
+                    LOCAL_MEMORY_LIMIT, LOCAL_TASK_SOLVERS, LOCAL_WORKERS, MAX_ACTIVE_CONTAINERS,
+                    MAX_CONCURRENT_EVALUATIONS, MAX_CONTAINER_MEMORY, MAX_JOBS_PER_CONTAINER, MAX_QUEUE_SIZE,
+                    METRICS_HOST, METRICS_PORT, PREWARM_FANOUT, READY_CONTAINERS, REFRESH_IMAGE, RESIDENT_SAGE,
+                    RESULT_BATCH_SIZE, RESULT_CACHE_PATH, RESULT_CACHE_SIZE, RESULT_FLUSH_INTERVAL, REUSE_CONTAINERS,
+                    SAGE_IMAGE, TASK_SOLVER_TIME_LIMITS, WARM_RESERVE, WORKER_PROCESSES)
+from database import Database
+from result_cache import ResultCache
 from docker_manager import DockerManager
+from local_executor import LocalExecutor
+from metrics import start_metrics_server
 from rabbitmq_client import MessageQueueMiddleware
+from supervisor import WorkerSupervisor
 
-ALL_EVALUATORS = [BasicEvaluator]
-
-BROKER_HOST = "127.0.0.1"
-MAX_ACTIVE_CONTAINERS = 100
-READY_CONTAINERS = 1
+ALL_EVALUATORS = [BasicEvaluator, BatchEvaluator]
 
 # configure logging
 logging.config.fileConfig("logging.conf")
@@ -26,19 +38,97 @@ def run_forever():
         time.sleep(10)
 
 
-def main():
+def get_share(total: int, worker_index: int, worker_count: int) -> int:
+    """ Get the share of a worker of a budget that is split evenly between all workers.
+
+    :param total: budget of all workers
+    :param worker_index: index of worker
+    :param worker_count: amount of workers
+    :return: share of worker, at least one
+    """
+    return max(1, total // worker_count + (1 if worker_index < total % worker_count else 0))
+
+
+def get_worker_path(path: str, worker_index: int) -> str:
+    """ Get the path of a file of a worker, so that workers do not share the file.
+
+    :param path: configured path of file
+    :param worker_index: index of worker
+    :return: path with the index of the worker before the extension
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}-{worker_index}{extension}"
+
+
+def run_worker(worker_index: int = 0, worker_count: int = 1):
     """ Initialize Docker manager and message queue and keep running.
 
+    Every worker has its own broker connections, database pool and share of the container and connection budgets.
+
+    :param worker_index: index of this worker
+    :param worker_count: amount of workers
     :return: None
     """
-    logging.info("Starting evaluator microservice!")
+    logging.info(f"Starting evaluator worker {worker_index}!")
+    if METRICS_PORT is not None:
+        start_metrics_server(METRICS_HOST, METRICS_PORT + worker_index)
 
     # initializing docker manager
-    docker_manager = DockerManager(MAX_ACTIVE_CONTAINERS, READY_CONTAINERS)
-
-    def cleanup():
+    max_active_containers = None if MAX_ACTIVE_CONTAINERS is None \
+        else get_share(MAX_ACTIVE_CONTAINERS, worker_index, worker_count)
+    docker_manager = DockerManager(max_active_containers, READY_CONTAINERS,
+                                   reuse_containers=REUSE_CONTAINERS,
+                                   max_jobs_per_container=MAX_JOBS_PER_CONTAINER,
+                                   max_container_memory=MAX_CONTAINER_MEMORY,
+                                   resident_sage=RESIDENT_SAGE,
+                                   max_queue_size=MAX_QUEUE_SIZE,
+                                   admission_timeout=ADMISSION_TIMEOUT,
+                                   prewarm_fanout=PREWARM_FANOUT,
+                                   container_cpus=CONTAINER_CPUS,
+                                   container_memory_limit=CONTAINER_MEMORY_LIMIT,
+                                   container_pids_limit=CONTAINER_PIDS_LIMIT,
+                                   host_memory_reserve=HOST_MEMORY_RESERVE,
+                                   capacity_share=1 / worker_count,
+                                   image=SAGE_IMAGE,
+                                   refresh_image=REFRESH_IMAGE,
+                                   pool_label=f"worker-{worker_index}",
+                                   warm_reserve=WARM_RESERVE,
+                                   health_check_interval=HEALTH_CHECK_INTERVAL)
+
+    # run trusted task solvers in local Sage servers
+    local_executor = None
+    executors = {}
+    if LOCAL_TASK_SOLVERS:
+        local_executor = LocalExecutor(get_share(LOCAL_WORKERS, worker_index, worker_count), LOCAL_INTERPRETER,
+                                       memory_limit=LOCAL_MEMORY_LIMIT, file_size_limit=LOCAL_FILE_SIZE_LIMIT,
+                                       max_open_files=LOCAL_MAX_OPEN_FILES,
+                                       max_jobs_per_worker=MAX_JOBS_PER_CONTAINER,
+                                       admission_timeout=ADMISSION_TIMEOUT)
+        executors = {task_solver_id: local_executor for task_solver_id in LOCAL_TASK_SOLVERS}
+
+    # open database connection pool shared by all evaluators
+    max_connections = get_share(DB_MAX_CONNECTIONS, worker_index, worker_count)
+    database = Database(DB_HOST, DB_NAME, DB_USER, DB_PASSWORD, min(DB_MIN_CONNECTIONS, max_connections),
+                        max_connections, graph_fetch_size=DB_GRAPH_FETCH_SIZE)
+
+    # memoize results of identical submissions across evaluators and restarts, every worker has its own file since
+    # SQLite locks the whole file while writing
+    result_cache = ResultCache(RESULT_CACHE_SIZE, get_worker_path(RESULT_CACHE_PATH, worker_index))
+
+    instances = []
+
+    def cleanup(signum, frame):
+        # a shutdown may be requested by the terminal and the supervisor at once
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        logging.info("Waiting for running evaluations...")
+        for running_instance in instances:
+            running_instance.shutdown()
+        database.close()
+        result_cache.close()
         logging.info("Clearing docker containers...")
         docker_manager.clear_all_containers()
+        if local_executor:
+            local_executor.clear_all_containers()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, cleanup)
@@ -48,16 +138,31 @@ def main():
 
     # map queues to evaluators
     for evaluator in ALL_EVALUATORS:
-        instance = evaluator(docker_manager)
+        instance = evaluator(docker_manager, max_workers=MAX_CONCURRENT_EVALUATIONS,
+                             bundle_cache_size=BUNDLE_CACHE_SIZE, bundle_cache_ttl=BUNDLE_CACHE_TTL,
+                             database=database, result_batch_size=RESULT_BATCH_SIZE,
+                             result_flush_interval=RESULT_FLUSH_INTERVAL, result_cache=result_cache,
+                             time_limits=TASK_SOLVER_TIME_LIMITS, default_time_limit=DEFAULT_TIME_LIMIT,
+                             executors=executors)
+        instances.append(instance)
         queue_name = instance.get_queue_name()
 
-        def on_request_received(ch, method, properties, body):
-            instance.on_request_received(body)
-    
-        msg_queue_middleware.consume(queue_name, on_request_received)
+        msg_queue_middleware.consume(queue_name, instance.on_request_received, instance.get_prefetch_count())
 
     run_forever()
 
 
+def main():
+    """ Run the evaluator in this process or, if several worker processes are configured, supervise them.
+
+    :return: None
+    """
+    logging.info("Starting evaluator microservice!")
+    if WORKER_PROCESSES > 1:
+        WorkerSupervisor(WORKER_PROCESSES, run_worker).run()
+    else:
+        run_worker()
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,277 @@
+import contextlib
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+class Counter:
+    """ This class represents a monotonically increasing metric.
+    """
+    def __init__(self, name: str, description: str):
+        """ Initialize a Counter instance.
+
+        :param name: name of metric
+        :param description: description of metric
+        """
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """ Increase the counter.
+
+        :param amount: amount to add
+        :return: None
+        """
+        with self.lock:
+            self.value += amount
+
+    def render(self) -> List[str]:
+        """ Render this metric in the Prometheus text format.
+
+        :return: lines of samples
+        """
+        with self.lock:
+            return [f"{self.name} {self.value}"]
+
+
+class Gauge:
+    """ This class represents a metric that can go up and down.
+    """
+    def __init__(self, name: str, description: str):
+        """ Initialize a Gauge instance.
+
+        :param name: name of metric
+        :param description: description of metric
+        """
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.function = None
+        self.lock = threading.Lock()
+
+    def set_function(self, function: Callable[[], float]):
+        """ Compute the value of this gauge with a function whenever it is read.
+
+        :param function: function returning the current value
+        :return: None
+        """
+        with self.lock:
+            self.function = function
+
+    def set(self, value: float):
+        """ Set the gauge to a value.
+
+        :param value: new value
+        :return: None
+        """
+        with self.lock:
+            self.value = value
+
+    def inc(self, amount: float = 1):
+        """ Increase the gauge.
+
+        :param amount: amount to add
+        :return: None
+        """
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        """ Decrease the gauge.
+
+        :param amount: amount to subtract
+        :return: None
+        """
+        with self.lock:
+            self.value -= amount
+
+    def get(self) -> float:
+        """ Get the current value of this gauge.
+
+        :return: current value
+        """
+        with self.lock:
+            function = self.function
+            if function is None:
+                return self.value
+        return function()
+
+    def render(self) -> List[str]:
+        """ Render this metric in the Prometheus text format.
+
+        :return: lines of samples
+        """
+        return [f"{self.name} {self.get()}"]
+
+
+class Histogram:
+    """ This class represents a metric that counts observations in cumulative buckets.
+    """
+    def __init__(self, name: str, description: str, buckets: List[float] | None = None):
+        """ Initialize a Histogram instance.
+
+        :param name: name of metric
+        :param description: description of metric
+        :param buckets: upper bounds of buckets
+        """
+        self.name = name
+        self.description = description
+        self.buckets = sorted(buckets or DEFAULT_BUCKETS)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        """ Record an observation.
+
+        :param value: observed value
+        :return: None
+        """
+        with self.lock:
+            self.count += 1
+            self.sum += value
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    self.bucket_counts[i] += 1
+
+    @contextlib.contextmanager
+    def time(self):
+        """ Observe the amount of seconds the enclosed code takes.
+
+        :return: context manager
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self) -> List[str]:
+        """ Render this metric in the Prometheus text format.
+
+        :return: lines of samples
+        """
+        with self.lock:
+            lines = [f'{self.name}_bucket{{le="{upper_bound}"}} {bucket_count}'
+                     for upper_bound, bucket_count in zip(self.buckets, self.bucket_counts)]
+            lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+            lines.append(f"{self.name}_sum {self.sum}")
+            lines.append(f"{self.name}_count {self.count}")
+            return lines
+
+
+class MetricsRegistry:
+    """ This class keeps track of all metrics of the evaluator.
+    """
+    def __init__(self):
+        """ Initialize a MetricsRegistry instance.
+        """
+        self.metrics: Dict[str, Counter | Gauge | Histogram] = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name: str, *args):
+        """ Return the metric with the given name, creating it if necessary.
+
+        :param metric_class: class of metric
+        :param name: name of metric
+        :return: metric
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = metric_class(name, *args)
+            return self.metrics[name]
+
+    def counter(self, name: str, description: str) -> Counter:
+        """ Return the counter with the given name.
+
+        :param name: name of metric
+        :param description: description of metric
+        :return: Counter
+        """
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        """ Return the gauge with the given name.
+
+        :param name: name of metric
+        :param description: description of metric
+        :return: Gauge
+        """
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(self, name: str, description: str, buckets: List[float] | None = None) -> Histogram:
+        """ Return the histogram with the given name.
+
+        :param name: name of metric
+        :param description: description of metric
+        :param buckets: upper bounds of buckets
+        :return: Histogram
+        """
+        return self._get_or_create(Histogram, name, description, buckets)
+
+    def render(self) -> str:
+        """ Render all metrics in the Prometheus text format.
+
+        :return: text of all metrics
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {METRIC_TYPES[type(metric)]}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRIC_TYPES = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}
+REGISTRY = MetricsRegistry()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """ This class serves the metrics of REGISTRY on /metrics.
+    """
+    def do_GET(self):
+        """ Respond with all metrics or 404 for other paths.
+
+        :return: None
+        """
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """ Log requests at debug level, scrapes would flood the log otherwise.
+
+        :return: None
+        """
+        logging.debug(f"Metrics request from {self.address_string()}: {format % args}")
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    """ Serve the metrics on http://host:port/metrics in a background thread.
+
+    :param host: host to bind to
+    :param port: port to listen on
+    :return: running server, stopped with shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -1,9 +1,14 @@
 from typing import List, Dict
 
+# marks the compact JSON representation of a graph, in which edges reference their vertices by ID
+COMPACT_FORMAT = "compact"
+
 
 class Graph:
     """ This class represents a graph consisting of Edges, Vertices and Labels.
     """
+    __slots__ = ("id", "edges", "vertices", "label")
+
     def __init__(self, id: int, label: str, vertices: List, edges: List):
         """ Initialize a Graph instance.
 
@@ -16,7 +21,7 @@ class Graph:
         self.edges = edges
         self.vertices = vertices
         self.label = label
-    
+
     def to_json(self) -> Dict:
         """ Return a JSON representation of this class instance.
 
@@ -28,11 +33,29 @@ class Graph:
             "vertices": [vertex.to_json() for vertex in self.vertices],
             "label": self.label
         }
-    
+
+    def to_compact_json(self) -> Dict:
+        """ Return a compact JSON representation of this class instance.
+
+        Vertices are [id, label, x, y] lists and edges are [source vertex ID, target vertex ID, label] lists, so the
+        representation grows linearly with the amount of vertices and edges.
+
+        :return: Instance representation as dictionary
+        """
+        return {
+            "format": COMPACT_FORMAT,
+            "id": self.id,
+            "label": self.label,
+            "vertices": [[vertex.id, vertex.label, vertex.x, vertex.y] for vertex in self.vertices],
+            "edges": [[edge.first_vertex.id, edge.second_vertex.id, edge.label] for edge in self.edges]
+        }
+
 
 class Vertex:
     """ This class represents a vertex consisting of coordinates and a label.
     """
+    __slots__ = ("id", "label", "x", "y")
+
     def __init__(self, id: int, label: str, x: int, y: int):
         """ Initialize a Vertex instance.
 
@@ -62,6 +85,8 @@ class Vertex:
 class Edge:
     """ This class represents an edge consisting of a source and target vertex and a label.
     """
+    __slots__ = ("first_vertex", "second_vertex", "label")
+
     def __init__(self, source_vertex: Vertex, target_vertex: Vertex, label: str):
         """ Initialize an Edge instance.
 
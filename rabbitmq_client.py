@@ -1,8 +1,10 @@
+import functools
 import logging
 import threading
 from typing import Dict
 
 import pika
+import pika.exceptions
 
 
 class MessageQueueMiddleware:
@@ -13,42 +15,128 @@ class MessageQueueMiddleware:
 
         :param broker_host: host address
         """
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=broker_host))
+        self.connection_params = pika.ConnectionParameters(host=broker_host)
+        self.connection = pika.BlockingConnection(self.connection_params)
         logging.info("Connected to message queue!")
-        self.channel = connection.channel()
+        self.channel = self.connection.channel()
+        # the publishing connection is not driven by a consumer, so it is used by one thread at a time
+        self.publish_lock = threading.Lock()
 
-    def consume(self, queue: str, callback):
+    def consume(self, queue: str, callback, prefetch_count: int | None = None):
         """ Consume a callback in another thread.
 
+        The callback is called with the message body and a Delivery. If a prefetch count is given, messages have to
+        be acknowledged manually through the Delivery and the broker delivers at most prefetch_count unacknowledged
+        messages at once. Otherwise messages are acknowledged on delivery and the Delivery is None.
+
         :param queue: name of message queue
         :param callback: function to call
+        :param prefetch_count: max amount of unacknowledged messages (None = acknowledge automatically)
         :return: None
         """
-        self.channel.queue_declare(queue=queue)
-        thread = threading.Thread(target=self._inner_consume, args=(queue, callback))
+        # unacknowledged messages of a consumer that dies with the process are delivered again by the broker
+        thread = threading.Thread(target=self._inner_consume, args=(queue, callback, prefetch_count), daemon=True)
         thread.start()
         logging.info("Consuming started!")
 
-    def _inner_consume(self, queue: str, callback):
+    def _inner_consume(self, queue: str, callback, prefetch_count: int | None):
         """ Consume callback internally.
 
         :param queue: name of message queue
         :param callback: function to call
+        :param prefetch_count: max amount of unacknowledged messages (None = acknowledge automatically)
         :return: None
         """
-        self.channel.basic_consume(queue=queue, on_message_callback=callback, auto_ack=True)
+        # pika connections must not be shared between threads, so every consumer has its own connection
+        connection = pika.BlockingConnection(self.connection_params)
+        channel = connection.channel()
+        channel.queue_declare(queue=queue)
+        if prefetch_count is not None:
+            channel.basic_qos(prefetch_count=prefetch_count)
+
+        def on_message(ch, method, properties, body):
+            delivery = None
+            if prefetch_count is not None:
+                delivery = Delivery(connection, ch, method.delivery_tag, method.redelivered)
+            callback(body, delivery)
+
+        channel.basic_consume(queue=queue, on_message_callback=on_message, auto_ack=prefetch_count is None)
         logging.info(f'Waiting for messages on queue "{queue}"')
-        self.channel.start_consuming()
+        channel.start_consuming()
 
     def publish(self, queue: str, msg):
-        """ Publish message on message queue.
+        """ Publish message on message queue. Can be called from any thread.
+
+        The publishing connection is reopened once if it was closed, e.g. because its heartbeats were missed while it
+        was idle.
 
         :param queue: name of message queue
         :param msg: message to send
         :return: None
         """
-        self.channel.basic_publish(exchange='', routing_key=queue, body=msg)
-        logging.info(f"Published {msg} on {queue}!")
+        with self.publish_lock:
+            try:
+                self.channel.basic_publish(exchange='', routing_key=queue, body=msg)
+            except (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError) as error:
+                logging.info(f"Publishing connection lost, reconnecting: {error}")
+                try:
+                    self.connection.close()
+                except pika.exceptions.AMQPError:
+                    pass
+                self.connection = pika.BlockingConnection(self.connection_params)
+                self.channel = self.connection.channel()
+                self.channel.basic_publish(exchange='', routing_key=queue, body=msg)
+        logging.debug(f"Published {msg} on {queue}!")
+
+
+class Delivery:
+    """ This class represents a received message that has to be acknowledged or rejected exactly once.
+    """
+    def __init__(self, connection: pika.BlockingConnection, channel, delivery_tag: int, redelivered: bool):
+        """ Initialize a Delivery instance.
+
+        :param connection: connection the message was received with
+        :param channel: channel the message was received with
+        :param delivery_tag: delivery tag of message
+        :param redelivered: whether the message was delivered before
+        """
+        self.connection = connection
+        self.channel = channel
+        self.delivery_tag = delivery_tag
+        self.redelivered = redelivered
+        self.settled = False
+        self.lock = threading.Lock()
+
+    def _settle(self) -> bool:
+        """ Mark this delivery as settled.
+
+        :return: whether the delivery was not settled before
+        """
+        with self.lock:
+            if self.settled:
+                return False
+            self.settled = True
+            return True
+
+    def ack(self):
+        """ Acknowledge the message, the broker discards it. Can be called from any thread.
+
+        :return: None
+        """
+        if self._settle():
+            self.connection.add_callback_threadsafe(functools.partial(self.channel.basic_ack,
+                                                                      delivery_tag=self.delivery_tag))
+
+    def reject(self, requeue: bool = True):
+        """ Reject the message. Can be called from any thread.
+
+        :param requeue: whether the broker should deliver the message again
+        :return: None
+        """
+        if self._settle():
+            self.connection.add_callback_threadsafe(functools.partial(self.channel.basic_nack,
+                                                                      delivery_tag=self.delivery_tag,
+                                                                      requeue=requeue))
 
 
 def build_answer_queue_msg(request_id: int, is_correct: bool) -> Dict:
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+
+from cache import LRUCache
+from metrics import REGISTRY
+
+
+class ResultCache:
+    """ This class memoizes evaluation results of identical submissions.
+
+    Results are keyed by a hash of the evaluation bundle and the normalized input answer, so a changed script or
+    graph never hits an old result. Results are kept in a bounded in-memory LRU cache and, if a path is given, in a
+    bounded SQLite database that survives restarts. Results are written to the database in batches in the background,
+    so memoizing a result never waits for the disk.
+    """
+    def __init__(self, max_size: int, path: str | None = None, max_disk_size: int = 1000000,
+                 flush_interval: float = 1):
+        """ Initialize a ResultCache instance.
+
+        :param max_size: max amount of results kept in memory
+        :param path: path of SQLite database to persist results in (None = memory only)
+        :param max_disk_size: max amount of results kept in the SQLite database
+        :param flush_interval: amount of seconds between writes of new results to the SQLite database
+        """
+        self.memory = LRUCache("result_memory", max_size)
+        self.max_disk_size = max_disk_size
+        self.disk_writes = 0
+        self.flush_interval = flush_interval
+        # results not written to the SQLite database yet by key
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.hits = REGISTRY.counter("result_cache_hits_total", "Submissions answered from the result cache")
+        self.misses = REGISTRY.counter("result_cache_misses_total", "Submissions not found in the result cache")
+        REGISTRY.gauge("result_cache_hit_ratio", "Share of submissions answered from the result cache").set_function(
+            self.get_hit_rate)
+
+        self.disk = None
+        self.disk_lock = threading.Lock()
+        if path:
+            self.disk = sqlite3.connect(path, check_same_thread=False)
+            self.disk.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, is_correct INTEGER)")
+            self.disk.commit()
+            self.thread = threading.Thread(target=self._flush_forever, name="result-cache", daemon=True)
+            self.thread.start()
+
+    @staticmethod
+    def normalize_answer(input_answer: str) -> str:
+        """ Normalize an input answer so that equivalent answers share a cache entry.
+
+        JSON objects and arrays are re-serialized with sorted keys and without whitespace, other answers are stripped.
+
+        :param input_answer: input answer
+        :return: normalized input answer
+        """
+        try:
+            answer = json.loads(input_answer)
+        except ValueError:
+            return input_answer.strip()
+
+        if isinstance(answer, (dict, list)):
+            return json.dumps(answer, sort_keys=True, separators=(",", ":"))
+        return input_answer.strip()
+
+    def get_key(self, bundle_digest: str, input_answer: str) -> str:
+        """ Get the cache key of a submission.
+
+        :param bundle_digest: digest of the evaluation bundle
+        :param input_answer: input answer
+        :return: cache key
+        """
+        return hashlib.sha256((bundle_digest + "\0" + self.normalize_answer(input_answer)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> bool | None:
+        """ Get a memoized result.
+
+        :param key: cache key
+        :return: whether answer is correct or None if the result is unknown
+        """
+        is_correct = self.memory.get(key)
+        if is_correct is None and self.disk:
+            with self.pending_lock:
+                is_correct = self.pending.get(key)
+        if is_correct is None and self.disk:
+            with self.disk_lock:
+                row = self.disk.execute("SELECT is_correct FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                is_correct = bool(row[0])
+                self.memory.put(key, is_correct)
+
+        if is_correct is None:
+            self.misses.inc()
+        else:
+            self.hits.inc()
+        return is_correct
+
+    def put(self, key: str, is_correct: bool):
+        """ Memoize a result. The result is written to the SQLite database with the next batch.
+
+        :param key: cache key
+        :param is_correct: whether answer is correct
+        :return: None
+        """
+        self.memory.put(key, is_correct)
+        if self.disk:
+            with self.pending_lock:
+                self.pending[key] = is_correct
+
+    def flush(self):
+        """ Write all pending results to the SQLite database in one transaction. Results that cannot be written are
+        dropped, they are only lost for the cache.
+
+        :return: None
+        """
+        with self.pending_lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return
+
+        try:
+            with self.disk_lock:
+                self.disk.executemany("INSERT OR REPLACE INTO results (key, is_correct) VALUES (?, ?)",
+                                      [(key, int(is_correct)) for key, is_correct in batch.items()])
+                previous_writes, self.disk_writes = self.disk_writes, self.disk_writes + len(batch)
+                # drop the oldest results from time to time to keep the database bounded
+                if self.disk_writes // 1000 > previous_writes // 1000:
+                    self.disk.execute("DELETE FROM results WHERE rowid <= (SELECT MAX(rowid) FROM results) - ?",
+                                      (self.max_disk_size,))
+                self.disk.commit()
+        except sqlite3.Error as error:
+            logging.error(f"Could not persist {len(batch)} cached results: {error}")
+
+    def _flush_forever(self):
+        """ Write pending results to the SQLite database whenever the flush interval elapsed.
+
+        :return: None
+        """
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def get_hit_rate(self) -> float:
+        """ Get the share of lookups that were hits.
+
+        :return: hit rate between 0 and 1
+        """
+        lookups = self.hits.value + self.misses.value
+        return self.hits.value / lookups if lookups else 0.0
+
+    def close(self):
+        """ Write pending results and close the SQLite database.
+
+        :return: None
+        """
+        if self.disk:
+            self.stopped.set()
+            self.thread.join()
+            self.flush()
+            with self.disk_lock:
+                self.disk.close()
@@ -0,0 +1,138 @@
+import datetime
+import logging
+import threading
+import time
+from typing import Callable
+
+from database import Database
+from metrics import REGISTRY
+
+PERSIST_SECONDS = REGISTRY.histogram("result_persist_seconds", "Time writing a batch of results to the database")
+
+
+class ResultSink:
+    """ This class buffers evaluation results and writes them to the database in batches.
+
+    A batch is flushed once it reaches the batch size, holds max_pending_acks callbacks or the flush interval elapsed,
+    whichever comes first. The on_persisted callback of a result is called after the batch containing it was
+    committed, so messages can be acknowledged only when their result is safe. Results of a failed flush stay buffered
+    and are retried.
+    """
+    def __init__(self, database: Database, batch_size: int = 100, flush_interval: float = 0.5,
+                 max_pending_acks: int | None = None):
+        """ Initialize a ResultSink instance and start flushing in the background.
+
+        :param database: database to write results to
+        :param batch_size: amount of buffered results that triggers a flush
+        :param flush_interval: max amount of seconds a result stays buffered
+        :param max_pending_acks: amount of buffered callbacks that triggers a flush, usually the prefetch count of the
+                                 consumer since no further message is delivered until one of them is acknowledged
+                                 (None = unlimited)
+        """
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending_acks = max_pending_acks
+        self.buffer = {}
+        self.pending_acks = 0
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self._flush_forever, name="result-sink", daemon=True)
+        self.thread.start()
+
+    def submit(self, request_id: int, is_correct: bool | None, on_persisted: Callable[[], None] | None = None):
+        """ Buffer a result. A later result for the same request replaces the buffered one.
+
+        :param request_id: ID of request
+        :param is_correct: whether answer is correct or not, None if the evaluation failed
+        :param on_persisted: function to call once the result is committed
+        :return: None
+        """
+        timestamp = datetime.datetime.now().isoformat()
+        with self.condition:
+            callbacks = self.buffer.pop(request_id, (None, None, []))[2]
+            if on_persisted:
+                callbacks.append(on_persisted)
+                self.pending_acks += 1
+            self.buffer[request_id] = (is_correct, timestamp, callbacks)
+            if self._is_batch_due():
+                self.condition.notify()
+
+    def _is_batch_due(self) -> bool:
+        """ Check whether the buffered results should be flushed right away. Must be called while holding the lock.
+
+        :return: whether the batch is due
+        """
+        return len(self.buffer) >= self.batch_size or \
+            (self.max_pending_acks is not None and self.pending_acks >= self.max_pending_acks)
+
+    def flush(self) -> bool:
+        """ Write all buffered results to the database in one transaction.
+
+        :return: whether all buffered results were persisted
+        """
+        with self.flush_lock:
+            with self.condition:
+                batch, self.buffer = self.buffer, {}
+                self.pending_acks = 0
+            if not batch:
+                return True
+
+            try:
+                with PERSIST_SECONDS.time():
+                    self.database.add_evaluation_results([(request_id, is_correct, timestamp)
+                                                          for request_id, (is_correct, timestamp, _) in batch.items()])
+            except Exception as error:
+                logging.error(f"Could not persist {len(batch)} results, retrying later: {error}")
+                with self.condition:
+                    # keep newer results that arrived during the flush but all callbacks
+                    for request_id, (is_correct, timestamp, callbacks) in self.buffer.items():
+                        previous_callbacks = batch[request_id][2] if request_id in batch else []
+                        batch[request_id] = (is_correct, timestamp, previous_callbacks + callbacks)
+                    self.buffer = batch
+                    self.pending_acks = sum(len(callbacks) for _, _, callbacks in batch.values())
+                return False
+
+            logging.info(f"Persisted {len(batch)} results!")
+            for _, _, callbacks in batch.values():
+                for callback in callbacks:
+                    # a failing acknowledgement, e.g. of a closed connection, must not stop the flushing thread
+                    try:
+                        callback()
+                    except Exception as error:
+                        logging.error(f"Could not acknowledge persisted result: {error}")
+            return True
+
+    def _flush_forever(self):
+        """ Flush results whenever a batch is due or the flush interval elapsed.
+
+        :return: None
+        """
+        while True:
+            with self.condition:
+                if self.closed:
+                    return
+                if not self._is_batch_due():
+                    self.condition.wait(self.flush_interval)
+            self.flush()
+
+    def close(self, retries: int = 3):
+        """ Stop flushing in the background and persist all buffered results.
+
+        Results that still cannot be persisted are lost for this process, but their messages were not acknowledged,
+        so the broker delivers them again.
+
+        :param retries: amount of attempts for the final flush
+        :return: None
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+
+        for _ in range(retries):
+            if self.flush():
+                return
+            time.sleep(self.flush_interval)
+        logging.error(f"Could not persist {len(self.buffer)} results before shutdown!")
@@ -0,0 +1,335 @@
+import collections
+import hashlib
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+
+from metrics import REGISTRY
+from sage_session import SageSession, SageSessionTimeout, TimeLimit
+
+TIMEOUTS = REGISTRY.counter("evaluation_timeouts_total", "Task solver runs that exceeded their time limit")
+EXEC_SECONDS = REGISTRY.histogram("sage_exec_seconds", "Time the Sage server took to run a job, files included")
+UPLOADED_BYTES = REGISTRY.counter("uploaded_file_bytes_total", "Bytes of files sent to containers")
+SKIPPED_UPLOADS = REGISTRY.counter("skipped_file_uploads_total", "Files not sent since containers already had them")
+
+# amount of recently served tasks a container remembers, matches the graph cache of the Sage server
+MAX_AFFINITY_KEYS = 16
+
+
+def parse_result(request_id: int, output: str, timed_out: bool = False) -> bool | None:
+    """ Get the result of a task solver run from its output.
+
+    :param request_id: ID of request
+    :param output: output of task solver
+    :param timed_out: whether the task solver exceeded its time limit
+    :return: whether the answer is correct or None if the task solver exceeded its time limit
+    """
+    if timed_out:
+        logging.error(f"Task request {request_id} exceeded its time limit!")
+        TIMEOUTS.inc()
+        return None
+
+    # TODO: use exit code to get result
+    output_string = output.strip()
+    if not output_string:
+        logging.error(f"No output log from task request {request_id} received!")
+    output_log_entries = output_string.split("\n")
+
+    # the task solver prints whether the answer is correct last
+    return output_log_entries[-1] == "True"
+
+
+class ContentFile:
+    """ This class represents a file with content and the files' path.
+    """
+    def __init__(self, filepath: str, content: Any):
+        """ Initialize a ContentFile instance.
+
+        :param filepath: filepath of file
+        :param content: content of file
+        """
+        self.filepath = filepath
+        self.content = content
+
+
+class SageContainer:
+    """ This abstract class represents an isolated environment that runs scripts in a Sage server.
+
+    It stages files, sends jobs to the Sage server and notifies observers with the results. Implementations provide
+    the Sage server and the environment it runs in, see DockerContainer and LocalContainer.
+    """
+    def __init__(self, name: str):
+        """ Initialize a SageContainer instance.
+
+        :param name: name of container
+        """
+        self.result_observers = []
+        self.release_observers = []
+        self.name = name
+        self.jobs_run = 0
+        self.uploaded_files = set()
+        self.staged_files = {}
+        # content digests of files present in the working directory by path
+        self.file_digests = {}
+        # keys of recently served tasks, whose artifacts are likely still cached by the Sage server
+        self.affinity_keys = collections.OrderedDict()
+        self.sage_session = None
+        self.needs_recycling = False
+
+    def upload_content_files(self, content_files: List[ContentFile], persistent: bool = False):
+        """ Stage a list of content files, which are written by the Sage server right before it runs the next job.
+
+        Files that are already present in the container with the same content are skipped, so a script is only sent
+        again if it changed.
+
+        :param content_files: list of content files
+        :param persistent: whether the files should be kept when the container is reset
+        :return: None
+        """
+        for content_file in content_files:
+            digest = hashlib.sha256(content_file.content.encode("utf-8")).hexdigest()
+            if self.file_digests.get(content_file.filepath) == digest:
+                logging.debug(f"File {content_file.filepath} is already present in container {self.name}!")
+                SKIPPED_UPLOADS.inc()
+                continue
+            UPLOADED_BYTES.inc(len(content_file.content))
+            self.staged_files[content_file.filepath] = (content_file.content, digest)
+            if not persistent:
+                self.uploaded_files.add(content_file.filepath)
+
+    def remember_affinity(self, key: str):
+        """ Remember that this container served a task, forgetting the least recently served task if necessary.
+
+        :param key: affinity key of task
+        :return: None
+        """
+        self.affinity_keys[key] = True
+        self.affinity_keys.move_to_end(key)
+        if len(self.affinity_keys) > MAX_AFFINITY_KEYS:
+            self.affinity_keys.popitem(last=False)
+
+    def holds(self, key: str) -> bool:
+        """ Check whether this container holds the artifacts of a key, i.e. recently served its task or has its file.
+
+        :param key: affinity key of task or path of file
+        :return: whether container holds the artifacts
+        """
+        return key in self.affinity_keys or key in self.file_digests
+
+    def start_sage_session(self):
+        """ Launch a resident Sage server in this container which runs all following scripts.
+
+        :return: None
+        """
+        logging.info(f"Starting Sage server in container {self.name}...")
+        self.sage_session = self._open_sage_session()
+
+    def _open_sage_session(self) -> SageSession:
+        """ Launch a Sage server in this container.
+
+        :return: SageSession
+        """
+        pass
+
+    def run_script(self, script: str, args: List[str], request_id: int, time_limit: TimeLimit | None = None,
+                   args_encoding: str | None = None, graph_arg: int | None = None):
+        """ Run a script with specified arguments and notify observers with result.
+
+        The script is run by the resident Sage server if one was started, otherwise a Sage server is launched for
+        this run only. Staged files and arguments are sent to the server's stdin in one payload, so arguments are
+        not limited by the size of a command line. If the script exceeds its time limit, it is stopped and observers
+        are notified with None.
+
+        :param script: path of script to run
+        :param args: script arguments
+        :param request_id: ID of request
+        :param time_limit: time limits of the script (None = unlimited)
+        :param args_encoding: encoding the Sage server applies to the arguments, e.g. "base64"
+        :param graph_arg: index of the argument holding a compact graph the Sage server expands (None = no graph)
+        :return: None
+        """
+        logging.info(f"Running script {script} for request {request_id} in container {self.name}")
+        try:
+            response = self._run_job(lambda session, files: session.run(script, args, time_limit, files,
+                                                                        args_encoding, graph_arg))
+            self.jobs_run += 1
+
+            if response is None:
+                self.call_observers(request_id, None)
+            else:
+                self._process_output(request_id, response["output"], response["timed_out"])
+        finally:
+            # the container has to return to its pool even if an observer failed
+            self.call_release_observers()
+
+    def run_script_batch(self, script: str, runs: List[Tuple[int, List[str]]], time_limit: TimeLimit | None = None,
+                         args_encoding: str | None = None, graph_arg: int | None = None,
+                         shared_args: List[str] | None = None):
+        """ Run a script for several requests in one Sage process and notify observers with each result.
+
+        The resident Sage server is used if one was started, otherwise a Sage server is launched for this batch only.
+        A failing run only affects the result of its own request, unless the Sage server itself fails.
+
+        :param script: path of script to run
+        :param runs: list of (request ID, script arguments)
+        :param time_limit: time limits of every single run (None = unlimited)
+        :param args_encoding: encoding the Sage server applies to the arguments, e.g. "base64"
+        :param graph_arg: index of the argument holding a compact graph the Sage server expands (None = no graph)
+        :param shared_args: arguments sent once and appended to the arguments of every run, e.g. the graph
+        :return: None
+        """
+        logging.info(f"Running script {script} for {len(runs)} requests in container {self.name}")
+        try:
+            responses = self._run_job(lambda session, files: session.run_batch(script, runs, time_limit, files,
+                                                                               args_encoding, graph_arg, shared_args))
+            results = {result["id"]: result for result in responses or []}
+            self.jobs_run += len(runs)
+
+            for request_id, _ in runs:
+                if request_id in results:
+                    self._process_output(request_id, results[request_id]["output"],
+                                         results[request_id]["timed_out"])
+                else:
+                    self.call_observers(request_id, None)
+        finally:
+            # the container has to return to its pool even if an observer failed
+            self.call_release_observers()
+
+    def _run_job(self, job: Callable[[SageSession, Dict[str, str]], Any]) -> Any:
+        """ Run a job in the resident Sage server or in a Sage server launched for this job only, together with all
+        staged files.
+
+        Any error, e.g. of the docker API while launching the server, marks this container for recycling.
+
+        :param job: function sending the job to a session, given the session and the staged file contents by path
+        :return: response of the job or None if the Sage server failed
+        """
+        session = self.sage_session
+        staged_files, self.staged_files = self.staged_files, {}
+        try:
+            if not session:
+                session = self._open_sage_session()
+            with EXEC_SECONDS.time():
+                response = job(session, {path: content for path, (content, _) in staged_files.items()})
+            self.file_digests.update((path, digest) for path, (_, digest) in staged_files.items())
+            return response
+        except Exception as error:
+            self._on_session_error(session, error)
+            return None
+        finally:
+            if session and session is not self.sage_session:
+                session.close()
+
+    def _on_session_error(self, session: SageSession | None, error: Exception):
+        """ Drop a failed Sage server and mark this container for recycling since the server may still be running.
+
+        :param session: failed session
+        :param error: error raised by the session or while launching it
+        :return: None
+        """
+        logging.error(f"Sage server of container {self.name} failed: {error}")
+        if isinstance(error, SageSessionTimeout):
+            TIMEOUTS.inc()
+        if session:
+            session.close()
+        self.sage_session = None
+        self.needs_recycling = True
+
+    def _process_output(self, request_id: int, output: str, timed_out: bool = False):
+        """ Process the output of a task solver and notify observers with result.
+
+        :param request_id: ID of request
+        :param output: output of task solver
+        :param timed_out: whether the task solver exceeded its time limit, observers are notified with None then
+        :return: None
+        """
+        if timed_out:
+            # the interrupted script may have left threads, memory or files behind, so the container is not reused
+            self.needs_recycling = True
+        self.call_observers(request_id, parse_result(request_id, output, timed_out))
+
+    def add_result_observer(self, observer):
+        """ Add observers for new results.
+
+        :param observer: function to be triggered
+        :return: None
+        """
+        self.result_observers.append(observer)
+
+    def call_observers(self, request_id: int, result: bool | None):
+        """ Call all registered observers.
+
+        :param request_id: ID of request
+        :param result: task result or None if the task solver failed
+        :return: None
+        """
+        # iterate over a copy since observers may reset this container while being notified
+        for observer in list(self.result_observers):
+            observer(request_id, result)
+
+    def add_release_observer(self, observer):
+        """ Add observers that are triggered once a job (a single run or a whole batch) is done.
+
+        :param observer: function to be triggered
+        :return: None
+        """
+        self.release_observers.append(observer)
+
+    def call_release_observers(self):
+        """ Call all registered release observers.
+
+        :return: None
+        """
+        # iterate over a copy since observers may reset this container while being notified
+        for observer in list(self.release_observers):
+            observer()
+
+    def reset(self) -> bool:
+        """ Reset this container so that it can be reused for another evaluation.
+
+        Removes all uploaded content files from the working directory and drops all observers.
+
+        :return: whether the reset was successful
+        """
+        self.result_observers = []
+        self.release_observers = []
+        self.staged_files = {}
+        if not self.uploaded_files:
+            return True
+
+        logging.info(f"Resetting working directory of container {self.name}...")
+        if not self._remove_files(sorted(self.uploaded_files)):
+            return False
+
+        for filepath in self.uploaded_files:
+            self.file_digests.pop(filepath, None)
+        self.uploaded_files.clear()
+        return True
+
+    def _remove_files(self, filepaths: List[str]) -> bool:
+        """ Remove files from the working directory.
+
+        :param filepaths: paths of files relative to the working directory
+        :return: whether the files were removed
+        """
+        pass
+
+    def is_healthy(self) -> bool:
+        """ Check whether this container is able to run scripts.
+
+        :return: whether container is healthy
+        """
+        pass
+
+    def get_memory_usage(self) -> int | None:
+        """ Get the current memory usage of this container.
+
+        :return: memory usage in bytes or None if not available
+        """
+        return None
+
+    def vanish(self):
+        """ Remove this container.
+
+        :return: None
+        """
+        pass
@@ -0,0 +1,310 @@
+""" Resident Sage server that runs inside an evaluation container.
+
+The server imports the Sage library once and then reads jobs as JSON lines from stdin. Every job names a script and
+its arguments (or a batch of arguments) and may carry files to write before running, so a job and all its data
+travel in a single payload. The script is run in a fresh namespace and the captured output is written back as a JSON
+line prefixed with RESPONSE_PREFIX to stdout. The server exits once stdin is closed, so it can also serve a single
+job in a one-off Sage process.
+
+Started with --python, the server runs plain Python scripts without the Sage library, which allows trusted
+lightweight checks to run in a local interpreter.
+"""
+import base64
+import contextlib
+import functools
+import io
+import json
+import os
+import signal
+import sys
+import traceback
+
+RESPONSE_PREFIX = "@@mathgrass@@ "
+
+# must match COMPACT_FORMAT of model.graph_model, which is not available inside the container
+COMPACT_GRAPH_FORMAT = "compact"
+
+
+class JobTimeout(Exception):
+    """ This exception is raised inside a job that exceeded its CPU time limit, or its wall clock time limit when
+    running without Sage.
+    """
+
+
+def _raise_job_timeout(signum, frame):
+    raise JobTimeout("CPU time limit exceeded" if signum == signal.SIGPROF else "Wall clock time limit exceeded")
+
+
+@contextlib.contextmanager
+def time_limits(wall_time: float | None, cpu_time: float | None, sage: bool = True):
+    """ Interrupt the enclosed code once it exceeds a wall clock or CPU time limit.
+
+    The wall clock limit uses the alarm of cysignals, which also interrupts long running computations inside the Sage
+    library, or the real timer of this process without Sage. The CPU time limit uses the profiling timer of this
+    process.
+
+    :param wall_time: wall clock time limit in seconds (None = unlimited)
+    :param cpu_time: CPU time limit in seconds (None = unlimited)
+    :param sage: whether the Sage library is loaded
+    :return: context manager
+    """
+    if sage:
+        from cysignals.alarm import alarm, cancel_alarm
+    else:
+        signal.signal(signal.SIGALRM, _raise_job_timeout)
+
+        def alarm(seconds: float):
+            signal.setitimer(signal.ITIMER_REAL, seconds)
+
+        def cancel_alarm():
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    if cpu_time:
+        signal.signal(signal.SIGPROF, _raise_job_timeout)
+        signal.setitimer(signal.ITIMER_PROF, cpu_time)
+    if wall_time:
+        alarm(wall_time)
+    try:
+        yield
+    finally:
+        cancel_alarm()
+        signal.setitimer(signal.ITIMER_PROF, 0)
+
+
+def load_base_namespace(sage: bool = True) -> dict:
+    """ Import the Sage library into a namespace that serves as template for all jobs.
+
+    :param sage: whether to import the Sage library, an empty namespace is returned otherwise
+    :return: namespace
+    """
+    namespace = {}
+    if sage:
+        exec("from sage.all_cmdline import *", namespace)
+    return namespace
+
+
+def compile_script(script: str, sage: bool = True):
+    """ Preparse and compile a Sage script.
+
+    Compiled scripts are memoized until their file changes, so a script that is run again is neither preparsed nor
+    compiled again. Evaluators name scripts by their content hash, which keeps the scripts of many tasks side by side.
+
+    :param script: path of script
+    :param sage: whether to preparse the script, plain Python scripts are compiled as they are
+    :return: code object
+    """
+    stat = os.stat(script)
+    return _compile_script(script, stat.st_mtime_ns, stat.st_size, sage)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_script(script: str, mtime_ns: int, size: int, sage: bool):
+    """ Preparse and compile a version of a Sage script.
+
+    :param script: path of script
+    :param mtime_ns: modification time of script, part of the cache key
+    :param size: size of script, part of the cache key
+    :param sage: whether to preparse the script
+    :return: code object
+    """
+    with open(script) as script_file:
+        source = script_file.read()
+    if sage:
+        source = preparse_script(script, source, mtime_ns)
+    return compile(source, script, "exec")
+
+
+def preparse_script(script: str, source: str, mtime_ns: int) -> str:
+    """ Preparse a Sage script, reusing the preparsed script next to it if it is not older than the script.
+
+    The preparsed script outlives this server, so a server launched again in the same container skips preparsing.
+
+    :param script: path of script
+    :param source: source of script
+    :param mtime_ns: modification time of script
+    :return: Python source
+    """
+    preparsed_path = script + ".py"
+    try:
+        if os.stat(preparsed_path).st_mtime_ns >= mtime_ns:
+            with open(preparsed_path) as preparsed_file:
+                return preparsed_file.read()
+    except OSError:
+        pass
+
+    from sage.repl.preparse import preparse_file
+    preparsed = preparse_file(source)
+    try:
+        with open(preparsed_path, "w") as preparsed_file:
+            preparsed_file.write(preparsed)
+    except OSError:
+        pass
+    return preparsed
+
+
+def execute(code, script: str, args: list, base_namespace: dict, wall_time: float | None = None,
+            cpu_time: float | None = None, sage: bool = True) -> dict:
+    """ Execute a compiled script in a fresh namespace.
+
+    :param code: compiled script
+    :param script: path of script
+    :param args: script arguments
+    :param base_namespace: namespace template containing the Sage library
+    :param wall_time: wall clock time limit in seconds (None = unlimited)
+    :param cpu_time: CPU time limit in seconds (None = unlimited)
+    :param sage: whether the Sage library is loaded
+    :return: captured output, whether the script failed and whether it exceeded a time limit
+    """
+    output = io.StringIO()
+    failed = False
+    timed_out = False
+    argv = sys.argv
+    try:
+        namespace = dict(base_namespace)
+        namespace["__name__"] = "__main__"
+        sys.argv = [script] + args
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output), \
+                time_limits(wall_time, cpu_time, sage):
+            exec(code, namespace)
+    except SystemExit as exit_error:
+        failed = exit_error.code not in (None, 0)
+    except (JobTimeout, KeyboardInterrupt) as timeout:
+        # cysignals interrupts with AlarmInterrupt, a subclass of KeyboardInterrupt
+        output.write(f"Time limit exceeded: {timeout}")
+        failed = True
+        timed_out = True
+    except BaseException:
+        traceback.print_exc(file=output)
+        failed = True
+    finally:
+        sys.argv = argv
+
+    return {"output": output.getvalue(), "failed": failed, "timed_out": timed_out}
+
+
+def write_files(files: dict):
+    """ Write the files of a job to the working directory.
+
+    :param files: file contents by path
+    :return: None
+    """
+    for path, content in files.items():
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            file.write(content)
+
+
+@functools.lru_cache(maxsize=16)
+def expand_graph(graph_json: str) -> str:
+    """ Expand the compact JSON representation of a graph to the representation evaluation scripts expect, in which
+    edges embed copies of their vertices. Expansions are memoized since a graph is usually evaluated many times.
+
+    :param graph_json: compact JSON representation of a graph
+    :return: JSON representation of the graph
+    """
+    graph = json.loads(graph_json)
+    if graph.get("format") != COMPACT_GRAPH_FORMAT:
+        return graph_json
+
+    vertices = [{"id": vertex_id, "label": label, "x": x, "y": y} for vertex_id, label, x, y in graph["vertices"]]
+    vertex_dict = {vertex["id"]: vertex for vertex in vertices}
+    edges = [{"source_vertex": vertex_dict[source_id], "target_vertex": vertex_dict[target_id], "label": label}
+             for source_id, target_id, label in graph["edges"]]
+    return json.dumps({"id": graph["id"], "edges": edges, "vertices": vertices, "label": graph["label"]})
+
+
+@functools.lru_cache(maxsize=16)
+def encode_arg(arg: str, encoding: str | None) -> str:
+    """ Encode a script argument the way the script expects it. Encodings are memoized so that the graph shared by
+    all runs of a batch is only encoded once.
+
+    :param arg: script argument
+    :param encoding: "base64" or None to pass the argument as it is
+    :return: encoded script argument
+    """
+    if encoding == "base64":
+        return base64.b64encode(arg.encode("utf-8")).decode("utf-8")
+    return arg
+
+
+def prepare_args(args: list, encoding: str | None, graph_arg: int | None) -> list:
+    """ Prepare script arguments the way the script expects them.
+
+    Arguments travel unencoded and graphs travel in their compact representation, both are only converted here, so
+    the payload is not inflated by the conversion.
+
+    :param args: script arguments
+    :param encoding: "base64" or None to pass arguments as they are
+    :param graph_arg: index of the argument holding a compact graph to expand (None = no graph)
+    :return: prepared script arguments
+    """
+    return [encode_arg(expand_graph(arg) if index == graph_arg else arg, encoding) for index, arg in enumerate(args)]
+
+
+def run_job(job: dict, base_namespace: dict, sage: bool = True) -> dict:
+    """ Run a job in a fresh namespace.
+
+    A job consists of an id, a script path, optional files to write, an optional argument encoding, the optional
+    index of a graph argument, optional time limits and either script arguments or, for a batch job, a list of runs
+    with their own id and script arguments.
+    The script of a batch job is compiled once and every run gets a fresh namespace and its own time limits, so a
+    failing run does not affect the others. Arguments shared by all runs of a batch, e.g. the graph, travel once as
+    shared_args and are appended to the arguments of every run.
+
+    :param job: job to run
+    :param base_namespace: namespace template containing the Sage library
+    :param sage: whether the Sage library is loaded
+    :return: response containing the job id and the output of the script or of every run
+    """
+    try:
+        write_files(job.get("files", {}))
+        code = compile_script(job["script"], sage)
+    except BaseException:
+        error = {"output": traceback.format_exc(), "failed": True, "timed_out": False}
+        if "batch" in job:
+            return {"id": job["id"], "results": [dict(error, id=run["id"]) for run in job["batch"]]}
+        return dict(error, id=job["id"])
+
+    shared_args = job.get("shared_args", [])
+
+    def run(args: list) -> dict:
+        try:
+            # all runs pass the same shared argument objects, so their memoized conversions are looked up cheaply
+            args = prepare_args(args + shared_args, job.get("args_encoding"), job.get("graph_arg"))
+        except Exception:
+            return {"output": traceback.format_exc(), "failed": True, "timed_out": False}
+        return execute(code, job["script"], args, base_namespace, job.get("wall_time"), job.get("cpu_time"), sage)
+
+    if "batch" in job:
+        return {"id": job["id"], "results": [dict(run(batch_run["args"]), id=batch_run["id"])
+                                             for batch_run in job["batch"]]}
+    return dict(run(job["args"]), id=job["id"])
+
+
+def respond(response: dict):
+    """ Write a response to stdout.
+
+    :param response: response to write
+    :return: None
+    """
+    sys.stdout.write(RESPONSE_PREFIX + json.dumps(response) + "\n")
+    sys.stdout.flush()
+
+
+def main():
+    """ Serve jobs from stdin until stdin is closed.
+
+    :return: None
+    """
+    sage = "--python" not in sys.argv[1:]
+    base_namespace = load_base_namespace(sage)
+    respond({"ready": True})
+
+    for line in sys.stdin:
+        if line.strip():
+            respond(run_job(json.loads(line), base_namespace, sage))
+
+
+if __name__ == '__main__':
+    main()
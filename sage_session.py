@@ -0,0 +1,354 @@
+import json
+import logging
+import os
+import resource
+import signal
+import socket
+import struct
+import subprocess
+from typing import Dict, List, Tuple
+
+from docker import DockerClient
+
+from sage_server import RESPONSE_PREFIX
+
+STDOUT_STREAM = 1
+FRAME_HEADER_SIZE = 8
+LOCAL_READ_SIZE = 65536
+
+# time the Sage server gets on top of the time limit to report a timeout itself before it is considered stuck
+TIMEOUT_GRACE_SECONDS = 5
+# time the Sage server gets to import the Sage library and report that it is ready
+STARTUP_TIMEOUT_SECONDS = 300
+
+
+class SageSessionError(Exception):
+    """ This exception is raised if the resident Sage server is not usable anymore.
+    """
+
+
+class SageSessionTimeout(SageSessionError):
+    """ This exception is raised if the resident Sage server did not respond within the time limit of a job.
+    """
+
+
+class TimeLimit:
+    """ This class represents the time limits of a single task solver run.
+    """
+    def __init__(self, wall_seconds: float, cpu_seconds: float):
+        """ Initialize a TimeLimit instance.
+
+        :param wall_seconds: wall clock time limit in seconds
+        :param cpu_seconds: CPU time limit in seconds
+        """
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+
+
+def encode_job(job: dict, job_id: int, time_limit: TimeLimit | None = None, files: Dict[str, str] | None = None,
+               args_encoding: str | None = None, graph_arg: int | None = None) -> bytes:
+    """ Encode a job as a JSON line for the Sage server.
+
+    :param job: job without ID
+    :param job_id: ID of job
+    :param time_limit: time limits of every single run (None = unlimited)
+    :param files: file contents by path to write before running the job
+    :param args_encoding: encoding the server applies to the arguments before passing them to the script
+    :param graph_arg: index of the argument holding a compact graph the server expands (None = no graph)
+    :return: encoded job
+    """
+    job["id"] = job_id
+    if files:
+        job["files"] = files
+    if args_encoding:
+        job["args_encoding"] = args_encoding
+    if graph_arg is not None:
+        job["graph_arg"] = graph_arg
+    if time_limit:
+        job["wall_time"] = time_limit.wall_seconds
+        job["cpu_time"] = time_limit.cpu_seconds
+    return (json.dumps(job) + "\n").encode("utf-8")
+
+
+def get_response_timeout(time_limit: TimeLimit | None, runs: int) -> float | None:
+    """ Get the amount of seconds after which a Sage server that did not respond to a job is considered stuck.
+
+    :param time_limit: time limits of every single run (None = unlimited)
+    :param runs: amount of runs of the job
+    :return: amount of seconds or None if the job is not limited
+    """
+    return time_limit.wall_seconds * runs + TIMEOUT_GRACE_SECONDS if time_limit else None
+
+
+class ServerOutput:
+    """ This class collects the output of a Sage server and extracts the responses from it.
+    """
+    def __init__(self):
+        """ Initialize a ServerOutput instance.
+        """
+        self.buffer = b""
+        self.lines = []
+
+    def collect(self, data: bytes, stream: int = STDOUT_STREAM):
+        """ Collect complete lines of the servers' stdout, data of other streams is only logged.
+
+        :param data: data received from the server
+        :param stream: stream the data was received from
+        :return: None
+        """
+        if stream != STDOUT_STREAM:
+            logging.debug(f"Sage server: {data.decode('utf-8', errors='replace').strip()}")
+            return
+
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b"\n")
+        self.lines.extend(line.decode("utf-8", errors="replace") for line in lines)
+
+    def next_response(self) -> dict | None:
+        """ Get the next response from the collected lines, other lines are logged.
+
+        :return: response or None if more output is needed
+        """
+        while self.lines:
+            line = self.lines.pop(0)
+            if line.startswith(RESPONSE_PREFIX):
+                return json.loads(line[len(RESPONSE_PREFIX):])
+            logging.debug(f"Sage server: {line}")
+        return None
+
+
+class SageSession:
+    """ This class represents a resident Sage server running inside a Docker container.
+
+    Jobs are sent as JSON lines to the servers' stdin and responses are read from its multiplexed stdout.
+    """
+    def __init__(self, container_id: str, docker_client: DockerClient, workdir: str):
+        """ Initialize a SageSession instance by launching the Sage server and waiting until it is ready.
+
+        :param container_id: ID of container the server runs in
+        :param docker_client: docker client
+        :param workdir: directory containing the server script
+        """
+        self.api = docker_client.api
+        self.exec_id = self.api.exec_create(container_id, ["sage", "-python", "sage_server.py"], stdin=True,
+                                            stdout=True, stderr=True, tty=False, workdir=workdir)["Id"]
+        socket_io = self.api.exec_start(self.exec_id, socket=True)
+        self.socket = getattr(socket_io, "_sock", socket_io)
+        self.output = ServerOutput()
+        self.next_job_id = 0
+
+        self._wait_until_ready()
+        logging.info(f"Sage server in container {container_id} is ready!")
+
+    def _wait_until_ready(self):
+        """ Wait until the Sage server reports that it is ready, closing the session if the server fails to start.
+
+        :return: None
+        """
+        self.socket.settimeout(STARTUP_TIMEOUT_SECONDS)
+        try:
+            self._read_response()
+        except SageSessionTimeout:
+            self.close()
+            raise SageSessionTimeout(f"Sage server did not start within {STARTUP_TIMEOUT_SECONDS} seconds")
+        except SageSessionError:
+            self.close()
+            raise
+        self.socket.settimeout(None)
+
+    def run(self, script: str, args: List[str], time_limit: TimeLimit | None = None,
+            files: Dict[str, str] | None = None, args_encoding: str | None = None,
+            graph_arg: int | None = None) -> dict:
+        """ Run a script inside the Sage server.
+
+        :param script: path of script to run
+        :param args: script arguments
+        :param time_limit: time limits of the run (None = unlimited)
+        :param files: file contents by path to write before running the script
+        :param args_encoding: encoding the server applies to the arguments before passing them to the script
+        :param graph_arg: index of the argument holding a compact graph the server expands (None = no graph)
+        :return: response containing the script output, whether the script failed and whether it timed out
+        """
+        return self._send({"script": script, "args": args}, time_limit, 1, files, args_encoding, graph_arg)
+
+    def run_batch(self, script: str, runs: List[Tuple[int, List[str]]], time_limit: TimeLimit | None = None,
+                  files: Dict[str, str] | None = None, args_encoding: str | None = None,
+                  graph_arg: int | None = None, shared_args: List[str] | None = None) -> List[dict]:
+        """ Run a script several times with different arguments inside the Sage server.
+
+        :param script: path of script to run
+        :param runs: list of (run ID, script arguments)
+        :param time_limit: time limits of every single run (None = unlimited)
+        :param files: file contents by path to write before running the script
+        :param args_encoding: encoding the server applies to the arguments before passing them to the script
+        :param graph_arg: index of the argument holding a compact graph the server expands (None = no graph)
+        :param shared_args: arguments sent once and appended to the arguments of every run
+        :return: list of responses containing the run ID, the script output, whether the script failed and whether
+                 it timed out
+        """
+        job = {"script": script, "batch": [{"id": run_id, "args": args} for run_id, args in runs]}
+        if shared_args:
+            job["shared_args"] = shared_args
+        response = self._send(job, time_limit, len(runs), files, args_encoding, graph_arg)
+        return response["results"]
+
+    def _send(self, job: dict, time_limit: TimeLimit | None, runs: int, files: Dict[str, str] | None = None,
+              args_encoding: str | None = None, graph_arg: int | None = None) -> dict:
+        """ Send a job to the Sage server and wait for its response.
+
+        If the server does not respond within the time limits of all runs, a SageSessionTimeout is raised and the
+        session must not be used anymore.
+
+        :param job: job without ID
+        :param time_limit: time limits of every single run (None = unlimited)
+        :param runs: amount of runs of the job
+        :param files: file contents by path to write before running the job
+        :param args_encoding: encoding the server applies to the arguments before passing them to the script
+        :param graph_arg: index of the argument holding a compact graph the server expands (None = no graph)
+        :return: response
+        """
+        self.next_job_id += 1
+        try:
+            self.socket.sendall(encode_job(job, self.next_job_id, time_limit, files, args_encoding, graph_arg))
+        except OSError as error:
+            raise SageSessionError(f"Could not send job to Sage server: {error}")
+
+        self.socket.settimeout(get_response_timeout(time_limit, runs))
+        try:
+            response = self._read_response()
+        finally:
+            self.socket.settimeout(None)
+        if response.get("id") != self.next_job_id:
+            raise SageSessionError(f"Unexpected response from Sage server: {response}")
+        return response
+
+    def _read_response(self) -> dict:
+        """ Read lines from the servers' stdout until the next response arrives.
+
+        :return: response
+        """
+        response = self.output.next_response()
+        while response is None:
+            self._read_frame()
+            response = self.output.next_response()
+        return response
+
+    def _read_frame(self):
+        """ Read a single frame of the multiplexed exec stream and collect complete stdout lines.
+
+        :return: None
+        """
+        stream, size = struct.unpack(">BxxxL", self._recv_exactly(FRAME_HEADER_SIZE))
+        self.output.collect(self._recv_exactly(size), stream)
+
+    def _recv_exactly(self, size: int) -> bytes:
+        """ Receive exactly the given amount of bytes from the exec socket.
+
+        :param size: amount of bytes
+        :return: received bytes
+        """
+        data = b""
+        while len(data) < size:
+            data += self._recv(size - len(data))
+        return data
+
+    def _recv(self, max_size: int) -> bytes:
+        """ Receive up to the given amount of bytes from the socket.
+
+        :param max_size: max amount of bytes
+        :return: received bytes
+        """
+        try:
+            chunk = self.socket.recv(max_size)
+        except socket.timeout:
+            raise SageSessionTimeout("Sage server did not respond within the time limit")
+        except OSError as error:
+            raise SageSessionError(f"Connection to Sage server lost: {error}")
+        if not chunk:
+            raise SageSessionError("Sage server terminated")
+        return chunk
+
+    def is_alive(self) -> bool:
+        """ Check whether the Sage server is still running.
+
+        :return: whether server is running
+        """
+        try:
+            return self.api.exec_inspect(self.exec_id)["Running"]
+        except Exception:
+            return False
+
+    def close(self):
+        """ Close the connection to the Sage server, which makes the server terminate.
+
+        :return: None
+        """
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+
+class LocalSageSession(SageSession):
+    """ This class represents a resident Sage server running in a subprocess of this host.
+
+    Jobs are sent as JSON lines to the servers' stdin and responses are read from its plain stdout. The subprocess runs
+    in its own session with resource limits, so it can be killed with everything it started.
+    """
+    def __init__(self, command: List[str], workdir: str, resource_limits: Dict[int, int] | None = None):
+        """ Initialize a LocalSageSession instance by launching the Sage server and waiting until it is ready.
+
+        :param command: command launching the server
+        :param workdir: working directory of the server
+        :param resource_limits: limits applied to the server process by resource (e.g. resource.RLIMIT_AS)
+        """
+        # a socket pair instead of pipes allows reading with the same timeouts as the exec socket of a container
+        self.socket, server_socket = socket.socketpair()
+        try:
+            self.process = subprocess.Popen(command, stdin=server_socket, stdout=server_socket,
+                                            stderr=subprocess.DEVNULL, cwd=workdir, start_new_session=True)
+        except (OSError, subprocess.SubprocessError) as error:
+            self.socket.close()
+            raise SageSessionError(f"Could not launch Sage server: {error}")
+        finally:
+            server_socket.close()
+
+        # limits are applied from outside since a preexec function is not safe while other threads are running, they
+        # are in place before the server gets its first job
+        try:
+            for limit, value in (resource_limits or {}).items():
+                resource.prlimit(self.process.pid, limit, (value, value))
+        except OSError as error:
+            self.close()
+            raise SageSessionError(f"Could not limit resources of Sage server: {error}")
+        self.output = ServerOutput()
+        self.next_job_id = 0
+
+        self._wait_until_ready()
+        logging.info(f"Local Sage server with PID {self.process.pid} is ready!")
+
+    def _read_frame(self):
+        """ Read the next chunk of the servers' stdout and collect complete lines.
+
+        :return: None
+        """
+        self.output.collect(self._recv(LOCAL_READ_SIZE))
+
+    def is_alive(self) -> bool:
+        """ Check whether the Sage server is still running.
+
+        :return: whether server is running
+        """
+        return self.process.poll() is None
+
+    def close(self):
+        """ Close the connection to the Sage server and kill it together with all processes it started.
+
+        :return: None
+        """
+        super().close()
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.process.wait()
@@ -0,0 +1,124 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from typing import Callable, Dict
+
+
+class WorkerSupervisor:
+    """ This class runs a worker function in several forked processes and restarts workers that crashed.
+
+    Every worker is started with its index and the amount of workers, so it can take its share of shared budgets.
+    On SIGINT or SIGTERM the workers are asked to shut down with SIGINT and are killed if they do not exit in time.
+    """
+    def __init__(self, worker_count: int, worker: Callable[[int, int], None], restart_delay: float = 1,
+                 max_restart_delay: float = 60, shutdown_timeout: float = 60):
+        """ Initialize a WorkerSupervisor instance.
+
+        :param worker_count: amount of worker processes
+        :param worker: function run by each worker process, called with the worker index and the amount of workers
+        :param restart_delay: amount of seconds to wait before restarting a crashed worker
+        :param max_restart_delay: max amount of seconds to wait before restarting a worker that keeps crashing
+        :param shutdown_timeout: amount of seconds workers may take to shut down
+        """
+        self.worker_count = worker_count
+        self.worker = worker
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.context = multiprocessing.get_context("fork")
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.started_at = {}
+        self.crashes = {}
+        self.restart_at = {}
+        self.stopping = False
+
+    def run(self):
+        """ Start all workers and supervise them until a shutdown is requested.
+
+        :return: None
+        """
+        signal.signal(signal.SIGINT, self._request_shutdown)
+        signal.signal(signal.SIGTERM, self._request_shutdown)
+
+        logging.info(f"Starting {self.worker_count} worker processes...")
+        for index in range(self.worker_count):
+            self._start_worker(index)
+
+        while not self.stopping:
+            self._supervise()
+            time.sleep(1)
+        self._shutdown()
+
+    def _start_worker(self, index: int):
+        """ Start a worker process.
+
+        :param index: index of worker
+        :return: None
+        """
+        process = self.context.Process(target=self._run_worker, args=(index,), name=f"worker-{index}")
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        logging.info(f"Started worker {index} with PID {process.pid}!")
+
+    def _run_worker(self, index: int):
+        """ Run the worker function inside a worker process.
+
+        :param index: index of worker
+        :return: None
+        """
+        # handlers of the supervisor must not run in the worker
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self.worker(index, self.worker_count)
+
+    def _supervise(self):
+        """ Restart workers that exited, waiting longer for workers that keep crashing.
+
+        :return: None
+        """
+        now = time.monotonic()
+        for index, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+
+            if index not in self.restart_at:
+                # a worker that ran for a while before crashing is restarted quickly again
+                if now - self.started_at[index] > self.max_restart_delay:
+                    self.crashes[index] = 0
+                self.crashes[index] = self.crashes.get(index, 0) + 1
+                delay = min(self.restart_delay * 2 ** (self.crashes[index] - 1), self.max_restart_delay)
+                logging.error(f"Worker {index} exited with code {process.exitcode}, restarting in {delay}s...")
+                self.restart_at[index] = now + delay
+            elif now >= self.restart_at[index]:
+                del self.restart_at[index]
+                self._start_worker(index)
+
+    def _request_shutdown(self, signum, frame):
+        """ Request a shutdown of all workers.
+
+        :param signum: received signal
+        :param frame: current stack frame
+        :return: None
+        """
+        self.stopping = True
+
+    def _shutdown(self):
+        """ Ask all workers to shut down and kill workers that do not exit in time.
+
+        :return: None
+        """
+        logging.info("Shutting down worker processes...")
+        for process in self.processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for index, process in self.processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logging.error(f"Worker {index} did not shut down in time, killing...")
+                process.kill()
+                process.join()
@@ -0,0 +1,61 @@
+import time
+import unittest
+
+from admission_queue import AdmissionQueue
+
+
+class AdmissionQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.deadline = time.monotonic() + 60
+
+    def test_serves_by_priority_then_in_arrival_order(self):
+        queue = AdmissionQueue(max_size=10)
+        first = queue.enqueue(0, self.deadline)
+        urgent = queue.enqueue(5, self.deadline)
+        second = queue.enqueue(0, self.deadline)
+
+        self.assertEqual([queue.next_waiter() for _ in range(3)], [urgent, first, second])
+        self.assertIsNone(queue.next_waiter())
+        self.assertEqual(len(queue), 0)
+
+    def test_rejects_requests_once_full(self):
+        queue = AdmissionQueue(max_size=1)
+        self.assertIsNotNone(queue.enqueue(0, self.deadline))
+        self.assertIsNone(queue.enqueue(10, self.deadline))
+        self.assertEqual(len(queue), 1)
+
+    def test_cancelled_waiters_are_skipped(self):
+        queue = AdmissionQueue(max_size=10)
+        cancelled = queue.enqueue(1, self.deadline)
+        waiting = queue.enqueue(0, self.deadline)
+        queue.cancel(cancelled)
+
+        self.assertEqual(len(queue), 1)
+        self.assertIs(queue.next_waiter(), waiting)
+        self.assertEqual(len(queue), 0)
+
+    def test_expired_waiters_are_woken_up_without_container(self):
+        queue = AdmissionQueue(max_size=10)
+        expired = queue.enqueue(1, time.monotonic() - 1)
+        waiting = queue.enqueue(0, self.deadline)
+
+        self.assertIs(queue.next_waiter(), waiting)
+        self.assertTrue(expired.cancelled)
+        self.assertTrue(expired.event.is_set())
+        self.assertIsNone(expired.container)
+        self.assertEqual(len(queue), 0)
+
+    def test_assigned_container_wakes_up_waiter(self):
+        queue = AdmissionQueue(max_size=10)
+        waiter = queue.enqueue(0, self.deadline, ["task"])
+        container = object()
+        queue.next_waiter().assign(container)
+
+        self.assertTrue(waiter.event.is_set())
+        self.assertIs(waiter.container, container)
+        self.assertEqual(waiter.affinity, ["task"])
+
+
+if __name__ == '__main__':
+    unittest.main()
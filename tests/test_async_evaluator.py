@@ -0,0 +1,81 @@
+import asyncio
+import contextlib
+import json
+import unittest
+
+from async_evaluator import AsyncEvaluator
+from database import BasicEvalRequestData
+from model.graph_model import Graph
+
+
+class FakeContainer:
+
+    def __init__(self):
+        self.runs = []
+
+    async def run_script(self, script, args, *options):
+        self.runs.append(args)
+        return {"output": "True\n", "failed": False, "timed_out": False}
+
+
+class FakeContainerPool:
+
+    def __init__(self):
+        self.fake_container = FakeContainer()
+
+    @contextlib.asynccontextmanager
+    async def container(self):
+        yield self.fake_container
+
+
+class FakeDatabase:
+
+    def __init__(self):
+        self.results = []
+
+    async def get_basic_eval_request_data(self, task_id):
+        return BasicEvalRequestData(Graph(id=1, label="label", vertices={}, edges={}), "print(True)")
+
+    async def add_evaluation_results(self, results):
+        self.results.extend(results)
+
+
+class FakeMessage:
+
+    def __init__(self, body):
+        self.body = body
+        self.redelivered = False
+        self.acks = 0
+        self.rejects = []
+
+    async def ack(self):
+        self.acks += 1
+
+    async def reject(self, requeue=False):
+        self.rejects.append(requeue)
+
+
+class AsyncEvaluatorTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_evaluates_request_and_acknowledges_persisted_result(self):
+        container_pool, database = FakeContainerPool(), FakeDatabase()
+        evaluator = AsyncEvaluator(container_pool, database, result_flush_interval=0.01)
+        evaluator.start()
+        messages = [FakeMessage(json.dumps({"requestId": request_id, "taskId": 1, "inputAnswer": "answer"}))
+                    for request_id in (1, 2)]
+
+        await evaluator.on_message(messages[0])
+        await asyncio.gather(*evaluator.tasks)
+        await evaluator.on_message(messages[1])
+        await evaluator.shutdown()
+
+        # the identical second submission is answered from the result cache
+        self.assertEqual(len(container_pool.fake_container.runs), 1)
+        self.assertEqual([(request_id, is_correct) for request_id, is_correct, _ in database.results],
+                         [(1, True), (2, True)])
+        self.assertEqual([message.acks for message in messages], [1, 1])
+        self.assertEqual([message.rejects for message in messages], [[], []])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -26,16 +26,18 @@ class BasicEvaluatorTest(unittest.TestCase):
 
         database.get_basic_eval_request_data = lambda task_id: mock_basic_eval_request_function(task_id)
 
-        def add_evaluation_result(request_id, is_correct, time):
-            self.assertTrue(is_correct, "Evaluation result is not correct")
-
-        database.add_evaluation_result = add_evaluation_result
+        # results are only recorded here, an assertion failing inside the result sink would be retried silently
+        self.results = []
+        database.add_evaluation_results = self.results.extend
 
-        self.evaluator = basic_evaluator.BasicEvaluator(docker_manager=docker_manager)
-        self.evaluator.db = database
+        self.evaluator = basic_evaluator.BasicEvaluator(docker_manager=docker_manager, database=database)
 
     def test_smoke_test_run_evaluator(self):
         self.evaluator.run(self.request)
+        self.evaluator.shutdown()
+        self.assertEqual([request_id for request_id, _, _ in self.results], [1])
+        for request_id, is_correct, time in self.results:
+            self.assertTrue(is_correct, "Evaluation result is not correct")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,96 @@
+import json
+import unittest
+from unittest.mock import Mock
+
+from abstract_executor import AbstractExecutor
+from basic_evaluator import BasicEvalRequest
+from batch_evaluator import BatchDelivery, BatchEvalRequest, BatchEvaluator
+from database import BasicEvalRequestData
+from model.graph_model import Graph
+from sage_container import SageContainer
+from sage_session import encode_job
+
+
+class FakeSession:
+    jobs = []
+
+    def run_batch(self, script, runs, time_limit=None, files=None, args_encoding=None, graph_arg=None,
+                  shared_args=None):
+        job = {"script": script, "batch": [{"id": run_id, "args": args} for run_id, args in runs],
+               "shared_args": shared_args}
+        self.jobs.append(encode_job(job, 1, time_limit, files, args_encoding, graph_arg))
+        return [{"id": request_id, "output": "True", "timed_out": False} for request_id, _ in runs]
+
+    def close(self):
+        pass
+
+
+class FakeContainer(SageContainer):
+
+    def _open_sage_session(self):
+        return FakeSession()
+
+
+class FakeExecutor(AbstractExecutor):
+    max_active_containers = 1
+
+    def __init__(self):
+        self.runs = 0
+
+    def allocate_container(self, priority=0, deadline=None, affinity=None):
+        self.runs += 1
+        return FakeContainer("fake")
+
+
+class BatchDeliveryTest(unittest.TestCase):
+
+    def test_acknowledges_once_all_results_are_persisted(self):
+        delivery = Mock(redelivered=False)
+        batch_delivery = BatchDelivery(delivery, 3)
+        batch_delivery.ack()
+        batch_delivery.ack()
+        delivery.ack.assert_not_called()
+        batch_delivery.ack()
+        delivery.ack.assert_called_once()
+
+
+class BatchEvaluatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.results = []
+        database = Mock()
+        database.get_basic_eval_request_data = lambda task_id: BasicEvalRequestData(
+            Graph(id=1, label="label", vertices={}, edges={}), "print(True)")
+        database.add_evaluation_results = self.results.extend
+        self.executor = FakeExecutor()
+        self.evaluator = BatchEvaluator(self.executor, database=database, result_flush_interval=0.01)
+
+    def test_acknowledges_batch_with_cached_and_evaluated_answers(self):
+        bundle = self.evaluator.get_bundle(1)
+        self.evaluator.result_cache.put(self.evaluator.result_cache.get_key(bundle.digest, "cached"), False)
+        answers = [BasicEvalRequest(1, 1, "cached"), BasicEvalRequest(2, 1, "new"), BasicEvalRequest(3, 1, "other")]
+        delivery = Mock(redelivered=False)
+
+        self.evaluator.run(BatchEvalRequest(1, answers, BatchDelivery(delivery, len(answers))))
+        self.evaluator.shutdown()
+
+        self.assertEqual(self.executor.runs, 1)
+        self.assertEqual(sorted((request_id, is_correct) for request_id, is_correct, _ in self.results),
+                         [(1, False), (2, True), (3, True)])
+        delivery.ack.assert_called_once()
+        delivery.reject.assert_not_called()
+
+    def test_sends_graph_once_per_batch(self):
+        FakeSession.jobs = []
+        bundle = self.evaluator.get_bundle(1)
+        answers = [BasicEvalRequest(request_id, 1, f"answer {request_id}") for request_id in range(1, 4)]
+
+        self.evaluator.run(BatchEvalRequest(1, answers, None))
+        self.evaluator.shutdown()
+
+        self.assertEqual(len(FakeSession.jobs), 1)
+        self.assertEqual(FakeSession.jobs[0].count(json.dumps(bundle.graph_json).encode("utf-8")), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
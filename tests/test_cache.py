@@ -0,0 +1,44 @@
+import time
+import unittest
+
+from cache import LRUCache
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used_entry(self):
+        cache = LRUCache("test_lru", max_size=2)
+        cache.put(1, "one")
+        cache.put(2, "two")
+        cache.get(1)
+        cache.put(3, "three")
+
+        self.assertEqual(cache.get(1), "one")
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(3), "three")
+
+    def test_expired_entries_are_reloaded(self):
+        cache = LRUCache("test_ttl", max_size=2, ttl=0.01)
+        loads = []
+
+        def loader(key):
+            loads.append(key)
+            return str(key)
+
+        cache.get_or_load(1, loader)
+        cache.get_or_load(1, loader)
+        time.sleep(0.02)
+        cache.get_or_load(1, loader)
+
+        self.assertEqual(loads, [1, 1])
+
+    def test_invalidate_removes_entry(self):
+        cache = LRUCache("test_invalidate", max_size=2)
+        cache.put(1, "one")
+        cache.invalidate(1)
+
+        self.assertIsNone(cache.get(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
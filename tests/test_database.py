@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+import psycopg2.extensions
+
+from database import Database
+
+
+class FakeConnection:
+
+    def __init__(self, closed=False):
+        self.closed = closed
+        self.status = psycopg2.extensions.STATUS_READY
+
+    def cursor(self):
+        return MagicMock()
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+
+    def __init__(self, *connections):
+        self.connections = list(connections)
+        self.returned = []
+
+    def getconn(self):
+        return self.connections.pop(0)
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+        if close:
+            conn.closed = True
+
+
+class DatabaseTest(unittest.TestCase):
+
+    def create_database(self, pool):
+        with patch("database.psycopg2.pool.ThreadedConnectionPool", return_value=pool):
+            return Database()
+
+    def test_operation_is_retried_once_on_fresh_connection(self):
+        broken, fresh = FakeConnection(), FakeConnection()
+        pool = FakePool(broken, fresh)
+        database = self.create_database(pool)
+
+        def operation(conn):
+            if conn is broken:
+                raise psycopg2.OperationalError("server closed the connection unexpectedly")
+            return "result"
+
+        self.assertEqual(database._run(operation), "result")
+        self.assertEqual(pool.returned, [(broken, True), (fresh, False)])
+        self.assertEqual(list(database.last_used), [id(fresh)])
+
+    def test_closed_connection_is_replaced_on_checkout(self):
+        closed, fresh = FakeConnection(closed=True), FakeConnection()
+        pool = FakePool(closed, fresh)
+        database = self.create_database(pool)
+
+        with database.connection() as conn:
+            self.assertIs(conn, fresh)
+        self.assertEqual(pool.returned, [(closed, True), (fresh, False)])
+        self.assertEqual(list(database.last_used), [id(fresh)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from docker_manager import DockerManager
+
+
+class PoolSizeTest(unittest.TestCase):
+
+    def test_pool_size_is_bound_by_cpus(self):
+        self.assertEqual(DockerManager.get_pool_size(8, 64 * 1024 ** 3, 2.0, 1024 ** 3), 4)
+
+    def test_pool_size_is_bound_by_memory(self):
+        self.assertEqual(DockerManager.get_pool_size(32, 10 * 1024 ** 3, 1.0, 3 * 1024 ** 3), 3)
+
+    def test_pool_size_is_at_least_one(self):
+        self.assertEqual(DockerManager.get_pool_size(1, 1024 ** 3, 2.0, 4 * 1024 ** 3), 1)
+
+
+def make_container(jobs_run: int, *keys: str) -> SimpleNamespace:
+    return SimpleNamespace(jobs_run=jobs_run, holds=lambda key: key in keys)
+
+
+class SelectContainerTest(unittest.TestCase):
+
+    def test_prefers_container_holding_most_specific_key(self):
+        task, script, cold = make_container(5, "task", "script"), make_container(1, "script"), make_container(0)
+        self.assertIs(DockerManager.select_container([cold, script, task], ["task", "script"]), task)
+        self.assertIs(DockerManager.select_container([cold, script], ["task", "script"]), script)
+
+    def test_falls_back_to_least_loaded_unreserved_container(self):
+        busy, fresh, hot = make_container(3), make_container(1), make_container(0, "hot")
+        self.assertIs(DockerManager.select_container([busy, fresh, hot], ["task"], [hot]), fresh)
+        self.assertIsNone(DockerManager.select_container([hot], ["task"], [hot]))
+        self.assertIs(DockerManager.select_container([hot], ["hot"], [hot]), hot)
+
+
+class FakePhysicalContainer:
+
+    def __init__(self, name, healthy=True):
+        self.name = name
+        self.id = name
+        self.status = "running"
+        self.attrs = {"Image": "image-id"}
+        self.healthy = healthy
+        self.removed = False
+        self.execs = 0
+
+    def reload(self):
+        pass
+
+    def exec_run(self, cmd, **kwargs):
+        self.execs += 1
+        return SimpleNamespace(exit_code=0 if self.healthy else 1, output=b"")
+
+    def stop(self):
+        pass
+
+    def remove(self, force=False):
+        self.removed = True
+
+
+class FakeDockerClient:
+
+    def __init__(self, leftovers):
+        self.leftovers = {container.name: container for container in leftovers}
+        self.containers = SimpleNamespace(list=lambda **kwargs: list(leftovers), get=self.leftovers.__getitem__)
+        self.images = SimpleNamespace(get=lambda image: SimpleNamespace(id="image-id"))
+
+
+class RecoverContainersTest(unittest.TestCase):
+
+    def test_adopts_healthy_and_removes_broken_leftover_containers(self):
+        healthy, broken = FakePhysicalContainer("healthy"), FakePhysicalContainer("broken", healthy=False)
+        with patch("docker_manager.docker_lib.from_env", return_value=FakeDockerClient([healthy, broken])):
+            manager = DockerManager(2, 0, reuse_containers=True, refresh_image=False)
+        manager.creation_executor.shutdown(wait=True)
+
+        self.assertEqual([container.name for container in manager.ready_containers], ["healthy"])
+        self.assertEqual(manager.creating_containers, 0)
+        self.assertFalse(healthy.removed)
+        self.assertTrue(broken.removed)
+
+
+class HealthCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.phy_container = FakePhysicalContainer("container")
+        with patch("docker_manager.docker_lib.from_env", return_value=FakeDockerClient([self.phy_container])):
+            self.manager = DockerManager(1, 0, reuse_containers=True, prewarm_fanout=1, refresh_image=False,
+                                         health_check_interval=None)
+        self.wait_for_background_work()
+
+    def tearDown(self):
+        self.manager.creation_executor.shutdown(wait=True)
+
+    def wait_for_background_work(self):
+        # the creation executor has a single thread, so earlier work is done once this no-op ran
+        self.manager.creation_executor.submit(lambda: None).result()
+
+    def test_finished_container_is_reused_without_querying_docker(self):
+        container = self.manager.allocate_container()
+        self.phy_container.execs = 0
+        container.call_release_observers()
+        self.assertEqual(self.manager.ready_containers, [container])
+        self.assertEqual(self.phy_container.execs, 0)
+
+    def test_unhealthy_ready_container_is_recycled_in_background_check(self):
+        self.phy_container.healthy = False
+        self.manager.check_ready_containers()
+        self.wait_for_background_work()
+        self.assertEqual(self.manager.ready_containers, [])
+        self.assertTrue(self.phy_container.removed)
+
+
+class CreationFailureTest(unittest.TestCase):
+
+    def create_manager(self, ready_container_amount):
+        with patch("docker_manager.docker_lib.from_env", return_value=FakeDockerClient([])):
+            return DockerManager(1, ready_container_amount, prewarm_fanout=1, refresh_image=False,
+                                 health_check_interval=None)
+
+    @patch("docker_manager.CREATION_RETRY_DELAY", 0.01)
+    def test_failed_creation_is_retried(self):
+        container = Mock()
+        with patch.object(DockerManager, "create_container_in_registry",
+                          side_effect=[RuntimeError("docker is down"), container]):
+            manager = self.create_manager(1)
+            deadline = time.monotonic() + 1
+            while not manager.ready_containers and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(manager.ready_containers, [container])
+        self.assertEqual(manager.creation_failures, 0)
+        manager.clear_all_containers()
+
+    def test_waiting_request_is_rejected_once_creation_failed(self):
+        with patch.object(DockerManager, "create_container_in_registry", side_effect=RuntimeError("docker is down")):
+            manager = self.create_manager(0)
+            start = time.monotonic()
+            self.assertIsNone(manager.allocate_container(deadline=start + 5))
+            self.assertLess(time.monotonic() - start, 1)
+            manager.clear_all_containers()
+
+
+if __name__ == '__main__':
+    unittest.main()
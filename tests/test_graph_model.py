@@ -0,0 +1,24 @@
+import json
+import unittest
+
+from model.graph_model import Edge, Graph, Vertex
+from sage_server import expand_graph
+
+
+class GraphModelTest(unittest.TestCase):
+
+    def setUp(self):
+        vertices = [Vertex(1, "a", 0, 0), Vertex(2, "b", 1, 1)]
+        self.graph = Graph(1, "label", vertices, [Edge(vertices[0], vertices[1], "e")])
+
+    def test_compact_edges_reference_vertices_by_id(self):
+        self.assertEqual(self.graph.to_compact_json()["edges"], [[1, 2, "e"]])
+
+    def test_expanded_compact_graph_matches_full_representation(self):
+        compact_json = json.dumps(self.graph.to_compact_json(), separators=(",", ":"))
+
+        self.assertEqual(expand_graph(compact_json), json.dumps(self.graph.to_json()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import resource
+import sys
+import unittest
+from unittest.mock import patch
+
+from local_executor import LocalExecutor
+from model.graph_model import Edge, Graph, Vertex
+from sage_container import ContentFile
+from sage_session import LocalSageSession, SageSessionTimeout, TimeLimit
+
+CHECK_SCRIPT = """
+import base64, json, sys
+answer = base64.b64decode(sys.argv[1]).decode("utf-8")
+graph = json.loads(base64.b64decode(sys.argv[2]).decode("utf-8"))
+print(answer == str(len(graph["edges"])))
+"""
+
+
+class LocalExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = LocalExecutor(max_workers=1, interpreter=[sys.executable], sage=False,
+                                      memory_limit=1024 ** 3, admission_timeout=5)
+        vertices = [Vertex(1, "a", 0, 0), Vertex(2, "b", 1, 1)]
+        self.graph_json = json.dumps(Graph(1, "graph", vertices, [Edge(vertices[0], vertices[1], "e")])
+                                     .to_compact_json())
+
+    def tearDown(self):
+        self.executor.clear_all_containers()
+
+    def run_script(self, script: str, answer: str, time_limit: TimeLimit | None = None) -> bool | None:
+        results = {}
+        container = self.executor.allocate_container()
+        container.upload_content_files([ContentFile("eval.sage", script)], persistent=True)
+        container.add_result_observer(lambda request_id, is_correct: results.update({request_id: is_correct}))
+        container.run_script("eval.sage", [answer, self.graph_json], 1, time_limit, "base64", 1)
+        return results[1]
+
+    def test_runs_script_and_reuses_server(self):
+        self.assertTrue(self.run_script(CHECK_SCRIPT, "1"))
+        self.assertFalse(self.run_script(CHECK_SCRIPT, "2"))
+        self.assertEqual(len(self.executor.ready_containers), 1)
+        self.assertEqual(self.executor.ready_containers[0].jobs_run, 2)
+
+    def test_time_limit_stops_script(self):
+        self.assertIsNone(self.run_script("while True:\n    pass\n", "1", TimeLimit(0.5, 0.5)))
+        # the server that ran into the time limit is replaced
+        self.assertEqual(len(self.executor.ready_containers), 0)
+        self.assertTrue(self.run_script(CHECK_SCRIPT, "1"))
+        self.assertEqual(self.executor.ready_containers[0].jobs_run, 1)
+
+    def test_server_that_does_not_start_times_out(self):
+        with patch("sage_session.STARTUP_TIMEOUT_SECONDS", 0.5), self.assertRaises(SageSessionTimeout):
+            LocalSageSession([sys.executable, "-c", "import time; time.sleep(10)"], ".")
+
+    def test_resource_limits_are_applied(self):
+        container = self.executor.allocate_container()
+        process = container.sage_session.process
+        self.assertEqual(resource.prlimit(process.pid, resource.RLIMIT_AS), (1024 ** 3, 1024 ** 3))
+        self.assertEqual(resource.prlimit(process.pid, resource.RLIMIT_CORE), (0, 0))
+        container.call_release_observers()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+import urllib.request
+
+from metrics import MetricsRegistry, start_metrics_server
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_render_histogram_and_gauge(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("stage_seconds", "Stage", buckets=[0.1, 1])
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        registry.gauge("ready", "Ready").set_function(lambda: 3)
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE stage_seconds histogram", lines)
+        self.assertIn('stage_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('stage_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('stage_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn("stage_seconds_count 2", lines)
+        self.assertIn("ready 3", lines)
+
+    def test_serve_metrics(self):
+        server = start_metrics_server("127.0.0.1", 0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url) as response:
+                self.assertEqual(response.status, 200)
+                self.assertIn("text/plain", response.headers["Content-Type"])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
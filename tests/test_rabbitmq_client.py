@@ -0,0 +1,83 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from rabbitmq_client import Delivery, MessageQueueMiddleware
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.callbacks = []
+        self.fake_channel = Mock()
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.append(callback)
+
+    def run_callbacks(self):
+        for callback in self.callbacks:
+            callback()
+
+    def channel(self):
+        return self.fake_channel
+
+
+class DeliveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.delivery = Delivery(self.connection, self.connection.fake_channel, 7, False)
+
+    def test_ack_is_posted_to_connection_thread(self):
+        self.delivery.ack()
+        self.connection.fake_channel.basic_ack.assert_not_called()
+        self.connection.run_callbacks()
+        self.connection.fake_channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_delivery_is_settled_once(self):
+        self.delivery.ack()
+        self.delivery.ack()
+        self.delivery.reject()
+        self.connection.run_callbacks()
+        self.assertEqual(len(self.connection.callbacks), 1)
+        self.connection.fake_channel.basic_ack.assert_called_once_with(delivery_tag=7)
+        self.connection.fake_channel.basic_nack.assert_not_called()
+
+    def test_reject_requeues_by_default(self):
+        self.delivery.reject()
+        self.delivery.reject(requeue=False)
+        self.connection.run_callbacks()
+        self.connection.fake_channel.basic_nack.assert_called_once_with(delivery_tag=7, requeue=True)
+
+
+class ConsumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = FakeConnection()
+        with patch("rabbitmq_client.pika.BlockingConnection", return_value=self.connection):
+            self.middleware = MessageQueueMiddleware("localhost")
+
+    def consume(self, prefetch_count):
+        received = []
+        with patch("rabbitmq_client.pika.BlockingConnection", return_value=self.connection):
+            self.middleware._inner_consume("QUEUE", lambda body, delivery: received.append((body, delivery)),
+                                           prefetch_count)
+        on_message = self.connection.fake_channel.basic_consume.call_args.kwargs["on_message_callback"]
+        on_message(self.connection.fake_channel, SimpleNamespace(delivery_tag=7, redelivered=True), None, b"body")
+        return received
+
+    def test_manual_acknowledgement_limits_unacknowledged_messages(self):
+        (body, delivery), = self.consume(5)
+        self.connection.fake_channel.basic_qos.assert_called_once_with(prefetch_count=5)
+        self.assertFalse(self.connection.fake_channel.basic_consume.call_args.kwargs["auto_ack"])
+        self.assertEqual((body, delivery.delivery_tag, delivery.redelivered), (b"body", 7, True))
+
+    def test_messages_are_acknowledged_on_delivery_without_prefetch_count(self):
+        (body, delivery), = self.consume(None)
+        self.connection.fake_channel.basic_qos.assert_not_called()
+        self.assertTrue(self.connection.fake_channel.basic_consume.call_args.kwargs["auto_ack"])
+        self.assertIsNone(delivery)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from result_cache import ResultCache
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "results.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_equivalent_answers_share_a_key(self):
+        cache = ResultCache(10)
+        self.assertEqual(cache.get_key("bundle", '{"b": 1, "a": [1, 2]}'), cache.get_key("bundle", '{"a":[1,2],"b":1}'))
+        self.assertEqual(cache.get_key("bundle", " 42\n"), cache.get_key("bundle", "42"))
+        self.assertNotEqual(cache.get_key("bundle", "42"), cache.get_key("other", "42"))
+
+    def test_results_evicted_from_memory_are_read_from_disk(self):
+        cache = ResultCache(1, self.path, flush_interval=60)
+        cache.put("first", True)
+        cache.put("second", False)
+        # pending results are found before they are written
+        self.assertTrue(cache.get("first"))
+        cache.close()
+
+        cache = ResultCache(1, self.path)
+        self.assertTrue(cache.get("first"))
+        self.assertFalse(cache.get("second"))
+        self.assertIsNone(cache.get("third"))
+        cache.close()
+
+    def test_oldest_results_are_dropped_from_disk(self):
+        cache = ResultCache(1, self.path, max_disk_size=10, flush_interval=60)
+        for index in range(1000):
+            cache.put(str(index), True)
+        cache.close()
+
+        with sqlite3.connect(self.path) as disk:
+            keys = [row[0] for row in disk.execute("SELECT key FROM results ORDER BY rowid")]
+        self.assertEqual(keys, [str(index) for index in range(990, 1000)])
+
+
+if __name__ == '__main__':
+    unittest.main()
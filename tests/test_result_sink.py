@@ -0,0 +1,37 @@
+import threading
+import unittest
+from unittest.mock import Mock
+
+from result_sink import ResultSink
+
+
+class ResultSinkTest(unittest.TestCase):
+
+    def test_failing_acknowledgement_does_not_stop_flushing(self):
+        database = Mock()
+        sink = ResultSink(database, batch_size=1, flush_interval=0.05)
+
+        def fail():
+            raise RuntimeError("connection closed")
+
+        acked = threading.Event()
+        sink.submit(1, True, fail)
+        sink.submit(2, True, acked.set)
+        self.assertTrue(acked.wait(1))
+        self.assertTrue(sink.thread.is_alive())
+        sink.close()
+
+    def test_flushes_once_all_unacknowledged_messages_are_buffered(self):
+        database = Mock()
+        sink = ResultSink(database, batch_size=100, flush_interval=60, max_pending_acks=2)
+
+        acked = threading.Event()
+        sink.submit(1, True, lambda: None)
+        sink.submit(2, False, acked.set)
+        self.assertTrue(acked.wait(1))
+        database.add_evaluation_results.assert_called_once()
+        sink.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from sage_container import SageContainer
+
+
+class FailingContainer(SageContainer):
+
+    def _open_sage_session(self):
+        raise RuntimeError("put_archive failed")
+
+
+class SageContainerTest(unittest.TestCase):
+
+    def test_container_is_released_if_server_cannot_be_launched(self):
+        container = FailingContainer("failing")
+        results, releases = [], []
+        container.add_result_observer(lambda request_id, result: results.append((request_id, result)))
+        container.add_release_observer(lambda: releases.append(True))
+
+        container.run_script("script.sage", [], 1)
+        container.run_script_batch("script.sage", [(2, []), (3, [])])
+
+        self.assertEqual(results, [(1, None), (2, None), (3, None)])
+        self.assertEqual(len(releases), 2)
+        self.assertTrue(container.needs_recycling)
+
+    def test_container_is_released_if_observer_fails(self):
+        container = FailingContainer("failing")
+        releases = []
+
+        def fail(request_id, result):
+            raise ValueError("observer failed")
+
+        container.add_result_observer(fail)
+        container.add_release_observer(lambda: releases.append(True))
+
+        with self.assertRaises(ValueError):
+            container.run_script("script.sage", [], 1)
+        self.assertEqual(len(releases), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+import sage_server
+
+
+class CompileScriptTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.script = os.path.join(self.directory.name, "scripts", "check.sage")
+        sage_server.write_files({self.script: "print(True)\n"})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_unchanged_script_is_compiled_once(self):
+        self.assertIs(sage_server.compile_script(self.script, sage=False),
+                      sage_server.compile_script(self.script, sage=False))
+
+    def test_changed_script_is_compiled_again(self):
+        code = sage_server.compile_script(self.script, sage=False)
+        sage_server.write_files({self.script: "print(False)\n"})
+        self.assertIsNot(sage_server.compile_script(self.script, sage=False), code)
+
+
+class RunJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.script = os.path.join(self.directory.name, "check.py")
+        sage_server.write_files({self.script: "import sys\nprint(sys.argv[1:])\n"})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_shared_args_are_appended_to_every_run(self):
+        job = {"id": 1, "script": self.script, "shared_args": ["graph"],
+               "batch": [{"id": 2, "args": ["a"]}, {"id": 3, "args": ["b"]}]}
+        response = sage_server.run_job(job, {}, sage=False)
+        self.assertEqual([(result["id"], result["output"]) for result in response["results"]],
+                         [(2, "['a', 'graph']\n"), (3, "['b', 'graph']\n")])
+
+
+if __name__ == '__main__':
+    unittest.main()
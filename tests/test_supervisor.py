@@ -0,0 +1,42 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from supervisor import WorkerSupervisor
+
+
+class WorkerSupervisorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.supervisor = WorkerSupervisor(1, lambda index, count: None, restart_delay=1, max_restart_delay=8)
+        # every started worker crashes right away unless a test lets it run
+        self.supervisor._start_worker = self.start_worker
+        self.start_worker(0)
+
+    def start_worker(self, index):
+        self.supervisor.processes[index] = SimpleNamespace(is_alive=lambda: False, exitcode=1)
+        self.supervisor.started_at[index] = self.now
+
+    def crash(self, uptime=0.0):
+        """ Let the worker crash after an uptime and restart it once its delay passed, returning the delay. """
+        self.now += uptime
+        with patch("supervisor.time.monotonic", lambda: self.now):
+            self.supervisor._supervise()
+            delay = self.supervisor.restart_at[0] - self.now
+            self.supervisor._supervise()
+            self.assertEqual(self.supervisor.started_at[0], self.now - uptime)
+            self.now += delay
+            self.supervisor._supervise()
+        self.assertEqual(self.supervisor.started_at[0], self.now)
+        return delay
+
+    def test_restart_delay_doubles_up_to_max_for_crashing_worker(self):
+        self.assertEqual([self.crash() for _ in range(6)], [1, 2, 4, 8, 8, 8])
+
+    def test_restart_delay_is_reset_after_worker_ran_for_a_while(self):
+        self.assertEqual([self.crash(), self.crash(), self.crash(uptime=9), self.crash()], [1, 2, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()